@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Yield, duration and convexity of N synthetic bonds: a per-bond Python loop
+# solving each yield on its own, against modules.bond_analytics packing every
+# schedule into columns and solving them all at once. Both must agree.
+#
+#   python bench/bench_bond_analytics.py 5000
+
+import datetime
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules import bond_analytics
+from modules.bond_analytics import DAYS_IN_YEAR, RATE_BOUNDS, YTM_TOLERANCE
+
+
+AS_OF = (datetime.date(2024, 3, 1).toordinal() - datetime.date(1970, 1, 1).toordinal()) * 86400
+
+
+def date_json(date):
+    timestamp = (date.toordinal() - datetime.date(1970, 1, 1).toordinal()) * 86400
+    return {"day": date.day, "month": date.month, "year": date.year, "timestamp": timestamp}
+
+
+def synthetic_bond(rnd):
+    # a smartlab result: semiannual or quarterly coupons from placement to maturity
+    months = rnd.choice([3, 6])
+    start = datetime.date(2015 + rnd.randrange(9), 1 + rnd.randrange(12), 1 + rnd.randrange(28))
+    periods = rnd.randrange(4, 60)
+    rate = rnd.uniform(0.03, 0.15)
+    coupon = round(1000 * rate * months / 12, 2)
+    dates = list()
+    for i in range(1, periods + 1):
+        month = start.month - 1 + i * months
+        dates.append(datetime.date(start.year + month // 12, month % 12 + 1, start.day))
+    return {
+        "nominal": 1000,
+        "coupon_yield": round(rate * 100, 2),
+        "publish_date": date_json(start),
+        "close_date": date_json(dates[-1]),
+        "all_coupons": [{"date": date_json(x), "coupon": coupon, "coupon_yield": round(rate * 100, 2)} for x in dates],
+    }
+
+
+def cash_flows(bond):
+    # [timestamp, coupon, principal] after AS_OF and the start of the current coupon period
+    close_date = bond["close_date"]["timestamp"]
+    if close_date <= AS_OF:
+        return None, None
+    flows = list()
+    accrual_start = bond["publish_date"]["timestamp"]
+    for coupon in bond["all_coupons"]:
+        timestamp = coupon["date"]["timestamp"]
+        if timestamp <= AS_OF:
+            accrual_start = timestamp
+        elif timestamp <= close_date:
+            flows.append([timestamp, coupon["coupon"], 0.0])
+    if flows and flows[-1][0] == close_date:
+        flows[-1][2] = bond["nominal"]
+    else:
+        flows.append([close_date, 0.0, bond["nominal"]])
+    return flows, accrual_start
+
+
+def scalar_analytics(bond, price):
+    flows, accrual_start = cash_flows(bond)
+    if not flows:
+        return None
+    times = [(x[0] - AS_OF) / 86400 / DAYS_IN_YEAR for x in flows]
+    amounts = [x[1] + x[2] for x in flows]
+    accrued = 0.0
+    if flows[0][1] and accrual_start is not None and flows[0][0] > accrual_start:
+        accrued = flows[0][1] * (AS_OF - accrual_start) / (flows[0][0] - accrual_start)
+    dirty = price * flows[-1][2] / 100 + accrued
+
+    rate = math.log1p(bond["coupon_yield"] / 100)
+    for _ in range(100):
+        pv = sum(a * math.exp(-rate * t) for a, t in zip(amounts, times))
+        if abs(pv - dirty) <= YTM_TOLERANCE * dirty:
+            break
+        slope = -sum(t * a * math.exp(-rate * t) for a, t in zip(amounts, times))
+        rate = min(max(rate - (pv - dirty) / slope, RATE_BOUNDS[0]), RATE_BOUNDS[1])
+    else:
+        # out of RATE_BOUNDS, e.g. days to maturity at a deep discount
+        return None, None, None, None
+    ytm = math.expm1(rate)
+    pv = sum(a * math.exp(-rate * t) for a, t in zip(amounts, times))
+    macaulay = sum(t * a * math.exp(-rate * t) for a, t in zip(amounts, times)) / pv
+    convexity = sum(t * (t + 1) * a * math.exp(-rate * t) for a, t in zip(amounts, times)) / pv / (1 + ytm) ** 2
+    return ytm * 100, macaulay, macaulay / (1 + ytm), convexity
+
+
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    if bond_analytics.numpy is None:
+        sys.exit("numpy is not installed")
+
+    rnd = random.Random(1)
+    bonds = {"RU{:010d}".format(i): synthetic_bond(rnd) for i in range(count)}
+    prices = {isin: rnd.uniform(80, 110) for isin in bonds}
+    flows = sum(len(x["all_coupons"]) for x in bonds.values())
+
+    scalar, expected = best_of(lambda: {isin: scalar_analytics(bond, prices[isin]) for isin, bond in bonds.items()}, repeat)
+    vectorized, (results, errors) = best_of(lambda: bond_analytics.bond_analytics(bonds, prices, AS_OF), repeat)
+
+    for isin, values in expected.items():
+        if values is None:
+            assert isin in errors, isin
+            continue
+        result = results[isin]
+        got = (result["ytm"], result["macaulay_duration"], result["modified_duration"], result["convexity"])
+        assert all(a == b if a is None else abs(a - b) <= 1e-6 * max(1, abs(a)) for a, b in zip(values, got)), (isin, values, got)
+
+    unsolved = sum(1 for x in results.values() if x["ytm"] is None)
+    print("{} bonds, {} coupons, {} matured, {} yields out of range".format(count, flows, len(errors), unsolved))
+    print("per-bond loop  {:8.1f} ms".format(scalar * 1000))
+    print("vectorized     {:8.1f} ms  x{:.1f}".format(vectorized * 1000, scalar / vectorized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares the single-pass PageExtractor with the former one re.search per
+# field approach on the pages in bench/fixtures. The fixtures are synthetic
+# pages reproducing the upstream markup the parsers target.
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.investmint import TICKER_PAGE
+from modules.smartlab_bonds import BOND_PAGE
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def sequential_search(extractor, text):
+    found = dict()
+    for field in extractor.fields:
+        if field.regex is None:
+            idx = text.find(field.anchor)
+            if idx != -1:
+                found[field.name] = idx
+        else:
+            m = re.search(field.regex.pattern, text)
+            if m:
+                found[field.name] = m
+    return found
+
+
+def as_groups(found):
+    return {k: v if isinstance(v, int) else v.groups() for k, v in found.items()}
+
+
+def cpu_time(func, text, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        func(text)
+    return (time.process_time() - start) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pages = [
+        ("investmint", TICKER_PAGE, os.path.join(FIXTURES_DIR, "investmint", "sber.html")),
+        ("smartlab", BOND_PAGE, os.path.join(FIXTURES_DIR, "smartlab", "SU26233RMFS5.html")),
+    ]
+    for source, extractor, path in pages:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+
+        if as_groups(sequential_search(extractor, text)) != as_groups(extractor.extract(text)):
+            print("{}: extracted fields differ".format(source))
+            sys.exit(1)
+
+        sequential = cpu_time(lambda x: sequential_search(extractor, x), text, iterations)
+        single_pass = cpu_time(extractor.extract, text, iterations)
+        print("{:<12} {:>8} bytes  sequential {:8.1f} us  single-pass {:8.1f} us  x{:.1f}".format(
+            source, len(text.encode("utf-8")), sequential * 1e6, single_pass * 1e6, sequential / single_pass))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# The regex and selectolax page field backends (HTML_PARSER) on the pages in
+# bench/fixtures. First checks that both give the same json() for every page,
+# whole and projected to each result key, and exits 1 when they do not. Then
+# per page: CPU time and peak memory of a parse, lexbor allocates the document
+# through Python so tracemalloc sees it, and how many header fields each
+# backend still finds once the markup is reformatted.
+
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules import html_backend
+from modules import investing_stock
+from modules import investmint
+from modules import smartlab_bonds
+from modules.projection import result_sections
+from modules.serialization import dumps
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BACKENDS = ("regex", "selectolax")
+
+
+def investmint_json(text, fields=None):
+    return investmint.parse_ticker_page(text, fields=fields).json()
+
+def smartlab_json(text, fields=None):
+    return smartlab_bonds.parse_bond_page(text, fields=fields).json()
+
+def investing_json(text, fields=None):
+    sections, _ = result_sections(investing_stock.TICKER_RESULT_SECTIONS, fields)
+    ticker_info, dividend_link = investing_stock.parse_quote_page(text, sections)
+    return dict(ticker_info.json(), dividends_link=dividend_link)
+
+
+# source, page, parse to json, result keys, the ones from the page header
+PAGES = [
+    ("investmint", "investmint/sber.html", investmint_json, investmint.TICKER_RESULT_SECTIONS,
+     [x.name for x in investmint.TICKER_DOCUMENT.nodes]),
+    ("smartlab", "smartlab/SU26233RMFS5.html", smartlab_json, smartlab_bonds.BOND_RESULT_SECTIONS,
+     [x.name for x in smartlab_bonds.BOND_DOCUMENT.nodes]),
+    ("investing", "investing/quote_sber.html", investing_json, investing_stock.TICKER_RESULT_SECTIONS,
+     [x.name for x in investing_stock.QUOTE_DOCUMENT.nodes]),
+]
+
+
+def read_page(path):
+    with open(os.path.join(FIXTURES_DIR, path), encoding="utf-8") as f:
+        return f.read()
+
+
+def reformatted(text):
+    # what a template change or a minifier off does: tags on lines of their own, extra classes
+    text = re.sub(r">\s*<", ">\n    <", text)
+    return re.sub(r'class="([^"]*)"', r'class="\1 x"', text)
+
+
+def with_backend(backend, func, *args):
+    previous = html_backend.parser
+    html_backend.parser = backend
+    try:
+        return func(*args)
+    finally:
+        html_backend.parser = previous
+
+
+def check(source, text, to_json, result_keys):
+    differ = list()
+    for fields in [None] + [(x,) for x in sorted(result_keys)]:
+        results = [dumps(with_backend(x, to_json, text, fields)) for x in BACKENDS]
+        if results[0] != results[1]:
+            differ.append(",".join(fields or ("*",)))
+    if differ:
+        print("{}: json() differs between backends for {}".format(source, " ".join(differ)))
+    return not differ
+
+
+def cpu_time(backend, to_json, text, iterations):
+    html_backend.parser = backend
+    start = time.process_time()
+    for _ in range(iterations):
+        to_json(text)
+    return (time.process_time() - start) / iterations
+
+
+def heap_peak(backend, to_json, text):
+    html_backend.parser = backend
+    tracemalloc.start()
+    to_json(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def header_fields_found(backend, to_json, text, header):
+    result = with_backend(backend, to_json, text)
+    return sum(1 for x in header if result.get(x) is not None)
+
+
+def main():
+    if html_backend.LexborHTMLParser is None:
+        print("selectolax is not installed")
+        sys.exit(1)
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    pages = [(source, read_page(path), to_json, result_keys, header) for source, path, to_json, result_keys, header in PAGES]
+    if not all([check(source, text, to_json, result_keys) for source, text, to_json, result_keys, _ in pages]):
+        sys.exit(1)
+    print("json() identical for every page and result key\n")
+
+    print("regex / selectolax, per page")
+    print("{:<11} {:>5}  {:>18}  {:>16}  {:>17}".format("page", "KiB", "cpu us", "peak KiB", "reformatted found"))
+    for source, text, to_json, _, header in pages:
+        cpu = [cpu_time(x, to_json, text, iterations) * 1e6 for x in BACKENDS]
+        heap = [heap_peak(x, to_json, text) / 1024 for x in BACKENDS]
+        found = [header_fields_found(x, to_json, reformatted(text), header) for x in BACKENDS]
+        print("{:<11} {:>5.0f}  {:>7.1f} / {:>8.1f}  {:>6.1f} / {:>7.1f}  {:>6} / {:>2} of {}".format(
+            source, len(text.encode("utf-8")) / 1024, cpu[0], cpu[1], heap[0], heap[1], found[0], found[1], len(header)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Memory held by a long investmint dividend history and the cost of rendering
+# it, comparing the shared slotted models with the former per-module
+# dict-backed classes (kept below as Legacy* for reference).
+
+import calendar
+import datetime
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.models.common import Currency, Date
+from modules.models.investmint import DivInfo, TickerInfo
+
+
+class LegacyDate:
+    def __init__(self, day=None, month=None, year=None):
+        self.day = day
+        self.month = month
+        self.year = year
+
+    @property
+    def timestamp(self):
+        return calendar.timegm(self.date.timetuple())
+
+    @property
+    def date(self):
+        return datetime.date(self.year, self.month, self.day)
+
+    def json(self):
+        return {
+            "day": self.day,
+            "month": self.month,
+            "year": self.year,
+            "timestamp": self.timestamp,
+        }
+
+
+class LegacyDivInfo:
+    def __init__(self):
+        self.verified = None
+        self.buy_till_date = None
+        self.registry_close_date = None
+        self.dividend = None
+        self.currency = None
+        self.div_yield = None
+        self.close_price = None
+
+    def json(self):
+        buy_till_date = self.buy_till_date.json() if isinstance(self.buy_till_date, LegacyDate) else self.buy_till_date
+        registry_close_date = self.registry_close_date.json() if isinstance(self.registry_close_date, LegacyDate) else self.registry_close_date
+        return {
+            "verified": self.verified,
+            "buy_till_date": buy_till_date,
+            "registry_close_date": registry_close_date,
+            "dividend": self.dividend,
+            "currency": self.currency,
+            "div_yield": self.div_yield,
+            "close_price": self.close_price,
+        }
+
+
+def build_history(date_cls, div_cls, rows):
+    divs = list()
+    for i in range(rows):
+        div_info = div_cls()
+        div_info.verified = i % 3 != 0
+        div_info.buy_till_date = date_cls(1 + i % 27, 1 + i % 12, 2026 - (i // 12) % 500)
+        div_info.registry_close_date = date_cls(2 + i % 27, 1 + i % 12, 2026 - (i // 12) % 500)
+        div_info.dividend = 1 + (i % 3000) / 100
+        div_info.currency = Currency.RUB
+        div_info.div_yield = 1 + (i % 90) / 10
+        div_info.close_price = 100 + (i % 40000) / 100
+        divs.append(div_info)
+    return divs
+
+
+def measure(date_cls, div_cls, rows, renders):
+    gc.collect()
+    tracemalloc.start()
+    divs = build_history(date_cls, div_cls, rows)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = list()
+    for _ in range(renders):
+        start = time.process_time()
+        result = [x.json() for x in divs]
+        timings.append(time.process_time() - start)
+    return held, timings, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    renders = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    legacy_held, legacy_timings, legacy_result = measure(LegacyDate, LegacyDivInfo, rows, renders)
+    held, timings, result = measure(Date, DivInfo, rows, renders)
+    if result != legacy_result:
+        print("json output differs")
+        sys.exit(1)
+
+    print("{} rows  held {:8.1f} -> {:8.1f} KiB  ({:.0f} -> {:.0f} B/row)  x{:.2f}".format(
+        rows, legacy_held / 1024, held / 1024, legacy_held / rows, held / rows, legacy_held / held))
+    print("first json() {:8.1f} -> {:8.1f} ms   repeated json() {:8.1f} -> {:8.1f} ms".format(
+        legacy_timings[0] * 1e3, timings[0] * 1e3, min(legacy_timings[1:] or legacy_timings) * 1e3, min(timings[1:] or timings) * 1e3))
+
+    ticker_info = TickerInfo()
+    ticker_info.future_divs = list()
+    ticker_info.previous_divs = build_history(Date, DivInfo, rows)
+    start = time.process_time()
+    ticker_info.json()
+    print("TickerInfo.json() {:8.1f} ms".format((time.process_time() - start) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Per-row and per-page parse cost on long dividend and coupon histories,
+# comparing the module-level precompiled patterns and lookup tables with the
+# former per-call construction (kept below as legacy_* for reference).
+
+import itertools
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import synthetic
+from modules import investing_stock
+from modules import investmint
+from modules import smartlab_bonds
+
+
+def legacy_investmint_parse_month(month):
+    monthes = {
+        "янв": 1, "января": 1, "фев": 2, "февраля": 2, "мар": 3, "марта": 3,
+        "апр": 4, "апреля": 4, "мая": 5, "июн": 6, "июня": 6, "июл": 7, "июля": 7,
+        "авг": 8, "августа": 8, "сен": 9, "сентября": 9, "окт": 10, "октября": 10,
+        "ноя": 11, "ноября": 11, "дек": 12, "декабря": 12,
+    }
+    return monthes.get(month)
+
+def legacy_investmint_parse_currency(currency_):
+    if not currency_:
+        return None
+    currency = currency_.strip()
+    currencies = {"₽": investmint.Currency.RUB, "$": investmint.Currency.USD}
+    currency_ords = {8381: investmint.Currency.RUB, 36: investmint.Currency.USD}
+    res = currencies.get(currency)
+    if not res:
+        res = currency_ords.get(ord(currency), currency)
+    return res
+
+def legacy_investmint_parse_date(day_and_month_, year_):
+    day_and_month = day_and_month_.strip().split(" ")
+    return investmint.Date(int(day_and_month[0]), legacy_investmint_parse_month(day_and_month[1]), int(year_))
+
+def legacy_parse_divs_table(divs_table):
+    future_divs = list()
+    previous_divs = list()
+    future_divs_regex = re.compile(investmint.FUTURE_DIVS_REGEX.pattern)
+    previous_divs_regex = re.compile(investmint.PREVIOUS_DIVS_REGEX.pattern)
+    lookup_for_future_divs = True
+    prev_line_start_idx = divs_table.find("<tr")
+    while True:
+        line_start_idx = divs_table.find("<tr", prev_line_start_idx+1)
+        if line_start_idx == -1:
+            break
+        line_end_idx = divs_table.find("</tr>", line_start_idx)
+        line = divs_table[line_start_idx:line_end_idx+5]
+        if lookup_for_future_divs:
+            m = re.search(future_divs_regex, line)
+            if not m:
+                lookup_for_future_divs = False
+        if not lookup_for_future_divs:
+            m = re.search(previous_divs_regex, line)
+            if not m:
+                break
+        div_info = investmint.DivInfo()
+        div_info.verified = "green-bg" in m.group(1) or "gray-bg" not in m.group(1)
+        div_info.buy_till_date = legacy_investmint_parse_date(m.group(2), m.group(3))
+        div_info.registry_close_date = legacy_investmint_parse_date(m.group(4), m.group(5))
+        div_info.dividend = investmint.parse_float(m.group(6))
+        div_info.currency = legacy_investmint_parse_currency(m.group(7))
+        div_info.div_yield = investmint.parse_float(m.group(8))
+        if lookup_for_future_divs:
+            future_divs.append(div_info)
+        else:
+            div_info.close_price = investmint.parse_float(m.group(9))
+            previous_divs.append(div_info)
+        prev_line_start_idx = line_start_idx
+    return future_divs, previous_divs
+
+
+def legacy_investing_parse_date(day, month, year):
+    months = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6, "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+    return investing_stock.Date(int(day), months.get(month), int(year))
+
+def legacy_parse_dividends_page(text3):
+    div_table_start_idx = text3.find("""<th class="first left">Ex-Dividend Date<span sort_default class="headerSortDefault"></span></th>""")
+    div_table_finish_idx = text3.find("""</table>""", div_table_start_idx)
+    div_table = text3[div_table_start_idx:div_table_finish_idx]
+    all_divs = list()
+    for div_info in re.findall(investing_stock.DIVIDENDS_ROW_REGEX.pattern, div_table, re.S):
+        di = investing_stock.DivInfo()
+        di.ex_div_date = legacy_investing_parse_date(div_info[1], div_info[0], div_info[2])
+        di.dividend = float(div_info[3])
+        di.pay_date = legacy_investing_parse_date(div_info[5], div_info[4], div_info[6])
+        di.div_yield = float(div_info[7])
+        all_divs.append(di)
+    return all_divs
+
+
+def legacy_parse_coupons(table):
+    all_coupons = list()
+    for coupon_parts in re.findall(smartlab_bonds.COUPON_ROW_REGEX.pattern, table, re.S):
+        all_coupons.append(smartlab_bonds.Coupon(
+            date=smartlab_bonds.Date(int(coupon_parts[0]), int(coupon_parts[1]), int(coupon_parts[2])),
+            coupon=float(coupon_parts[3]),
+            coupon_yield=float(coupon_parts[4])
+        ))
+    return all_coupons
+
+def parse_coupons(table, limit=None):
+    return [x[1] for x in itertools.islice(smartlab_bonds.iter_coupons(table, 0, len(table)), limit)]
+
+
+def cpu_time(func, arg, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        func(arg)
+    return (time.process_time() - start) / iterations
+
+
+def count_rows(result):
+    return sum(len(x) for x in result) if isinstance(result, tuple) else len(result)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    cases = [
+        ("investmint divs", synthetic.investmint_divs_table(2, rows), legacy_parse_divs_table, investmint.parse_divs_table),
+        ("investing divs", synthetic.investing_dividends_page(rows), legacy_parse_dividends_page, investing_stock.parse_dividends_page),
+        ("smartlab coupons", synthetic.smartlab_coupons_table(rows), legacy_parse_coupons, parse_coupons),
+    ]
+    for name, page, legacy, current in cases:
+        parsed = count_rows(current(page))
+        if parsed != count_rows(legacy(page)):
+            print("{}: row count differs".format(name))
+            sys.exit(1)
+        before = cpu_time(legacy, page, iterations)
+        after = cpu_time(current, page, iterations)
+        print("{:<18} {:>5} rows  page {:8.1f} -> {:8.1f} us  row {:6.2f} -> {:6.2f} us  x{:.2f}".format(
+            name, parsed, before * 1e6, after * 1e6, before / parsed * 1e6, after / parsed * 1e6, before / after))
+
+    # stopping after the first history row, as needed for just the next or last dividend
+    limited = [
+        ("investmint divs", synthetic.investmint_divs_table(2, rows), lambda x: investmint.parse_divs_table(x, limit=1)),
+        ("investing divs", synthetic.investing_dividends_page(rows), lambda x: investing_stock.parse_dividends_page(x, limit=1)),
+        ("smartlab coupons", synthetic.smartlab_coupons_table(rows), lambda x: parse_coupons(x, limit=1)),
+    ]
+    for name, page, first_row in limited:
+        print("{:<18} first row only {:8.1f} us".format(name, cpu_time(first_row, page, iterations) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Offline end-to-end benchmark: replays the recorded pages through
+# parse_ticker, get_ticker_info and parse_coupon_by_isin and reports
+# throughput, latency percentiles and peak memory per source.
+#
+#   python bench/bench_replay.py                   # compare with bench/baseline.json
+#   python bench/bench_replay.py --save-baseline   # record a new baseline
+#
+# Exits with status 1 when a source's p50 latency regresses by more than
+# --tolerance against the baseline. The caches live in a temporary CACHE_DIR,
+# removed on exit, so runs do not read or fill ~/.cache.
+
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# before modules.config is imported
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_replay_")
+atexit.register(shutil.rmtree, os.environ["CACHE_DIR"], True)
+
+import replay
+from modules.investing_stock import get_ticker_info
+from modules.investmint import parse_ticker
+from modules.smartlab_bonds import parse_coupon_by_isin
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+CASES = [
+    ("investmint", parse_ticker, "SBER"),
+    ("investing", get_ticker_info, "SBER"),
+    ("smartlab", parse_coupon_by_isin, "SU26233RMFS5"),
+]
+
+
+def percentile(sorted_values, pct):
+    idx = min(int(round(pct / 100.0 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+def run_case(adapter, func, symbol, iterations):
+    if not func(symbol):
+        raise RuntimeError("{}({}) returned nothing".format(func.__name__, symbol))
+
+    pages_before = adapter.pages_served
+    latencies = list()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        func(symbol)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    pages = adapter.pages_served - pages_before
+
+    tracemalloc.start()
+    for _ in range(min(iterations, 10)):
+        func(symbol)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "calls_per_sec": iterations / elapsed,
+        "pages_per_sec": pages / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kb": peak / 1024.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = list()
+    for source, res in results.items():
+        base = baseline.get(source)
+        if not base:
+            continue
+        change = res["p50_ms"] / base["p50_ms"] - 1
+        print("{:<12} p50 {:7.3f} ms vs baseline {:7.3f} ms ({:+.1f}%)".format(source, res["p50_ms"], base["p50_ms"], change * 100))
+        if change > tolerance:
+            regressions.append(source)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    adapter = replay.install()
+    results = dict()
+    for source, func, symbol in CASES:
+        res = run_case(adapter, func, symbol, args.iterations)
+        results[source] = res
+        print("{:<12} {:8.1f} calls/s {:8.1f} pages/s  p50 {:7.3f} ms  p99 {:7.3f} ms  peak {:8.1f} KiB".format(
+            source, res["calls_per_sec"], res["pages_per_sec"], res["p50_ms"], res["p99_ms"], res["peak_kb"]))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+        print("baseline saved to {}".format(args.baseline))
+        return
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at {}, run with --save-baseline first".format(args.baseline))
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("p50 regression over {:.0f}%: {}".format(args.tolerance * 100, ", ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Cost of turning a cached investmint result with a long dividend history
+# into response bytes: the former per-request TickerInfo.json() plus
+# jsonify-style encoding, the first encode of a cached Payload with each
+# available encoder, and a cache hit that reuses the encoded payload.
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bench_models import build_history
+from modules import serialization
+from modules.models.common import Date, Currency
+from modules.models.investmint import DivInfo, TickerInfo
+
+
+def cpu_time(func, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations
+
+
+def legacy_response(ticker_info):
+    resp = {"success": True, "result": ticker_info.json()}
+    return (json.dumps(resp, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    ticker_info = TickerInfo()
+    ticker_info.name = "Сбербанк"
+    ticker_info.isin = "RU0009029540"
+    ticker_info.currency = Currency.RUB
+    ticker_info.future_divs = build_history(Date, DivInfo, 2)
+    ticker_info.previous_divs = build_history(Date, DivInfo, rows)
+    value = ticker_info.json()
+
+    encoders = [("json", serialization.stdlib_dumps)]
+    if serialization.orjson is not None:
+        encoders.append(("orjson", serialization.orjson_dumps))
+
+    legacy = cpu_time(lambda: legacy_response(ticker_info), iterations)
+    print("{} rows  per-request json() + encode {:8.2f} ms".format(rows, legacy * 1e3))
+    for name, dumps in encoders:
+        encode = cpu_time(lambda: dumps(value), iterations)
+        print("{:<7} first encode {:8.2f} ms  x{:.1f}".format(name, encode * 1e3, legacy / encode))
+
+    payload = serialization.Payload(value)
+    payload.encoded
+    hit = cpu_time(lambda: serialization.result_body(payload), iterations)
+    print("cache hit ({} KiB) {:8.3f} ms  x{:.0f}".format(len(payload.encoded) // 1024, hit * 1e3, legacy / hit))
+
+
+if __name__ == '__main__':
+    main()
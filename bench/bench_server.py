@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Requests/sec of src/server.py by worker count. The recorded pages are
+# loaded once in this process into a shared result cache, then each server
+# run serves them to --clients load generator processes, so every worker
+# answers from what another process scraped.
+#
+#   python bench/bench_server.py --workers 1,2,4 --duration 10
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+WARM = [
+    ("investmint", "sber"),
+    ("investing", "sber"),
+    ("smartlab", "SU26233RMFS5"),
+]
+
+PATHS = [
+    "/investmint/sber",
+    "/investing/sber",
+    "/smartlab/coupon/SU26233RMFS5",
+    "/investmint/sber?fields=price,future_div",
+]
+
+
+def warm_cache():
+    # imported here so modules.config sees the environment set up by main()
+    import replay
+    from modules import service
+
+    replay.install()
+    for source_name, symbol in WARM:
+        if not service.fetch(source_name, symbol):
+            raise RuntimeError("{} {} returned nothing".format(source_name, symbol))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/ping", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server at {} did not start".format(base_url))
+
+
+async def load(base_url, connections, duration):
+    done = 0
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client(session, idx):
+        nonlocal done, errors
+        while time.monotonic() < deadline:
+            async with session.get(base_url + PATHS[idx % len(PATHS)]) as r:
+                body = await r.read()
+            if r.status == 200 and b'"success":true' in body:
+                done += 1
+            else:
+                errors += 1
+            idx += 1
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[client(session, x) for x in range(connections)])
+    return done, errors
+
+
+def run_client(base_url, connections, duration):
+    return asyncio.run(load(base_url, connections, duration))
+
+
+def run_server(workers, env, clients, connections, duration):
+    port = free_port()
+    env = dict(env, SERVER_WORKERS=str(workers), SERVER_PORT=str(port), SERVER_HOST="127.0.0.1")
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "src", "server.py")], env=env, stderr=subprocess.DEVNULL)
+    try:
+        base_url = "http://127.0.0.1:{}".format(port)
+        wait_ready(base_url)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=clients) as executor:
+            outcomes = list(executor.map(run_client, [base_url] * clients, [connections] * clients, [duration] * clients))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return sum(x[0] for x in outcomes) / duration, sum(x[1] for x in outcomes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=",".join(str(x) for x in sorted(set([1, 2, os.cpu_count() or 1]))))
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_server_")
+    env = dict(
+        os.environ,
+        CACHE_DIR=tmp,
+        SHARED_CACHE_ENABLED="1",
+        SHARED_CACHE_DB=os.path.join(tmp, "results.sqlite"),
+        # long enough for every result to stay fresh during the runs
+        CACHE_TTL_INVESTMINT="86400",
+        CACHE_TTL_INVESTING="86400",
+        CACHE_TTL_SMARTLAB="86400",
+        PREFETCH_WATCHLIST="",
+    )
+    os.environ.update(env)
+    warm_cache()
+
+    print("{} cores, {} client processes x {} connections".format(os.cpu_count(), args.clients, args.connections))
+    single = None
+    for workers in [int(x) for x in args.workers.split(",")]:
+        rps, errors = run_server(workers, env, args.clients, args.connections, args.duration)
+        single = single or rps
+        print("{:>3} workers {:9.1f} req/s  x{:.2f}  errors {}".format(workers, rps, rps / single, errors))
+
+
+if __name__ == '__main__':
+    main()
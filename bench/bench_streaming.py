@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# The check streaming.read_until stops reading a page by, resumed from where
+# the previous chunk left off (extractor.PageCompletion) against the whole
+# check run again on the text so far after every chunk, as it was. The pages
+# in bench/fixtures are read in HTTP_STREAM_CHUNK chunks, as they are and with
+# their dividends or coupons table grown to ROWS rows. Exits 1 when the two
+# stop reading at different points.
+#
+#   python bench/bench_streaming.py [ROWS] [ITERATIONS]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import synthetic
+from modules import config
+from modules.investmint import ticker_page_complete
+from modules.smartlab_bonds import COUPONS_TABLE_START, bond_page_complete
+from modules.streaming import read_until
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+INVESTMINT_TABLE_START = """<table class="table table-hover">"""
+
+
+def read_page(path):
+    with open(os.path.join(FIXTURES_DIR, path), encoding="utf-8") as f:
+        return f.read()
+
+
+def with_table(page, start_mark, table):
+    # page with the table starting at start_mark replaced
+    start = page.find(start_mark)
+    end = page.find("</table>", start) + len("</table>")
+    return page[:start] + table + page[end:]
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def per_chunk(complete):
+    # the check made anew for every chunk, so each call sweeps the whole text
+    return lambda: lambda text: complete()(text)
+
+
+def read_time(chunks, complete, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        text, partial = read_until(iter(chunks), "utf-8", complete)
+    return (time.process_time() - start) / iterations, len(text), partial
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    investmint_page = read_page("investmint/sber.html")
+    smartlab_page = read_page("smartlab/SU26233RMFS5.html")
+    investmint_long = with_table(investmint_page, INVESTMINT_TABLE_START, synthetic.investmint_divs_table(2, rows) + "</table>")
+    smartlab_long = with_table(smartlab_page, COUPONS_TABLE_START, synthetic.smartlab_coupons_table(rows))
+
+    cases = [
+        ("investmint", investmint_page, ticker_page_complete, None),
+        ("investmint", investmint_page, ticker_page_complete, ("name",)),
+        ("investmint", investmint_long, ticker_page_complete, None),
+        ("smartlab", smartlab_page, bond_page_complete, None),
+        ("smartlab", smartlab_page, bond_page_complete, ("close_date",)),
+        ("smartlab", smartlab_long, bond_page_complete, None),
+    ]
+
+    print("{} byte chunks, per chunk / resumed".format(config.HTTP_STREAM_CHUNK))
+    print("{:<11} {:<11} {:>7} {:>7}  {:>19}  {:>6}".format("page", "fields", "KiB", "read", "cpu ms", "gain"))
+    differ = False
+    for source, page, make_check, fields in cases:
+        body = page.encode("utf-8")
+        chunks = chunked(body, config.HTTP_STREAM_CHUNK)
+        complete = lambda: make_check(fields=fields)
+        before, before_len, before_partial = read_time(chunks, per_chunk(complete), iterations)
+        after, after_len, after_partial = read_time(chunks, complete, iterations)
+        if (before_len, before_partial) != (after_len, after_partial):
+            print("{} {}: stopped at {} instead of {}".format(source, fields, after_len, before_len))
+            differ = True
+        read = len(page[:after_len].encode("utf-8"))
+        print("{:<11} {:<11} {:>7.0f} {:>6.0f}%  {:>8.3f} / {:>8.3f}  {:>5.1f}x".format(
+            source, ",".join(fields or ("*",)), len(body) / 1024, 100.0 * read / len(body), before * 1e3, after * 1e3, before / after))
+    if differ:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
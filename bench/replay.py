@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Transport adapter that answers upstream requests from the recorded pages in
+# bench/fixtures (see manifest.json) instead of the network. The hosts it
+# serves get unlimited governors, HOST_RATE is there to spare the real sites.
+
+import io
+import json
+import os
+import sys
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+from modules import http_client
+from modules.ratelimit import HostGovernor, governors
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+UNLIMITED = 10 ** 9
+
+
+class FixtureAdapter(HTTPAdapter):
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        super().__init__()
+        self.routes = dict()
+        self.pages_served = 0
+        self.bytes_served = 0
+        with open(os.path.join(fixtures_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        for fixture in manifest:
+            with open(os.path.join(fixtures_dir, fixture["file"]), "rb") as f:
+                body = f.read()
+            key = (fixture["method"], fixture["url"], fixture.get("data"))
+            self.routes[key] = (body, fixture["content_type"])
+
+    def lookup(self, request):
+        data = request.body.decode("utf-8") if isinstance(request.body, bytes) else request.body
+        route = self.routes.get((request.method, request.url, data))
+        if not route:
+            route = self.routes.get((request.method, request.url, None))
+        return route
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        route = self.lookup(request)
+        if route:
+            body, content_type = route
+            status = 200
+        else:
+            body, content_type = b"Not Found", "text/plain"
+            status = 404
+        self.pages_served += 1
+        self.bytes_served += len(body)
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers={"Content-Type": content_type, "Content-Length": str(len(body))},
+            status=status,
+            preload_content=False,
+            decode_content=False,
+            request_url=request.url,
+        )
+        return self.build_response(request, raw)
+
+
+def install(fixtures_dir=FIXTURES_DIR):
+    adapter = FixtureAdapter(fixtures_dir)
+    for host in sorted(set(urllib.parse.urlsplit(url).netloc for _, url, _ in adapter.routes)):
+        http_client.sessions.mount("https://{}/".format(host), adapter)
+        governors.set(host, HostGovernor(host, UNLIMITED, UNLIMITED, UNLIMITED, 0, 0))
+    return adapter
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Builders for large synthetic dividend and coupon tables in the markup the
+# parsers expect, used to measure cost on long histories.
+
+RU_MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября", "октября", "ноября", "декабря"]
+EN_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def investmint_future_row(i):
+    month = RU_MONTHS[i % 12]
+    return (
+        '<tr class="green-bg"><td class="text-nowrap text-center"><i></i></td>'
+        '<td class="text-nowrap">{day} {month} {year}</td><td class="text-nowrap">{day2} {month} {year}</td>'
+        '<td class="text-nowrap text-right">{div},{cents:02d}&nbsp;<small class="text-muted">₽</small></td>'
+        '<td class="text-right">{yld},{yld2}<small class="text-muted">%</small></td><td></td></tr>'
+    ).format(day=10 + i % 10, day2=12 + i % 10, month=month, year=2030 - i, div=10 + i % 30, cents=i % 100, yld=5 + i % 5, yld2=i % 10)
+
+
+def investmint_previous_row(i):
+    month = RU_MONTHS[(i * 5) % 12]
+    return (
+        '<tr class="{cls}"><td class="text-nowrap text-center"></td>'
+        '<td class="text-nowrap">{day} {month} {year}</td><td class="text-nowrap">{day2} {month} {year}</td>'
+        '<td class="text-nowrap text-right">{div},{cents:02d}&nbsp;<small class="text-muted">₽</small></td>'
+        '<td class="text-right">{yld},{yld2}<small class="text-muted">%</small></td>'
+        '<td class="text-right">{price},{yld2}&nbsp;<small class="text-muted">₽</small></td></tr>'
+    ).format(cls="gray-bg" if i % 3 == 0 else "", day=1 + i % 27, day2=2 + i % 27, month=month, year=2026 - i // 4,
+             div=1 + i % 30, cents=i % 100, yld=1 + i % 9, yld2=i % 10, price=100 + i % 400)
+
+
+def investmint_divs_table(future_rows, previous_rows):
+    rows = [investmint_future_row(i) for i in range(future_rows)]
+    rows += [investmint_previous_row(i) for i in range(previous_rows)]
+    return '<table class="table table-hover"><thead><tr><th></th></tr></thead><tbody>' + "".join(rows) + "</tbody>"
+
+
+def investing_dividends_page(rows):
+    parts = ['<html><body><table><thead><tr><th class="first left">Ex-Dividend Date<span sort_default class="headerSortDefault"></span></th><th>Dividend</th></tr></thead><tbody>']
+    for i in range(rows):
+        parts.append(
+            '<tr event_timestamp="{year}-{month:02d}-10">\n<td class="first left" data-value="1">{mon} {day}, {year}</td>\n'
+            '<td>{div}.{cents}</td>\n<td data-value="x"><span class="ico"></span></td>\n'
+            '<td data-value="2">{mon} {day2}, {year}</td>\n<td>{yld}.{cents}%</td>\n</tr>\n'.format(
+                year=2026 - i // 4, month=1 + (i * 3) % 12, mon=EN_MONTHS[(i * 3) % 12], day=1 + i % 27, day2=2 + i % 27,
+                div=1 + i % 30, cents=i % 10, yld=1 + i % 9))
+    parts.append("</tbody></table></body></html>")
+    return "".join(parts)
+
+
+def smartlab_coupons_table(rows):
+    parts = ['<table class="simple-little-table bond" cellspacing="0"><tr><th>N</th></tr>\n']
+    for i in range(rows):
+        parts.append('<tr>\n<td>{n}</td>\n<td>{day:02d}-{month:02d}-{year}\n</td>\n<td>{coupon}</td>\n<td>{yld}%</td>\n</tr>\n'.format(
+            n=i + 1, day=1 + i % 27, month=1 + (i * 6) % 12, year=2000 + i // 2, coupon="38.64", yld="7.75"))
+    parts.append("</table>")
+    return "".join(parts)
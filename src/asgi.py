@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import concurrent.futures
+import json
+import re
+import traceback
+import urllib.parse
+
+from modules import aio_scrapers
+from modules import aio_service
+from modules import config
+from modules import metrics
+from modules import serialization
+from modules import service
+
+
+async def send_response(send, status, body, content_type, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type),
+            (b"content-length", str(len(body)).encode("ascii")),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def without_body(send):
+    # a HEAD response has the headers and content-length of the GET one and an empty body
+    async def send_head(message):
+        if message["type"] == "http.response.body":
+            message = dict(message, body=b"")
+        await send(message)
+    return send_head
+
+
+async def send_json(send, obj, status=200):
+    await send_response(send, status, serialization.encode_json(obj), b"application/json")
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def query_param(scope, name):
+    values = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name)
+    return values[-1] if values else None
+
+
+async def fetch_response(source_name, symbol, fields):
+    try:
+        fields = service.parse_source_fields(source_name, fields)
+        payload = await aio_service.async_fetch_payload(source_name, symbol, fields)
+        if payload:
+            body = serialization.result_body(payload)
+        else:
+            body = serialization.error_body(service.SOURCES[source_name].not_found_error)
+    except Exception as e:
+        traceback.print_exc()
+        body = serialization.error_body("{}".format(e))
+    return body
+
+
+async def batch_response(source_name, body, fields):
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    try:
+        fields = service.parse_source_fields(source_name, fields)
+        symbols = service.parse_batch_symbols(data)
+        results, errors = await aio_service.async_fetch_many(source_name, symbols, fields)
+        body = serialization.batch_body(results, errors)
+    except Exception as e:
+        traceback.print_exc()
+        body = serialization.error_body("{}".format(e))
+    return body
+
+
+def analytics_body(results, errors, prices, as_of):
+    return serialization.batch_body(*service.analyze_bonds(results, errors, prices, as_of))
+
+
+async def analytics_response(body, date):
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    try:
+        symbols, prices, as_of = service.parse_analytics_request(data, date)
+        results, errors = await aio_service.async_fetch_many("smartlab", symbols)
+        body = await aio_scrapers.off_loop(analytics_body, results, errors, prices, as_of)
+    except Exception as e:
+        traceback.print_exc()
+        body = serialization.error_body("{}".format(e))
+    return body
+
+
+async def send_export(send, scope, source_name, body):
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    try:
+        export = service.history_export(source_name, query_param(scope, "format"))
+        symbols = service.parse_export_symbols(query_param(scope, "symbols"), data)
+    except Exception as e:
+        traceback.print_exc()
+        await send_response(send, 200, serialization.error_body("{}".format(e)), b"application/json")
+        return
+
+    # no content-length, the server sends it chunked
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", export.content_type.encode("ascii"))],
+    })
+    async for chunk in aio_service.async_export_chunks(export, symbols):
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def calendar_response(scope):
+    # status and body
+    try:
+        events = await aio_scrapers.off_loop(
+            service.calendar,
+            query_param(scope, "from"),
+            query_param(scope, "to"),
+            query_param(scope, "sources"),
+            query_param(scope, "events"),
+            query_param(scope, "limit"),
+        )
+        return 200, serialization.result_body(serialization.Payload(events))
+    except service.BadRequest as e:
+        return 400, serialization.error_body("{}".format(e))
+    except Exception as e:
+        traceback.print_exc()
+        return 200, serialization.error_body("{}".format(e))
+
+
+async def ping(scope, receive, send):
+    await send_response(send, 200, b"pong", b"text/html; charset=utf-8")
+
+
+async def send_metrics(scope, receive, send):
+    # other workers' snapshots are read from METRICS_DIR
+    text = await aio_scrapers.off_loop(metrics.registry.render)
+    await send_response(send, 200, text.encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8")
+
+
+async def handle_analytics(scope, receive, send):
+    await send_response(send, 200, await analytics_response(await read_body(receive), query_param(scope, "date")), b"application/json")
+
+
+async def handle_export(scope, receive, send, source_name):
+    await send_export(send, scope, source_name, await read_body(receive))
+
+
+async def handle_calendar(scope, receive, send):
+    await send_response(send, *await calendar_response(scope), b"application/json")
+
+
+def stats_handler(stats):
+    async def handle_stats(scope, receive, send):
+        await send_json(send, await aio_scrapers.off_loop(stats))
+    return handle_stats
+
+
+def batch_handler(source_name):
+    async def handle_batch(scope, receive, send):
+        # GET is routed here too, otherwise /<symbol> would serve it as symbol "batch"
+        if scope["method"] != "POST":
+            await send_response(send, 405, b"Method Not Allowed", b"text/plain", [(b"allow", b"POST")])
+            return
+        body = await batch_response(source_name, await read_body(receive), query_param(scope, "fields"))
+        await send_response(send, 200, body, b"application/json")
+    return handle_batch
+
+
+def symbol_handler(source_name):
+    async def handle_symbol(scope, receive, send, symbol):
+        body = await fetch_response(source_name, symbol, query_param(scope, "fields"))
+        await send_response(send, 200, body, b"application/json")
+    return handle_symbol
+
+
+GET = ("GET", "HEAD")
+
+# rule in Flask's syntax, methods, handler: the same rules main.py registers,
+# tests/test_routes.py checks both apps serve one set. Matched in order, a
+# <name> part is one path segment passed to the handler as name.
+ROUTES = [
+    ("/ping", GET, ping),
+    ("/metrics", GET, send_metrics),
+    ("/calendar", GET, handle_calendar),
+    ("/smartlab/analytics", ("POST",), handle_analytics),
+    ("/export/<source_name>", ("GET", "HEAD", "POST"), handle_export),
+    *[(path, GET, stats_handler(stats)) for path, stats in service.STATS_ROUTES.items()],
+    ("/investing/batch", ("GET", "HEAD", "POST"), batch_handler("investing")),
+    ("/investmint/batch", ("GET", "HEAD", "POST"), batch_handler("investmint")),
+    ("/smartlab/coupon/batch", ("GET", "HEAD", "POST"), batch_handler("smartlab")),
+    ("/investing/<symbol>", GET, symbol_handler("investing")),
+    ("/investmint/<symbol>", GET, symbol_handler("investmint")),
+    ("/smartlab/coupon/<symbol>", GET, symbol_handler("smartlab")),
+]
+
+ROUTE_REGEXES = [
+    (re.compile(re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", rule) + "$"), methods, handler)
+    for rule, methods, handler in ROUTES
+]
+
+
+async def handle_http(scope, receive, send):
+    for regex, methods, handler in ROUTE_REGEXES:
+        m = regex.match(scope["path"])
+        if not m:
+            continue
+        if scope["method"] not in methods:
+            await send_response(send, 405, b"Method Not Allowed", b"text/plain", [(b"allow", ", ".join(methods).encode("ascii"))])
+            return
+        await handler(scope, receive, send, **m.groupdict())
+        return
+    await send_response(send, 404, b"Not Found", b"text/plain")
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # for the disk cache, SQLite and parsing the handlers hand off, see aio_scrapers.off_loop
+            asyncio.get_running_loop().set_default_executor(
+                concurrent.futures.ThreadPoolExecutor(config.BATCH_WORKERS, thread_name_prefix="asgi-blocking"))
+            service.start_prefetch()
+            metrics.registry.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aio_scrapers.sessions.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await handle_lifespan(receive, send)
+    elif scope["type"] == "http":
+        await handle_http(scope, receive, without_body(send) if scope["method"] == "HEAD" else send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -4,59 +4,161 @@
 import traceback
 
 from flask import Flask
+from flask import abort
 from flask import jsonify
+from flask import request
 
-from modules.investing_stock import get_ticker_info
-from modules.investmint import parse_ticker
-from modules.smartlab_bonds import parse_coupon_by_isin
+from modules import metrics
+from modules import serialization
+from modules import service
 
 
 app = Flask(__name__)
 
+service.start_prefetch()
+metrics.registry.start()
+
+
+def json_response(body, status=200):
+    return app.response_class(body, status=status, mimetype="application/json")
+
 
 @app.route('/investing/<ticker>')
 def get_investing_ticker(ticker):
     try:
-        ticker_info = get_ticker_info(ticker)
+        fields = service.parse_source_fields("investing", request.args.get("fields"))
+        ticker_info = service.fetch_payload("investing", ticker, fields)
         if ticker_info:
-            resp = {"success": True, "result": ticker_info}
+            body = serialization.result_body(ticker_info)
         else:
-            resp = {"success": False, "error": "Ticker Not Found"}
+            body = serialization.error_body("Ticker Not Found")
     except Exception as e:
         traceback.print_exc()
-        resp = {"success": False, "error": "{}".format(e)}
+        body = serialization.error_body("{}".format(e))
     finally:
-        return jsonify(resp)
+        return json_response(body)
 
 
 @app.route('/investmint/<ticker>')
 def parse_investmint_ticker(ticker):
     try:
-        ticker_info = parse_ticker(ticker)
+        fields = service.parse_source_fields("investmint", request.args.get("fields"))
+        ticker_info = service.fetch_payload("investmint", ticker, fields)
         if ticker_info:
-            resp = {"success": True, "result": ticker_info}
+            body = serialization.result_body(ticker_info)
         else:
-            resp = {"success": False, "error": "Ticker Not Found"}
+            body = serialization.error_body("Ticker Not Found")
     except Exception as e:
         traceback.print_exc()
-        resp = {"success": False, "error": "{}".format(e)}
+        body = serialization.error_body("{}".format(e))
     finally:
-        return jsonify(resp)
+        return json_response(body)
 
 
 @app.route('/smartlab/coupon/<isin>')
 def parse_smartlab_coupon(isin):
     try:
-        coupon_info = parse_coupon_by_isin(isin)
+        fields = service.parse_source_fields("smartlab", request.args.get("fields"))
+        coupon_info = service.fetch_payload("smartlab", isin, fields)
         if coupon_info:
-            resp = {"success": True, "result": coupon_info}
+            body = serialization.result_body(coupon_info)
         else:
-            resp = {"success": False, "error": "ISIN Not Found"}
+            body = serialization.error_body("ISIN Not Found")
+    except Exception as e:
+        traceback.print_exc()
+        body = serialization.error_body("{}".format(e))
+    finally:
+        return json_response(body)
+
+
+def batch_response(source_name):
+    # the batch routes take GET too, otherwise /<ticker> would serve it as ticker "batch"
+    if request.method != "POST":
+        abort(405, valid_methods=["POST"])
+    try:
+        fields = service.parse_source_fields(source_name, request.args.get("fields"))
+        symbols = service.parse_batch_symbols(request.get_json(force=True, silent=True))
+        results, errors = service.fetch_many(source_name, symbols, fields)
+        body = serialization.batch_body(results, errors)
     except Exception as e:
         traceback.print_exc()
-        resp = {"success": False, "error": "{}".format(e)}
+        body = serialization.error_body("{}".format(e))
     finally:
-        return jsonify(resp)
+        return json_response(body)
+
+
+@app.route('/investing/batch', methods=['GET', 'POST'])
+def get_investing_batch():
+    return batch_response("investing")
+
+
+@app.route('/investmint/batch', methods=['GET', 'POST'])
+def parse_investmint_batch():
+    return batch_response("investmint")
+
+
+@app.route('/smartlab/coupon/batch', methods=['GET', 'POST'])
+def parse_smartlab_coupon_batch():
+    return batch_response("smartlab")
+
+
+@app.route('/smartlab/analytics', methods=['POST'])
+def smartlab_analytics():
+    try:
+        symbols, prices, as_of = service.parse_analytics_request(request.get_json(force=True, silent=True), request.args.get("date"))
+        results, errors = service.fetch_many("smartlab", symbols)
+        body = serialization.batch_body(*service.analyze_bonds(results, errors, prices, as_of))
+    except Exception as e:
+        traceback.print_exc()
+        body = serialization.error_body("{}".format(e))
+    finally:
+        return json_response(body)
+
+
+@app.route('/export/<source_name>', methods=['GET', 'POST'])
+def export_histories(source_name):
+    try:
+        export = service.history_export(source_name, request.args.get("format"))
+        symbols = service.parse_export_symbols(request.args.get("symbols"), request.get_json(force=True, silent=True))
+    except Exception as e:
+        traceback.print_exc()
+        return json_response(serialization.error_body("{}".format(e)))
+    return app.response_class(service.export_chunks(export, symbols), mimetype=export.content_type)
+
+
+@app.route('/calendar')
+def get_calendar():
+    try:
+        events = service.calendar(
+            request.args.get("from"),
+            request.args.get("to"),
+            request.args.get("sources"),
+            request.args.get("events"),
+            request.args.get("limit"),
+        )
+        body = serialization.result_body(serialization.Payload(events))
+        status = 200
+    except service.BadRequest as e:
+        body = serialization.error_body("{}".format(e))
+        status = 400
+    except Exception as e:
+        traceback.print_exc()
+        body = serialization.error_body("{}".format(e))
+        status = 200
+    finally:
+        return json_response(body, status)
+
+
+def stats_view(stats):
+    return lambda: jsonify(stats())
+
+for path, stats in service.STATS_ROUTES.items():
+    app.add_url_rule(path, path, stats_view(stats))
+
+
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route('/ping')
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import json
+import time
+import urllib.parse
+
+import aiohttp
+
+from modules import config
+from modules import metrics
+from modules.http_cache import bound_parser, disk_cache
+from modules.investing_stock import HEADERS, SEARCH_URL, TICKER_RESULT_SECTIONS, normalize_ticker, resolution_index
+from modules.investing_stock import choose_quote_link, filter_quotes, search_data
+from modules.investing_stock import parse_dividends_response, parse_quote_response
+from modules.investmint import parse_ticker_response, ticker_page_complete, ticker_url
+from modules.projection import project, result_sections
+from modules.ratelimit import RETRY_STATUSES, governors, parse_retry_after
+from modules.streaming import async_read_until, content_length, stream_stats
+from modules.smartlab_bonds import bond_page_complete, bond_url, parse_bond_response
+
+
+class AsyncResponse:
+    def __init__(self, status_code, text, headers, url, partial=False):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.url = url
+        self.partial = partial
+
+    def json(self):
+        return json.loads(self.text)
+
+
+async def on_request_start(session, ctx, params):
+    ctx.host = params.url.host
+
+async def on_connection_create_start(session, ctx, params):
+    ctx.connect_started = time.perf_counter()
+
+async def on_connection_create_end(session, ctx, params):
+    # DNS resolution, the TCP and the TLS handshakes
+    metrics.observe_stage(metrics.host_source(ctx.host), "connect", time.perf_counter() - ctx.connect_started)
+
+def connect_trace_config():
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+
+class AsyncSessions:
+    def __init__(self, pool_size, timeout, retries, backoff):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[connect_trace_config()])
+        return self._session
+
+    async def request(self, method, url, timeout=None, complete=None, **kwargs):
+        # with complete given a 200 body is read only until the check it makes is true of the text so far
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        host = urllib.parse.urlsplit(url).netloc
+        governor = governors.get(host)
+        attempt = 0
+        while True:
+            await governor.async_acquire()
+            status_code = None
+            retry_after = None
+            try:
+                started = time.perf_counter()
+                async with self.session().request(method, url, timeout=client_timeout, **kwargs) as r:
+                    headers_at = time.perf_counter()
+                    status_code = r.status
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                    if r.status not in RETRY_STATUSES or attempt >= self.retries:
+                        if complete is not None and r.status == 200:
+                            chunks = r.content.iter_chunked(config.HTTP_STREAM_CHUNK)
+                            text, partial = await async_read_until(chunks, r.charset or "utf-8", complete)
+                            stream_stats.record(host, r.content.total_bytes, content_length(r.headers), partial)
+                            response = AsyncResponse(r.status, text, r.headers, str(r.url), partial)
+                        else:
+                            response = AsyncResponse(r.status, await r.text(), r.headers, str(r.url))
+                        observe_response(host, r, started, headers_at)
+                        return response
+            except aiohttp.ClientConnectionError:
+                if attempt >= self.retries:
+                    raise
+            finally:
+                governor.async_release(status_code, retry_after)
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def observe_response(host, r, started, headers_at):
+    source = metrics.host_source(host)
+    metrics.observe_stage(source, "ttfb", headers_at - started)
+    metrics.observe_stage(source, "download", time.perf_counter() - headers_at)
+    metrics.observe_response(host, r.status, r.content.total_bytes)
+
+
+sessions = AsyncSessions(config.HTTP_POOL_SIZE, config.HTTP_TIMEOUT, config.HTTP_RETRIES, config.HTTP_BACKOFF)
+
+
+async def off_loop(func, *args):
+    # disk cache, SQLite and page parsing run in the loop's executor so they do not stall every request
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def projected(info, fields):
+    return project(info.json(), fields) if info else None
+
+
+async def get(url, **kwargs):
+    return await sessions.request("GET", url, **kwargs)
+
+async def post(url, **kwargs):
+    return await sessions.request("POST", url, **kwargs)
+
+async def get_parsed(url, parse, headers=None, complete=None, **kwargs):
+    if not config.HTTP_STREAM_ENABLED:
+        complete = None
+    if not config.HTTP_CACHE_ENABLED:
+        return await off_loop(parse, await get(url, headers=headers, complete=complete, **kwargs))
+    entry = await off_loop(disk_cache.lookup, url, parse)
+    r = await get(url, headers=disk_cache.request_headers(entry, headers), complete=complete, **kwargs)
+    return await off_loop(disk_cache.resolve, url, entry, r, parse)
+
+
+async def async_parse_ticker(ticker, fields=None):
+    ticker_info = await get_parsed(
+        ticker_url(ticker),
+        bound_parser(parse_ticker_response, fields),
+        complete=functools.partial(ticker_page_complete, fields=fields),
+    )
+    return await off_loop(projected, ticker_info, fields)
+
+
+async def async_resolve_quote_link(ticker_):
+    ticker = ticker_.lower().replace(".", "")
+
+    r = await post(SEARCH_URL, data=search_data(ticker.lower()), headers=HEADERS, timeout=3)
+    quotes = filter_quotes(r.json(), ticker.upper())
+
+    if not quotes and ticker_.endswith("p"):
+        ticker = ticker[:-1]
+        r = await post(SEARCH_URL, data=search_data(ticker), headers=HEADERS, timeout=3)
+        quotes = filter_quotes(r.json(), ticker.upper() + "_p")
+
+    if not quotes:
+        return None
+
+    return choose_quote_link(quotes)
+
+
+async def async_fetch_quote(link, dividend_link=None, sections=None, limit=None):
+    async def no_dividends():
+        return None
+
+    parse_quote = bound_parser(parse_quote_response, sections)
+    parse_dividends = bound_parser(parse_dividends_response, limit)
+    dividends = sections is None or "dividends" in sections
+
+    quote, all_divs = await asyncio.gather(
+        get_parsed(link, parse_quote, headers=HEADERS, timeout=3),
+        get_parsed(dividend_link, parse_dividends, headers=HEADERS, timeout=3) if dividends and dividend_link else no_dividends(),
+    )
+    if not quote:
+        return None, None
+
+    ticker_info, page_dividend_link = quote
+    if dividends and all_divs is None and page_dividend_link and page_dividend_link != dividend_link:
+        all_divs = await get_parsed(page_dividend_link, parse_dividends, headers=HEADERS, timeout=3)
+    if all_divs is not None:
+        ticker_info.all_divs = all_divs
+
+    return ticker_info, page_dividend_link
+
+
+async def async_get_ticker_info(ticker_, fields=None):
+    key = normalize_ticker(ticker_)
+    sections, limit = result_sections(TICKER_RESULT_SECTIONS, fields)
+
+    resolution = await off_loop(resolution_index.get, key)
+    if resolution:
+        link, dividend_link = resolution
+        ticker_info, page_dividend_link = await async_fetch_quote(link, dividend_link, sections, limit)
+        if ticker_info:
+            if page_dividend_link != dividend_link:
+                await off_loop(resolution_index.put, key, link, page_dividend_link)
+            return await off_loop(projected, ticker_info, fields)
+        await off_loop(resolution_index.invalidate, key)
+
+    link = await async_resolve_quote_link(ticker_)
+    if not link:
+        return None
+
+    ticker_info, dividend_link = await async_fetch_quote(link, None, sections, limit)
+    if not ticker_info:
+        return None
+
+    await off_loop(resolution_index.put, key, link, dividend_link)
+    return await off_loop(projected, ticker_info, fields)
+
+
+async def async_parse_coupon_by_isin(isin, fields=None):
+    bond_info = await get_parsed(
+        bond_url(isin),
+        bound_parser(parse_bond_response, fields),
+        complete=functools.partial(bond_page_complete, fields=fields),
+    )
+    return await off_loop(projected, bond_info, fields)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import collections
+import traceback
+
+from modules import config
+from modules import metrics
+from modules.aio_scrapers import async_get_ticker_info, async_parse_coupon_by_isin, async_parse_ticker, off_loop
+from modules.service import SOURCES, encode_payload, fetched_outcome, flights, history_fields, index_result, normalize_isin
+from modules.service import projection_key, response_cache
+
+
+ASYNC_LOADERS = {
+    "investmint": lambda ticker, fields=None: async_parse_ticker(ticker.strip(), fields),
+    "investing": lambda ticker, fields=None: async_get_ticker_info(ticker.strip(), fields),
+    "smartlab": lambda isin, fields=None: async_parse_coupon_by_isin(normalize_isin(isin), fields),
+}
+
+
+async def async_load_payload(source_name, symbol, fields=None):
+    with metrics.timed(source_name, "scrape"):
+        value = await ASYNC_LOADERS[source_name](symbol, fields)
+    await off_loop(index_result, SOURCES[source_name], symbol, fields, value)
+    return await off_loop(encode_payload, source_name, value)
+
+
+async def async_fetch_payload(source_name, symbol, fields=None):
+    key, payload, refresh = await response_cache.off_loop(projection_key, source_name, SOURCES[source_name].normalize(symbol), fields)
+    if refresh:
+        response_cache.start_async_refresh(
+            source_name, key, lambda: flights.async_do((source_name, key), lambda: async_load_payload(source_name, symbol)))
+    if payload is not None:
+        return payload
+    coalesced_loader = lambda: flights.async_do((source_name, key), lambda: async_load_payload(source_name, symbol, fields))
+    return await response_cache.async_get_or_load(source_name, key, coalesced_loader)
+
+
+async def async_fetch(source_name, symbol, fields=None):
+    payload = await async_fetch_payload(source_name, symbol, fields)
+    return payload.value if payload else None
+
+
+async def async_fetch_many(source_name, symbols, fields=None):
+    source = SOURCES[source_name]
+    semaphore = asyncio.Semaphore(config.BATCH_WORKERS)
+
+    async def fetch_one(symbol):
+        async with semaphore:
+            return await async_fetch_payload(source_name, symbol, fields)
+
+    symbols = list(dict.fromkeys(symbols))
+    outcomes = await asyncio.gather(*[fetch_one(x) for x in symbols], return_exceptions=True)
+
+    results = dict()
+    errors = dict()
+    for symbol, outcome in zip(symbols, outcomes):
+        if isinstance(outcome, Exception):
+            traceback.print_exception(type(outcome), outcome, outcome.__traceback__)
+            errors[symbol] = "{}".format(outcome)
+        elif outcome:
+            results[symbol] = outcome
+        else:
+            errors[symbol] = source.not_found_error
+    return results, errors
+
+
+async def async_iter_fetched(source_name, symbols, fields=None):
+    source = SOURCES[source_name]
+    window = collections.deque()
+
+    async def outcome(symbol, task):
+        try:
+            return fetched_outcome(source, symbol, await task)
+        except Exception as e:
+            traceback.print_exception(type(e), e, e.__traceback__)
+            return fetched_outcome(source, symbol, error="{}".format(e))
+
+    for symbol in dict.fromkeys(symbols):
+        window.append((symbol, asyncio.ensure_future(async_fetch_payload(source_name, symbol, fields))))
+        if len(window) >= config.BATCH_WORKERS:
+            yield await outcome(*window.popleft())
+    while window:
+        yield await outcome(*window.popleft())
+
+
+async def async_export_chunks(export, symbols):
+    async for symbol, result, error in async_iter_fetched(export.source_name, symbols, history_fields(export.source_name)):
+        # NDJSON encoding or Arrow record batches, in the loop's executor
+        chunk = await off_loop(export.feed, symbol, result, error)
+        if chunk:
+            yield chunk
+    yield await off_loop(export.close)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Yield to maturity, duration and convexity of many smart-lab bonds at once.
+# The coupon schedules of all bonds are packed into flat columns, one row per
+# payment ordered by bond and date, and every per-bond sum is a
+# numpy.bincount over the bond column. Yields are effective annual with
+# t = days / 365, as the exchange quotes them.
+
+import datetime
+
+from modules.models.common import EPOCH_ORDINAL
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DAYS_IN_YEAR = 365.0
+YTM_MAX_ITERATIONS = 100
+YTM_TOLERANCE = 1e-9
+# of the continuously compounded rate, keeps exp() finite
+RATE_BOUNDS = (-5.0, 5.0)
+
+
+class CashFlows:
+    __slots__ = (
+        "size", "bond", "times", "coupons", "principals",
+        "nominal", "accrual_start", "next_coupon_date", "next_coupon",
+    )
+
+    def __init__(self, size, bond, times, coupons, principals, nominal, accrual_start, next_coupon_date, next_coupon):
+        self.size = size
+        # one row per payment: bond index, years from as_of, coupon and principal paid
+        self.bond = bond
+        self.times = times
+        self.coupons = coupons
+        self.principals = principals
+        # one row per bond
+        self.nominal = nominal
+        self.accrual_start = accrual_start
+        self.next_coupon_date = next_coupon_date
+        self.next_coupon = next_coupon
+
+    @property
+    def amounts(self):
+        return self.coupons + self.principals
+
+
+def date_column(bonds, key):
+    return numpy.fromiter((x[key]["timestamp"] if x.get(key) else numpy.nan for x in bonds), numpy.float64, len(bonds))
+
+
+def pack(bonds, as_of):
+    # bonds are smartlab results, -> CashFlows of the ones with payments after as_of and their indexes in bonds
+    schedules = [x.get("all_coupons") or () for x in bonds]
+    counts = numpy.fromiter(map(len, schedules), numpy.intp, len(bonds))
+    total = int(counts.sum())
+    bond = numpy.repeat(numpy.arange(len(bonds)), counts)
+    timestamps = numpy.fromiter((c["date"]["timestamp"] for x in schedules for c in x), numpy.float64, total)
+    # None comes out as nan
+    amounts = numpy.array([c["coupon"] for x in schedules for c in x], dtype=numpy.float64)
+    # smart-lab lists coupons by date already, so this is only a check most of the time
+    if (numpy.diff(timestamps)[bond[1:] == bond[:-1]] < 0).any():
+        order = numpy.lexsort((timestamps, bond))
+        timestamps = timestamps[order]
+        amounts = amounts[order]
+
+    # floaters list their later coupons without an amount, the last known one of the bond is assumed
+    known = numpy.maximum.accumulate(numpy.where(numpy.isnan(amounts), -1, numpy.arange(total)))
+    filled = (known >= 0) & (bond[numpy.maximum(known, 0)] == bond)
+    amounts = numpy.where(filled, amounts[numpy.maximum(known, 0)], numpy.nan)
+
+    close_date = date_column(bonds, "close_date")
+    nominal = numpy.fromiter((x.get("nominal") or numpy.nan for x in bonds), numpy.float64, len(bonds))
+    alive = (close_date > as_of) & (nominal > 0)
+
+    # the current coupon accrues from the previous one, or from the placement date
+    past = timestamps <= as_of
+    accrual_start = date_column(bonds, "publish_date")
+    numpy.fmax.at(accrual_start, bond[past], timestamps[past])
+
+    future = ~past & (timestamps <= close_date[bond]) & alive[bond] & ~numpy.isnan(amounts)
+    bond, timestamps, amounts = bond[future], timestamps[future], amounts[future]
+    next_coupon_date = numpy.full(len(bonds), numpy.nan)
+    next_coupon = numpy.zeros(len(bonds))
+    firsts, first_rows = numpy.unique(bond, return_index=True)
+    next_coupon_date[firsts] = timestamps[first_rows]
+    next_coupon[firsts] = amounts[first_rows]
+
+    # the nominal is repaid at close_date, a row of its own
+    indexes = numpy.flatnonzero(alive)
+    compact = numpy.cumsum(alive) - 1
+    return CashFlows(
+        len(indexes),
+        numpy.concatenate((compact[bond], numpy.arange(len(indexes)))),
+        (numpy.concatenate((timestamps, close_date[indexes])) - as_of) / 86400 / DAYS_IN_YEAR,
+        numpy.concatenate((amounts, numpy.zeros(len(indexes)))),
+        numpy.concatenate((numpy.zeros(len(bond)), nominal[indexes])),
+        nominal[indexes],
+        accrual_start[indexes],
+        next_coupon_date[indexes],
+        next_coupon[indexes],
+    ), indexes
+
+
+def per_bond(flows, weights):
+    return numpy.bincount(flows.bond, weights=weights, minlength=flows.size)
+
+
+def accrued_interest(flows, as_of):
+    period = flows.next_coupon_date - flows.accrual_start
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        accrued = flows.next_coupon * (as_of - flows.accrual_start) / period
+    return numpy.where(numpy.isfinite(accrued) & (period > 0), accrued, 0.0)
+
+
+def solve_ytm(flows, amounts, prices, guess):
+    # Newton's method on price(r) = sum(cf * exp(-r * t)) with r = ln(1 + ytm), all bonds at once.
+    # Price is convex and decreasing in r, so past the first step it converges monotonically.
+    rate = numpy.log1p(guess)
+    solved = numpy.zeros(flows.size, dtype=bool)
+    active = numpy.ones(flows.size, dtype=bool)
+    for _ in range(YTM_MAX_ITERATIONS):
+        discounted = amounts * numpy.exp(-rate[flows.bond] * flows.times)
+        error = per_bond(flows, discounted) - prices
+        slope = -per_bond(flows, flows.times * discounted)
+        solved = numpy.abs(error) <= YTM_TOLERANCE * prices
+        active &= ~solved
+        if not active.any():
+            break
+        step = numpy.where(active & (slope < 0), error / numpy.where(slope < 0, slope, -1), 0.0)
+        next_rate = numpy.clip(rate - step, *RATE_BOUNDS)
+        # a yield beyond RATE_BOUNDS pins the rate there
+        active &= next_rate != rate
+        rate = next_rate
+    ytm = numpy.expm1(rate)
+    ytm[~solved] = numpy.nan
+    return ytm
+
+
+def analyze(flows, clean_prices, guess, as_of):
+    # clean prices are in percent of nominal, as quoted
+    amounts = flows.amounts
+    accrued = accrued_interest(flows, as_of)
+    dirty = clean_prices * flows.nominal / 100 + accrued
+    ytm = solve_ytm(flows, amounts, dirty, guess)
+
+    discounted = amounts * (1 + ytm[flows.bond]) ** -flows.times
+    present_value = per_bond(flows, discounted)
+    macaulay = per_bond(flows, flows.times * discounted) / present_value
+    convexity = per_bond(flows, flows.times * (flows.times + 1) * discounted) / present_value / (1 + ytm) ** 2
+    return {
+        "accrued": accrued,
+        "dirty_price": dirty,
+        "ytm": ytm * 100,
+        "macaulay_duration": macaulay,
+        "modified_duration": macaulay / (1 + ytm),
+        "convexity": convexity,
+        "remaining_coupons": per_bond(flows, (flows.coupons > 0).astype(numpy.float64)),
+    }
+
+
+def number(value):
+    return float(value) if numpy.isfinite(value) else None
+
+
+def timestamp_date_json(timestamp):
+    date = datetime.date.fromordinal(EPOCH_ORDINAL + int(timestamp) // 86400)
+    return {"day": date.day, "month": date.month, "year": date.year, "timestamp": int(timestamp)}
+
+
+def bond_analytics(bonds, prices, as_of):
+    # bonds are smartlab results by ISIN, prices clean percent of nominal by ISIN (par when missing)
+    if numpy is None:
+        raise ValueError("Bond analytics need numpy installed")
+
+    isins = list(bonds)
+    flows, indexes = pack([bonds[x] for x in isins], as_of)
+    alive = [isins[x] for x in indexes]
+    errors = {x: "No cash flows left" for x in set(isins).difference(alive)}
+    if not alive:
+        return dict(), errors
+
+    clean_prices = numpy.array([prices.get(x, 100.0) for x in alive], dtype=numpy.float64)
+    guess = numpy.array([(bonds[x].get("coupon_yield") or 10.0) / 100 for x in alive], dtype=numpy.float64)
+    columns = analyze(flows, clean_prices, guess, as_of)
+
+    results = dict()
+    for idx, isin in enumerate(alive):
+        next_coupon_date = flows.next_coupon_date[idx]
+        results[isin] = {
+            "isin": isin,
+            "price": float(clean_prices[idx]),
+            "accrued": float(columns["accrued"][idx]),
+            "dirty_price": float(columns["dirty_price"][idx]),
+            "ytm": number(columns["ytm"][idx]),
+            "macaulay_duration": number(columns["macaulay_duration"][idx]),
+            "modified_duration": number(columns["modified_duration"][idx]),
+            "convexity": number(columns["convexity"][idx]),
+            "remaining_coupons": int(columns["remaining_coupons"][idx]),
+            "next_coupon": {
+                "date": timestamp_date_json(next_coupon_date),
+                "amount": float(flows.next_coupon[idx]),
+                "days": int((next_coupon_date - as_of) // 86400),
+            } if numpy.isfinite(next_coupon_date) else None,
+        }
+    return results, errors
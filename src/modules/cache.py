@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import collections
+import threading
+import time
+import traceback
+
+
+class CacheEntry:
+    def __init__(self, value, fresh_till, stale_till):
+        self.value = value
+        self.fresh_till = fresh_till
+        self.stale_till = stale_till
+
+
+class ResponseCache:
+    def __init__(self, ttls, stale_ttls, max_entries, shared=None):
+        self.ttls = ttls
+        self.stale_ttls = stale_ttls
+        self.max_entries = max_entries
+        # a store other processes read and write too, consulted when the local entry is not fresh
+        self.shared = shared
+        self._entries = collections.OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "shared_hits": 0,
+            "peeks": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "evictions": 0,
+        }
+
+    def put(self, source, key, value):
+        now = time.time()
+        ttl = self.ttls.get(source, 0)
+        entry = CacheEntry(value, now + ttl, now + ttl + self.stale_ttls.get(source, 0))
+        with self._lock:
+            self._store(source, key, entry)
+        if self.shared is not None:
+            self.shared.put(source, key, entry)
+
+    def _store(self, source, key, entry):
+        self._entries[(source, key)] = entry
+        self._entries.move_to_end((source, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _touch(self, source, key):
+        # the entry may have been evicted since _entry returned it
+        if (source, key) in self._entries:
+            self._entries.move_to_end((source, key))
+
+    def _entry(self, source, key, now):
+        with self._lock:
+            entry = self._entries.get((source, key))
+        if self.shared is None or (entry and now < entry.fresh_till):
+            return entry
+        shared_entry = self.shared.get(source, key)
+        if shared_entry is None or (entry and shared_entry.fresh_till <= entry.fresh_till):
+            return entry
+        with self._lock:
+            self._store(source, key, shared_entry)
+            self.stats["shared_hits"] += 1
+        return shared_entry
+
+    def _lookup(self, source, key):
+        now = time.time()
+        entry = self._entry(source, key, now)
+        with self._lock:
+            if entry and now < entry.fresh_till:
+                self._touch(source, key)
+                self.stats["hits"] += 1
+                return True, entry.value, False
+            if entry and now < entry.stale_till:
+                self._touch(source, key)
+                self.stats["stale_hits"] += 1
+                refresh = (source, key) not in self._refreshing
+                if refresh:
+                    self._refreshing.add((source, key))
+                return True, entry.value, refresh
+            self.stats["misses"] += 1
+            return False, None, False
+
+    def peek(self, source, key):
+        # the cached value, fresh or stale, without loading it, and like _lookup
+        # whether the caller is the one to refresh a stale value, see start_refresh
+        now = time.time()
+        entry = self._entry(source, key, now)
+        with self._lock:
+            if entry and now < entry.stale_till:
+                self._touch(source, key)
+                self.stats["peeks"] += 1
+                refresh = now >= entry.fresh_till and (source, key) not in self._refreshing
+                if refresh:
+                    self._refreshing.add((source, key))
+                return entry.value, refresh
+        return None, False
+
+    def start_refresh(self, source, key, loader):
+        threading.Thread(target=self._refresh, args=(source, key, loader), daemon=True).start()
+
+    def start_async_refresh(self, source, key, loader):
+        asyncio.ensure_future(self._async_refresh(source, key, loader))
+
+    def get_or_load(self, source, key, loader):
+        found, value, refresh = self._lookup(source, key)
+        if refresh:
+            self.start_refresh(source, key, loader)
+        if found:
+            return value
+
+        value = loader()
+        if value is not None:
+            self.put(source, key, value)
+        return value
+
+    async def off_loop(self, func, *args):
+        # the shared store is SQLite and runs in the loop's executor, local entries are read in place
+        if self.shared is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def async_get_or_load(self, source, key, loader):
+        found, value, refresh = await self.off_loop(self._lookup, source, key)
+        if refresh:
+            self.start_async_refresh(source, key, loader)
+        if found:
+            return value
+
+        value = await loader()
+        if value is not None:
+            await self.off_loop(self.put, source, key, value)
+        return value
+
+    def _refresh(self, source, key, loader):
+        try:
+            value = loader()
+            if value is not None:
+                self.put(source, key, value)
+            with self._lock:
+                self.stats["refreshes"] += 1
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self.stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard((source, key))
+
+    async def _async_refresh(self, source, key, loader):
+        try:
+            value = await loader()
+            if value is not None:
+                await self.off_loop(self.put, source, key, value)
+            with self._lock:
+                self.stats["refreshes"] += 1
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self.stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard((source, key))
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            res["entries"] = len(self._entries)
+            res["refreshing"] = len(self._refreshing)
+        if self.shared is not None:
+            res["shared"] = self.shared.json()
+        return res
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from modules import config
+from modules.models.common import EPOCH_ORDINAL
+from modules.serialization import dumps, loads
+
+
+# result list -> (date key, event name) of each record in it
+EVENT_DATES = {
+    "investmint": {
+        "future_divs": (("buy_till_date", "buy_till"), ("registry_close_date", "registry_close")),
+        "previous_divs": (("buy_till_date", "buy_till"), ("registry_close_date", "registry_close")),
+    },
+    "investing": {
+        "all_divs": (("ex_div_date", "ex_div"), ("pay_date", "pay")),
+    },
+    "smartlab": {
+        "all_coupons": (("date", "coupon"),),
+    },
+}
+
+EVENTS = sorted(set(event for lists in EVENT_DATES.values() for dates in lists.values() for _, event in dates))
+
+
+def iter_events(source, result):
+    # yields (timestamp, event, record) for every dated record of a full result
+    for list_key, dates in EVENT_DATES[source].items():
+        for record in result.get(list_key) or []:
+            encoded = None
+            for date_key, event in dates:
+                date = record.get(date_key)
+                if date:
+                    if encoded is None:
+                        encoded = dumps(record)
+                    yield date["timestamp"], event, encoded
+
+
+def date_timestamp(value):
+    # "2024-07-10" -> the timestamp models.common.Date gives that day
+    return (datetime.date.fromisoformat(value).toordinal() - EPOCH_ORDINAL) * 86400
+
+
+class CalendarIndex:
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "updates": 0,
+            "unchanged": 0,
+            "removals": 0,
+            "queries": 0,
+        }
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendar_symbols (
+                    source TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (source, symbol)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendar_events (
+                    timestamp INTEGER NOT NULL,
+                    source TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    record BLOB NOT NULL
+                )
+            """)
+            # range queries walk this index instead of the table
+            self._conn.execute("CREATE INDEX IF NOT EXISTS calendar_events_timestamp ON calendar_events (timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS calendar_events_symbol ON calendar_events (source, symbol)")
+            self._conn.commit()
+        return self._conn
+
+    def update(self, source, symbol, result):
+        # replaces the symbol's events with those of a freshly parsed result, None drops them
+        events = sorted(iter_events(source, result)) if result else list()
+        digest = hashlib.sha1(repr(events).encode("utf-8")).hexdigest()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT digest FROM calendar_symbols WHERE source = ? AND symbol = ?", (source, symbol)).fetchone()
+            if row and row[0] == digest:
+                self.stats["unchanged"] += 1
+                return
+            conn.execute("DELETE FROM calendar_events WHERE source = ? AND symbol = ?", (source, symbol))
+            if result:
+                conn.executemany(
+                    "INSERT INTO calendar_events (timestamp, source, symbol, event, record) VALUES (?, ?, ?, ?, ?)",
+                    [(timestamp, source, symbol, event, record) for timestamp, event, record in events])
+                conn.execute(
+                    "INSERT OR REPLACE INTO calendar_symbols (source, symbol, digest, updated_at) VALUES (?, ?, ?, ?)",
+                    (source, symbol, digest, time.time()))
+                self.stats["updates"] += 1
+            else:
+                conn.execute("DELETE FROM calendar_symbols WHERE source = ? AND symbol = ?", (source, symbol))
+                self.stats["removals"] += 1
+            conn.commit()
+
+    def query(self, start, end, sources=None, events=None, limit=None):
+        # events dated start..end inclusive, ordered by date
+        sql = "SELECT timestamp, source, symbol, event, record FROM calendar_events WHERE timestamp >= ? AND timestamp <= ?"
+        params = [start, end]
+        if sources:
+            sql += " AND source IN ({})".format(",".join("?" * len(sources)))
+            params += sources
+        if events:
+            sql += " AND event IN ({})".format(",".join("?" * len(events)))
+            params += events
+        sql += " ORDER BY timestamp, source, symbol, event"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+            self.stats["queries"] += 1
+        return [{
+            "timestamp": timestamp,
+            "source": source,
+            "symbol": symbol,
+            "event": event,
+            "record": loads(record),
+        } for timestamp, source, symbol, event, record in rows]
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            if self._conn is not None:
+                res["symbols"] = self._conn.execute("SELECT COUNT(*) FROM calendar_symbols").fetchone()[0]
+                res["events"] = self._conn.execute("SELECT COUNT(*) FROM calendar_events").fetchone()[0]
+        return res
+
+
+calendar_index = CalendarIndex(config.CALENDAR_DB) if config.CALENDAR_ENABLED else None
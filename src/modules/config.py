@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+def env_str(name, default):
+    value = os.environ.get(name)
+    return value if value else default
+
+
+SOURCES = ("investmint", "investing", "smartlab")
+
+CACHE_DIR = env_str("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "investmint_ticker_parser"))
+
+
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 4096)
+
+CACHE_TTL = {
+    "investmint": env_float("CACHE_TTL_INVESTMINT", 300),
+    "investing": env_float("CACHE_TTL_INVESTING", 60),
+    "smartlab": env_float("CACHE_TTL_SMARTLAB", 900),
+}
+
+CACHE_STALE_TTL = {
+    "investmint": env_float("CACHE_STALE_TTL_INVESTMINT", 3600),
+    "investing": env_float("CACHE_STALE_TTL_INVESTING", 600),
+    "smartlab": env_float("CACHE_STALE_TTL_SMARTLAB", 3600),
+}
+
+
+# results every worker process of server.py reads and writes, so a symbol loaded by one is served by all;
+# a path on /dev/shm keeps it in memory
+SHARED_CACHE_ENABLED = env_int("SHARED_CACHE_ENABLED", 0)
+SHARED_CACHE_DB = env_str("SHARED_CACHE_DB", os.path.join(CACHE_DIR, "results.sqlite"))
+
+
+# "auto" uses orjson when it is installed, "json" forces the standard library
+JSON_ENCODER = env_str("JSON_ENCODER", "auto")
+
+
+BATCH_WORKERS = env_int("BATCH_WORKERS", 16)
+BATCH_MAX_SYMBOLS = env_int("BATCH_MAX_SYMBOLS", 1000)
+
+# /export streams histories, so it takes more symbols than a batch
+EXPORT_MAX_SYMBOLS = env_int("EXPORT_MAX_SYMBOLS", 10000)
+EXPORT_BATCH_ROWS = env_int("EXPORT_BATCH_ROWS", 65536)
+
+
+HTTP_POOL_SIZE = env_int("HTTP_POOL_SIZE", 32)
+HTTP_TIMEOUT = env_float("HTTP_TIMEOUT", 10)
+HTTP_RETRIES = env_int("HTTP_RETRIES", 2)
+HTTP_BACKOFF = env_float("HTTP_BACKOFF", 0.3)
+
+
+# pages are read in chunks and the connection is dropped as soon as the parsed sections are in
+HTTP_STREAM_ENABLED = env_int("HTTP_STREAM_ENABLED", 1)
+HTTP_STREAM_CHUNK = env_int("HTTP_STREAM_CHUNK", 16 * 1024)
+
+
+HTTP_CACHE_ENABLED = env_int("HTTP_CACHE_ENABLED", 1)
+HTTP_CACHE_DIR = env_str("HTTP_CACHE_DIR", os.path.join(CACHE_DIR, "http"))
+HTTP_CACHE_MAX_BYTES = env_int("HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+
+# "selectolax" finds the page fields in the document it parses, when it is installed, "regex" by their anchors in the text;
+# regex stays the default, it is about twice as fast and selectolax only holds up better to markup changes
+HTML_PARSER = env_str("HTML_PARSER", "regex")
+
+# > 0 runs the page parsers of the sync loaders in that many worker processes, see scrape.py
+PARSE_PROCESSES = env_int("PARSE_PROCESSES", 0)
+
+
+INVESTING_RESOLUTION_DB = env_str("INVESTING_RESOLUTION_DB", os.path.join(CACHE_DIR, "investing_resolutions.sqlite"))
+INVESTING_RESOLUTION_TTL = env_float("INVESTING_RESOLUTION_TTL", 30 * 24 * 3600)
+
+
+HISTORY_ENABLED = env_int("HISTORY_ENABLED", 1)
+HISTORY_DB = env_str("HISTORY_DB", os.path.join(CACHE_DIR, "history.sqlite"))
+# histories kept decoded in memory, least recently used are dropped first
+HISTORY_MEMORY_ENTRIES = env_int("HISTORY_MEMORY_ENTRIES", 256)
+
+
+# dated dividend and coupon records of every fully parsed symbol, served by /calendar
+CALENDAR_ENABLED = env_int("CALENDAR_ENABLED", 1)
+CALENDAR_DB = env_str("CALENDAR_DB", os.path.join(CACHE_DIR, "calendar.sqlite"))
+CALENDAR_DAYS = env_int("CALENDAR_DAYS", 7)
+CALENDAR_MAX_EVENTS = env_int("CALENDAR_MAX_EVENTS", 10000)
+
+
+PREFETCH_WATCHLIST = env_str("PREFETCH_WATCHLIST", "")
+# only the worker process holding this lock runs the prefetcher
+PREFETCH_LOCK = env_str("PREFETCH_LOCK", os.path.join(CACHE_DIR, "prefetch.lock"))
+
+PREFETCH_INTERVAL = {
+    "investmint": env_float("PREFETCH_INTERVAL_INVESTMINT", 240),
+    "investing": env_float("PREFETCH_INTERVAL_INVESTING", 50),
+    "smartlab": env_float("PREFETCH_INTERVAL_SMARTLAB", 720),
+}
+
+PREFETCH_JITTER = env_float("PREFETCH_JITTER", 0.1)
+PREFETCH_RATE = env_float("PREFETCH_RATE", 5)
+PREFETCH_WORKERS = env_int("PREFETCH_WORKERS", 8)
+PREFETCH_URGENT_DAYS = env_float("PREFETCH_URGENT_DAYS", 14)
+PREFETCH_URGENT_FACTOR = env_float("PREFETCH_URGENT_FACTOR", 0.25)
+
+
+HOST_RATE = env_float("HOST_RATE", 5)
+HOST_BURST = env_int("HOST_BURST", 10)
+HOST_MAX_CONCURRENCY = env_int("HOST_MAX_CONCURRENCY", 8)
+HOST_BACKOFF_MIN = env_float("HOST_BACKOFF_MIN", 1)
+HOST_BACKOFF_MAX = env_float("HOST_BACKOFF_MAX", 60)
+# per-host overrides, e.g. {"investmint.ru": {"rate": 2, "max_concurrency": 4}}
+HOST_LIMITS = json.loads(env_str("HOST_LIMITS", "{}"))
+# processes the host limits above are split between, set by server.py for its workers
+# once at startup: each worker keeps its share, so the limits hold for SERVER_WORKERS
+# workers and are exceeded while TTIN adds more, or underused after TTOU
+WORKER_PROCESSES = env_int("WORKER_PROCESSES", 1)
+
+
+# where each worker process leaves its metrics for /metrics to add up, set by server.py
+METRICS_DIR = env_str("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = env_float("METRICS_FLUSH_INTERVAL", 2)
+
+
+SERVER_APP = env_str("SERVER_APP", "asgi:app")
+# uvicorn cannot tell a WSGI app from an ASGI one, the Flask app in main.py is WSGI
+SERVER_INTERFACE = env_str("SERVER_INTERFACE", "wsgi" if SERVER_APP.startswith("main:") else "auto")
+SERVER_HOST = env_str("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = env_int("SERVER_PORT", 8000)
+SERVER_WORKERS = env_int("SERVER_WORKERS", os.cpu_count() or 1)
+# seconds a stopping or reloaded worker gets to finish the requests it has
+SERVER_GRACEFUL_TIMEOUT = env_int("SERVER_GRACEFUL_TIMEOUT", 30)
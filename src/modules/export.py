@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Flat dividend and coupon history rows of many symbols, written out a chunk
+# at a time: NDJSON, or Arrow IPC stream / Parquet record batches when
+# pyarrow is installed. Columns are the slots of the row models, plus the
+# symbol and the result list each row comes from.
+
+from modules import config
+from modules.models import investing, investmint, smartlab
+from modules.serialization import dumps
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# result list -> row model, per source
+HISTORIES = {
+    "investmint": (("future_divs", investmint.DivInfo), ("previous_divs", investmint.DivInfo)),
+    "investing": (("all_divs", investing.DivInfo),),
+    "smartlab": (("all_coupons", smartlab.Coupon),),
+}
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+STRING_COLUMNS = ("symbol", "list", "error", "currency")
+BOOL_COLUMNS = ("verified",)
+
+
+def history_fields(source_name):
+    # the projection that parses only what the export needs
+    return tuple(sorted(x for x, _ in HISTORIES[source_name]))
+
+
+def row_columns(source_name):
+    return HISTORIES[source_name][0][1].__slots__
+
+
+def is_date_column(name):
+    return name == "date" or name.endswith("_date")
+
+
+def iso_date(value):
+    return "{:04d}-{:02d}-{:02d}".format(value["year"], value["month"], value["day"])
+
+
+class NdjsonExport:
+    # a line per row, dates as YYYY-MM-DD, and a {"error", "symbol"} line per symbol that failed
+    content_type = CONTENT_TYPES["ndjson"]
+
+    def __init__(self, source_name):
+        self.source_name = source_name
+        self.columns = row_columns(source_name)
+        self.dates = [is_date_column(x) for x in self.columns]
+
+    def feed(self, symbol, result, error):
+        if error is not None:
+            return dumps({"error": error, "symbol": symbol}) + b"\n"
+        lines = list()
+        for list_key, _ in HISTORIES[self.source_name]:
+            for record in result.get(list_key) or ():
+                row = {"symbol": symbol, "list": list_key}
+                for name, is_date in zip(self.columns, self.dates):
+                    value = record.get(name)
+                    row[name] = iso_date(value) if is_date and value else value
+                lines.append(dumps(row))
+        return b"\n".join(lines) + b"\n" if lines else b""
+
+    def close(self):
+        return b""
+
+
+class ChunkSink:
+    # file object for the pyarrow writers, drain() hands out what was written since the last call
+    closed = False
+
+    def __init__(self):
+        self.chunks = list()
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = list()
+        return data
+
+
+class ColumnarExport:
+    # EXPORT_BATCH_ROWS rows per record batch (per row group for Parquet), dates as date32.
+    # A symbol that failed is a row with only symbol and error set.
+    def __init__(self, source_name, format):
+        self.source_name = source_name
+        self.format = format
+        self.content_type = CONTENT_TYPES[format]
+        self.columns = row_columns(source_name)
+        self.dates = [is_date_column(x) for x in self.columns]
+        self.schema = pyarrow.schema(
+            [pyarrow.field(x, pyarrow.string()) for x in ("symbol", "list", "error")] +
+            [pyarrow.field(x, self.column_type(x)) for x in self.columns])
+        self.sink = ChunkSink()
+        if format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(self.sink, self.schema)
+        self.batch = self.empty_batch()
+        self.rows = 0
+
+    def column_type(self, name):
+        if is_date_column(name):
+            return pyarrow.date32()
+        if name in STRING_COLUMNS:
+            return pyarrow.string()
+        if name in BOOL_COLUMNS:
+            return pyarrow.bool_()
+        return pyarrow.float64()
+
+    def empty_batch(self):
+        return [list() for _ in self.schema]
+
+    def feed(self, symbol, result, error):
+        symbols, lists, errors, *values = self.batch
+        if error is not None:
+            symbols.append(symbol)
+            lists.append(None)
+            errors.append(error)
+            for column in values:
+                column.append(None)
+            self.rows += 1
+        else:
+            for list_key, _ in HISTORIES[self.source_name]:
+                for record in result.get(list_key) or ():
+                    symbols.append(symbol)
+                    lists.append(list_key)
+                    errors.append(None)
+                    for column, name, is_date in zip(values, self.columns, self.dates):
+                        value = record.get(name)
+                        # days since the epoch
+                        column.append(value["timestamp"] // 86400 if is_date and value else value)
+                    self.rows += 1
+        if self.rows >= config.EXPORT_BATCH_ROWS:
+            self.write_batch()
+        return self.sink.drain()
+
+    def write_batch(self):
+        if self.rows:
+            self.writer.write_batch(pyarrow.record_batch(self.batch, schema=self.schema))
+            self.batch = self.empty_batch()
+            self.rows = 0
+
+    def close(self):
+        self.write_batch()
+        self.writer.close()
+        return self.sink.drain()
+
+
+def history_export(source_name, format=None):
+    format = format or "ndjson"
+    if source_name not in HISTORIES:
+        raise ValueError("Unknown source: {}".format(source_name))
+    if format not in CONTENT_TYPES:
+        raise ValueError("Unknown format: {}, expected one of {}".format(format, ", ".join(sorted(CONTENT_TYPES))))
+    if format == "ndjson":
+        return NdjsonExport(source_name)
+    if pyarrow is None:
+        raise ValueError("{} export needs pyarrow installed".format(format.capitalize()))
+    return ColumnarExport(source_name, format)
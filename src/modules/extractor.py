@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import re
+
+
+class Field:
+    def __init__(self, name, anchor, tail=None, window=1000):
+        self.name = name
+        self.anchor = anchor
+        self.window = window
+        self.regex = re.compile(re.escape(anchor) + tail) if tail is not None else None
+
+
+class PageExtractor:
+    def __init__(self, fields):
+        self.fields = fields
+        anchors = sorted(set(x.anchor for x in fields), key=len, reverse=True)
+        # an anchor that is a prefix of a longer one is shadowed by it in the sweep
+        self._fields_by_anchor = dict()
+        for anchor in anchors:
+            self._fields_by_anchor[anchor] = [x for x in fields if anchor.startswith(x.anchor)]
+        # re only fast-scans an alternation whose branches share a first character
+        groups = dict()
+        for anchor in anchors:
+            groups.setdefault(anchor[0], list()).append(anchor)
+        self._anchors_regexes = [re.compile("|".join(re.escape(x) for x in group)) for group in groups.values()]
+
+    def subset(self, names):
+        return PageExtractor([x for x in self.fields if x.name in names])
+
+    def iter_anchors(self, text, pos, endpos):
+        iterators = [x.finditer(text, pos, endpos) for x in self._anchors_regexes]
+        if len(iterators) == 1:
+            return iterators[0]
+        return heapq.merge(*iterators, key=lambda m: m.start())
+
+    def extract(self, text, pos=0, endpos=None):
+        if endpos is None:
+            endpos = len(text)
+        found = dict()
+        for anchor_m in self.iter_anchors(text, pos, endpos):
+            start = anchor_m.start()
+            for field in self._fields_by_anchor[anchor_m.group(0)]:
+                if field.name in found:
+                    continue
+                if field.regex is None:
+                    found[field.name] = start
+                    continue
+                m = field.regex.match(text, start, min(start + field.window, endpos))
+                if m:
+                    found[field.name] = m
+            if len(found) == len(self.fields):
+                break
+        return found
+
+    def settled(self, text, found):
+        # True when text may be only the beginning of a page but more of it could
+        # not change what extract() returned: every field is found and each tail
+        # match had its whole window available
+        if len(found) < len(self.fields):
+            return False
+        for field in self.fields:
+            if field.regex is not None and found[field.name].start() + field.window > len(text):
+                return False
+        return True
+
+
+class PageCompletion:
+    # complete(text) for a page read a chunk at a time: true once extract() could
+    # not change with more of the page and, when table_field was extracted, each
+    # of table_marks follows it in turn. Every call resumes where the last one
+    # stopped, so a long page is not swept again for each chunk: until all the
+    # anchors are in, only the text added is searched for the missing ones, which
+    # extract() could not do without; a settled extract() is kept; and the table
+    # marks are searched for from where the last search ended.
+    def __init__(self, extractor, table_field=None, table_marks=()):
+        self.extractor = extractor
+        self.table_field = table_field
+        self.table_marks = list(table_marks)
+        self.missing = set(x.anchor for x in extractor.fields)
+        self.longest = max([len(x) for x in self.missing] or [0])
+        self.scanned = 0
+        self.found = None
+        self.pos = 0
+
+    def __call__(self, text):
+        if self.missing:
+            start = max(0, self.scanned - self.longest + 1)
+            self.missing = set(x for x in self.missing if text.find(x, start) == -1)
+            self.scanned = len(text)
+            if self.missing:
+                return False
+
+        if self.found is None:
+            found = self.extractor.extract(text)
+            if not self.extractor.settled(text, found):
+                return False
+            self.found = found
+            if self.table_field in found:
+                self.pos = found[self.table_field]
+            else:
+                self.table_marks = list()
+
+        while self.table_marks:
+            idx = text.find(self.table_marks[0], self.pos)
+            if idx == -1:
+                self.pos = max(self.pos, len(text) - len(self.table_marks[0]) + 1)
+                return False
+            self.pos = idx
+            self.table_marks.pop(0)
+        return True
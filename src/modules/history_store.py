@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from modules import config
+
+
+def text_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class StoredHistory:
+    __slots__ = ("rows", "first_seq", "length", "digest")
+
+    def __init__(self, rows, first_seq, length, digest):
+        self.rows = rows
+        self.first_seq = first_seq
+        self.length = length
+        self.digest = digest
+
+
+class HistoryStore:
+    def __init__(self, path, memory_entries):
+        self.path = path
+        self.memory_entries = memory_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._histories = collections.OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "mismatches": 0,
+            "rewrites": 0,
+            "rows_parsed": 0,
+            "rows_reused": 0,
+            "rows_stored": 0,
+        }
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # with PARSE_PROCESSES every pool process writes to the database too
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS histories (
+                    source TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    first_seq INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (source, symbol)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS history_rows (
+                    source TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    row BLOB NOT NULL,
+                    PRIMARY KEY (source, symbol, seq)
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, source, symbol, history):
+        self._histories[(source, symbol)] = history
+        self._histories.move_to_end((source, symbol))
+        while len(self._histories) > self.memory_entries:
+            self._histories.popitem(last=False)
+
+    def _load(self, source, symbol):
+        conn = self._connection()
+        head = conn.execute(
+            "SELECT first_seq, length, digest FROM histories WHERE source = ? AND symbol = ?", (source, symbol)).fetchone()
+        if not head:
+            return None
+        rows = conn.execute(
+            "SELECT row FROM history_rows WHERE source = ? AND symbol = ? ORDER BY seq", (source, symbol)).fetchall()
+        return StoredHistory([pickle.loads(x[0]) for x in rows], head[0], head[1], head[2])
+
+    def get(self, source, symbol):
+        with self._lock:
+            history = self._histories.get((source, symbol))
+            if history is None:
+                history = self._load(source, symbol)
+                if history is None:
+                    self.stats["misses"] += 1
+                    return None
+                self._remember(source, symbol, history)
+            else:
+                self._histories.move_to_end((source, symbol))
+            self.stats["hits"] += 1
+            return history
+
+    def save(self, source, symbol, history, added_from, added_to, rewrite):
+        # rows history.rows[added_from:added_to] are new, the rest is already stored unless rewrite is set
+        with self._lock:
+            conn = self._connection()
+            if rewrite:
+                conn.execute("DELETE FROM history_rows WHERE source = ? AND symbol = ?", (source, symbol))
+                self.stats["rewrites"] += 1
+            conn.executemany(
+                "INSERT OR REPLACE INTO history_rows (source, symbol, seq, row) VALUES (?, ?, ?, ?)",
+                [(source, symbol, history.first_seq + idx, pickle.dumps(history.rows[idx], protocol=pickle.HIGHEST_PROTOCOL))
+                 for idx in range(added_from, added_to)])
+            conn.execute(
+                "INSERT OR REPLACE INTO histories (source, symbol, first_seq, length, digest, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, symbol, history.first_seq, history.length, history.digest, time.time()))
+            conn.commit()
+            self.stats["rows_stored"] += added_to - added_from
+            self._remember(source, symbol, history)
+
+    def count(self, parsed, reused):
+        with self._lock:
+            self.stats["rows_parsed"] += parsed
+            self.stats["rows_reused"] += reused
+
+    def mismatch(self):
+        with self._lock:
+            self.stats["mismatches"] += 1
+
+    def drain_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            for key in self.stats:
+                self.stats[key] = 0
+        return stats
+
+    def add_stats(self, stats):
+        with self._lock:
+            for key, value in stats.items():
+                self.stats[key] += value
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            res["in_memory"] = len(self._histories)
+            if self._conn is not None:
+                res["entries"] = self._conn.execute("SELECT COUNT(*) FROM histories").fetchone()[0]
+                res["rows"] = self._conn.execute("SELECT COUNT(*) FROM history_rows").fetchone()[0]
+        return res
+
+
+history_store = HistoryStore(config.HISTORY_DB, config.HISTORY_MEMORY_ENTRIES) if config.HISTORY_ENABLED else None
+
+
+def today_timestamp():
+    now = time.time()
+    return now - now % 86400
+
+
+class TableHistory:
+    # One refresh of a table whose settled rows form a contiguous block of text:
+    # the tail of the table when the newest rows come first, its head otherwise.
+    # If the stored block is still there byte for byte only the rows outside of
+    # it, [parse_start, parse_end), have to be parsed.
+    def __init__(self, source, symbol, text, start, end, newest_first, store=None):
+        self.store = store or history_store
+        self.source = source
+        self.symbol = symbol if self.store is not None else None
+        self.text = text
+        self.start = start
+        self.end = end
+        self.newest_first = newest_first
+        self.parse_start = start
+        self.parse_end = end
+        self.history = self.store.get(source, symbol) if self.symbol else None
+        if self.history is None:
+            return
+
+        if newest_first:
+            pos = end - self.history.length
+            matched = pos >= start and text_digest(text[pos:end]) == self.history.digest
+            if matched:
+                self.parse_end = pos
+        else:
+            pos = start + self.history.length
+            matched = pos <= end and text_digest(text[start:pos]) == self.history.digest
+            if matched:
+                self.parse_start = pos
+        if not matched:
+            self.store.mismatch()
+            self.history = None
+
+    @property
+    def stored_rows(self):
+        return len(self.history.rows) if self.history else 0
+
+    def discard(self):
+        # the stored rows can't be reused for this page, they will be rewritten on merge
+        self.history = None
+
+    def merge(self, parsed, split, boundary):
+        # newest first: parsed[split:] are settled and start at text position boundary,
+        # otherwise parsed[:split] are settled and end at text position boundary
+        if not self.symbol:
+            return parsed
+
+        old = self.history
+        stored = old.rows if old else list()
+        self.store.count(len(parsed), len(stored))
+        if self.newest_first:
+            added = parsed[split:]
+            if old and not added:
+                return parsed + stored
+            block = self.text[boundary:self.end]
+            history = StoredHistory(added + stored, (old.first_seq if old else 0) - len(added), len(block), text_digest(block))
+            if old:
+                self.store.save(self.source, self.symbol, history, 0, len(added), False)
+            else:
+                self.store.save(self.source, self.symbol, history, 0, len(history.rows), True)
+            return parsed + stored
+
+        added = parsed[:split]
+        if old and not added:
+            return stored + parsed
+        block = self.text[self.start:boundary]
+        history = StoredHistory(stored + added, old.first_seq if old else 0, len(block), text_digest(block))
+        self.store.save(self.source, self.symbol, history, len(stored), len(history.rows), old is None)
+        return stored + parsed
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Page fields taken from the parsed document instead of by the regex anchors
+# of extractor.PageExtractor. With HTML_PARSER=selectolax, and selectolax
+# installed, every source's page parser reads its fields through a
+# DocumentExtractor: the lexbor engine builds the tree and each field is a CSS
+# selector. extract() returns what PageExtractor.extract() does, field name ->
+# groups read with .group(n), so the page parsers take either the same way.
+# Anchor-only fields, the text position a table starts at, are still found in
+# the text: table rows are matched in place, from where the stored history
+# leaves off, and the tree is built only for the text above the tables.
+#
+# It is not the faster backend: building even that part of the tree costs
+# more than the regex sweep of the whole page (bench/bench_html_backends.py
+# has it at about twice the CPU and 50x the peak memory), what it buys is
+# fields still found once the markup is reformatted.
+
+import re
+
+from modules import config
+from modules.extractor import PageExtractor
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+# "regex" or "selectolax", read on every parse, bench/bench_html_backends.py switches it
+parser = "selectolax" if config.HTML_PARSER == "selectolax" and LexborHTMLParser is not None else "regex"
+
+
+def extractor(page, document):
+    # the one of a source's two extractors the configured parser uses
+    return document if parser == "selectolax" else page
+
+
+def text_groups(nodes):
+    # the text of the first node as group 1
+    return (nodes[0].text(),) if nodes else None
+
+
+def own_text_groups(nodes):
+    # the text directly in the first node, not in its children
+    return (nodes[0].text(deep=False),) if nodes else None
+
+
+def attribute_groups(name):
+    def groups(nodes):
+        value = nodes[0].attributes.get(name) if nodes else None
+        return (value,) if value is not None else None
+    return groups
+
+
+def match_groups(pattern):
+    # the groups of pattern matched at the start of the first node's text
+    regex = re.compile(pattern, re.S)
+
+    def groups(nodes):
+        m = regex.match(nodes[0].text()) if nodes else None
+        return m.groups() if m else None
+    return groups
+
+
+def after_text(text, groups=text_groups):
+    # groups of the first node right after a text node containing text, for a value labelled by bare text
+    def filtered(nodes):
+        return groups([x for x in nodes if x.prev is not None and x.prev.tag == "-text" and text in x.prev.text()][:1])
+    return filtered
+
+
+class Groups:
+    # the part of re.Match the page parsers use
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+    def group(self, idx):
+        return self.values[idx - 1]
+
+    def groups(self):
+        return self.values
+
+
+class NodeField:
+    def __init__(self, name, selector, groups=text_groups):
+        # groups gets the nodes selector matches and returns the field's groups, None when it is not there
+        self.name = name
+        self.selector = selector
+        self.groups = groups
+
+
+class DocumentExtractor:
+    def __init__(self, nodes, page=None, until=None):
+        # the anchor-only fields of page are kept as text positions; until names one of them,
+        # a table the nodes are all above, and only the text before its anchor is parsed
+        anchors = [x for x in page.fields if x.regex is None] if page else []
+        self.nodes = nodes
+        self.anchors = PageExtractor(anchors) if anchors else None
+        self.fields = nodes + anchors
+        self.until = next(x.anchor for x in anchors if x.name == until) if until else None
+
+    def subset(self, names):
+        extractor = DocumentExtractor([x for x in self.nodes if x.name in names], self.anchors and self.anchors.subset(names))
+        extractor.until = self.until
+        return extractor
+
+    def extract(self, text):
+        found = self.anchors.extract(text) if self.anchors else dict()
+        if not self.nodes or not text:
+            return found
+        end = text.find(self.until) if self.until else -1
+        tree = LexborHTMLParser(text if end == -1 else text[:end])
+        for field in self.nodes:
+            groups = field.groups(tree.css(field.selector))
+            if groups is not None:
+                found[field.name] = Groups(groups)
+        return found
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import functools
+import hashlib
+import os
+import pickle
+import signal
+import tempfile
+import threading
+import traceback
+
+from modules import config
+from modules import http_client
+from modules import metrics
+from modules.history_store import history_store
+
+
+class StoredResponse:
+    def __init__(self, status_code, text, headers, url):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.url = url
+
+
+def parser_name(parse):
+    return "{}.{}".format(parse.__module__, parse.__qualname__)
+
+
+class BoundParser:
+    # parse(r, *args) under a name of its own, so cached parses of different projections are told apart.
+    # Unlike a closure it pickles, so it can run in the parse pool.
+    def __init__(self, parse, args):
+        self.parse = parse
+        self.args = args
+        self.__module__ = parse.__module__
+        self.__qualname__ = "{}{}".format(parse.__qualname__, args)
+
+    def __call__(self, r):
+        return self.parse(r, *self.args)
+
+
+@functools.lru_cache(maxsize=256)
+def bound_parser(parse, *args):
+    if all(x is None for x in args):
+        return parse
+    return BoundParser(parse, args)
+
+
+class RemoteParser:
+    # parse(r) in a pool process, the calling thread waits for it without holding the GIL
+    def __init__(self, pool, parse):
+        self.pool = pool
+        self.parse = parse
+        self.__module__ = parse.__module__
+        self.__qualname__ = parse.__qualname__
+
+    def __call__(self, r):
+        if not self.pool.processes:
+            # the pool was shut down while the page was being fetched
+            return self.parse(r)
+        page = StoredResponse(r.status_code, r.text, dict(r.headers), r.url)
+        parsed, counts, history_stats = self.pool.executor().submit(parse_in_pool, self.parse, page).result()
+        metrics.registry.add(counts)
+        if history_stats:
+            history_store.add_stats(history_stats)
+        return parsed
+
+
+def parse_in_pool(parse, page):
+    # runs in a pool process, what it counted goes back with the result to be added up in the parent.
+    # The counts of a parse that raised go with the next one.
+    parsed = parse(page)
+    return parsed, metrics.registry.drain(), history_store.drain_stats() if history_store else None
+
+
+def ignore_interrupts():
+    # Ctrl-C reaches the pool processes too, the parent shuts them down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ParsePool:
+    def __init__(self, processes):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(self.processes, initializer=ignore_interrupts)
+            return self._executor
+
+    def start(self):
+        # forks all the workers, best done before any other thread is started
+        if self.processes:
+            self.executor().submit(int).result()
+
+    def offload(self, parse):
+        return RemoteParser(self, parse) if self.processes else parse
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            # pages still being fetched are parsed where they are
+            self.processes = 0
+
+
+class DiskHttpCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.stats = {
+            "conditional_requests": 0,
+            "not_modified": 0,
+            "reparsed": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".pickle")
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        files = list()
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                st = os.stat(os.path.join(self.directory, name))
+                files.append((st.st_mtime, st.st_size, name))
+        return files
+
+    def lookup(self, url, parse=None):
+        entry = self.load(url)
+        if entry and entry.get("partial") and parse is not None and entry["parser"] != parser_name(parse):
+            # only the part of the page the previous parser needed was kept
+            return None
+        if entry:
+            with self._lock:
+                self.stats["conditional_requests"] += 1
+        return entry
+
+    def load(self, url):
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def store(self, url, entry):
+        path = self._path(url)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(x[1] for x in self._scan())
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += size - old_size
+            self.stats["stores"] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        files = sorted(self._scan())
+        self._total_bytes = sum(x[1] for x in files)
+        for _, size, name in files:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def request_headers(self, entry, headers):
+        headers = dict(headers or {})
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def resolve(self, url, entry, r, parse):
+        if r.status_code == 304 and entry:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            if entry["parser"] == parser_name(parse):
+                return entry["parsed"]
+            with self._lock:
+                self.stats["reparsed"] += 1
+            entry["parsed"] = parse(StoredResponse(entry["status_code"], entry["body"], dict(), url))
+            entry["parser"] = parser_name(parse)
+            self.store(url, entry)
+            return entry["parsed"]
+
+        parsed = parse(r)
+
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        if r.status_code == 200 and (etag or last_modified):
+            self.store(url, {
+                "etag": etag,
+                "last_modified": last_modified,
+                "status_code": r.status_code,
+                "body": r.text,
+                "parser": parser_name(parse),
+                "parsed": parsed,
+                "partial": getattr(r, "partial", False),
+            })
+        return parsed
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            res["bytes"] = self._total_bytes
+        return res
+
+
+disk_cache = DiskHttpCache(config.HTTP_CACHE_DIR, config.HTTP_CACHE_MAX_BYTES)
+parse_pool = ParsePool(config.PARSE_PROCESSES)
+
+
+def fetch(url, headers, complete, **kwargs):
+    if complete is not None and config.HTTP_STREAM_ENABLED:
+        return http_client.get_streamed(url, complete, headers=headers, **kwargs)
+    return http_client.get(url, headers=headers, **kwargs)
+
+def get_parsed(url, parse, headers=None, complete=None, **kwargs):
+    # complete() makes the check that tells when enough of the page was read for parse, see streaming.read_until
+    parse = parse_pool.offload(parse)
+    if not config.HTTP_CACHE_ENABLED:
+        return parse(fetch(url, headers, complete, **kwargs))
+    entry = disk_cache.lookup(url, parse)
+    r = fetch(url, disk_cache.request_headers(entry, headers), complete, **kwargs)
+    return disk_cache.resolve(url, entry, r, parse)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from modules import config
+from modules import metrics
+from modules.ratelimit import RETRY_STATUSES, governors, parse_retry_after
+from modules.streaming import StreamedResponse, content_length, read_until, stream_stats
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        # DNS resolution and the TCP handshake
+        started = time.perf_counter()
+        super().connect()
+        metrics.observe_stage(metrics.host_source(self.host), "connect", time.perf_counter() - started)
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # DNS resolution, the TCP and the TLS handshakes
+        started = time.perf_counter()
+        super().connect()
+        metrics.observe_stage(metrics.host_source(self.host), "connect", time.perf_counter() - started)
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+def observe_response(host, r, started, headers_at, bytes_read):
+    source = metrics.host_source(host)
+    now = time.perf_counter()
+    metrics.observe_stage(source, "ttfb", headers_at - started)
+    metrics.observe_stage(source, "download", now - headers_at)
+    metrics.observe_response(host, r.status_code, bytes_read)
+
+
+class PooledSessions:
+    def __init__(self, pool_size, timeout, retries, backoff):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._sessions = dict()
+        self._mounts = list()
+        self._lock = threading.Lock()
+
+    def session(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if not session:
+                session = self._new_session()
+                self._sessions[host] = session
+            return session
+
+    def _new_session(self):
+        # only connection failures are retried here, RETRY_STATUSES are by request() and stream()
+        # so that every attempt goes through the host's governor
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=self.backoff,
+            raise_on_status=False,
+        )
+        adapter = TimedAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        for prefix, custom_adapter in self._mounts:
+            session.mount(prefix, custom_adapter)
+        return session
+
+    def mount(self, prefix, adapter):
+        with self._lock:
+            self._mounts.append((prefix, adapter))
+            for session in self._sessions.values():
+                session.mount(prefix, adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urllib.parse.urlsplit(url).netloc
+        governor = governors.get(host)
+        attempt = 0
+        while True:
+            governor.acquire()
+            status_code = None
+            retry_after = None
+            try:
+                started = time.perf_counter()
+                r = self.session(host).request(method, url, **kwargs)
+                status_code = r.status_code
+                retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                if r.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    # elapsed stops at the response headers, the body was read after them
+                    observe_response(host, r, started, started + r.elapsed.total_seconds(), r.raw.tell())
+                    return r
+                r.close()
+            finally:
+                governor.release(status_code, retry_after)
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def stream(self, url, complete, **kwargs):
+        # GET that stops reading the body once the check complete() makes is true of the text so far,
+        # the connection is closed rather than drained in that case
+        kwargs.setdefault("timeout", self.timeout)
+        host = urllib.parse.urlsplit(url).netloc
+        governor = governors.get(host)
+        attempt = 0
+        while True:
+            governor.acquire()
+            status_code = None
+            retry_after = None
+            try:
+                started = time.perf_counter()
+                r = self.session(host).request("GET", url, stream=True, **kwargs)
+                headers_at = time.perf_counter()
+                status_code = r.status_code
+                retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                try:
+                    if r.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                        if r.status_code == 200:
+                            text, partial = read_until(r.iter_content(config.HTTP_STREAM_CHUNK), r.encoding or "utf-8", complete)
+                            stream_stats.record(host, r.raw.tell(), content_length(r.headers), partial)
+                        else:
+                            text, partial = r.text, False
+                        observe_response(host, r, started, headers_at, r.raw.tell())
+                        return StreamedResponse(r.status_code, text, r.headers, r.url, partial)
+                finally:
+                    r.close()
+            finally:
+                governor.release(status_code, retry_after)
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def json(self):
+        res = dict()
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for host, session in sessions:
+            opened = 0
+            requests_sent = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool:
+                        opened += pool.num_connections
+                        requests_sent += pool.num_requests
+            res[host] = {
+                "connections_opened": opened,
+                "connections_reused": max(requests_sent - opened, 0),
+                "requests": requests_sent,
+            }
+        return res
+
+
+sessions = PooledSessions(config.HTTP_POOL_SIZE, config.HTTP_TIMEOUT, config.HTTP_RETRIES, config.HTTP_BACKOFF)
+
+
+def get(url, **kwargs):
+    return sessions.request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return sessions.request("POST", url, **kwargs)
+
+def get_streamed(url, complete, **kwargs):
+    return sessions.stream(url, complete, **kwargs)
@@ -1,223 +1,321 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import calendar
-import datetime
+import concurrent.futures
 import re
-import requests
+
+from modules import config
+from modules import html_backend
+from modules import http_cache
+from modules import http_client
+from modules import metrics
+from modules.history_store import TableHistory, today_timestamp
+from modules.html_backend import DocumentExtractor, NodeField, after_text, attribute_groups, match_groups
+from modules.models.common import Date
+from modules.models.investing import DivInfo, TickerInfo
+from modules.projection import project, result_sections, sub_extractor
+from modules.resolution_index import ResolutionIndex
+
+
+MONTHS = {
+    "Jan": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Apr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Aug": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dec": 12,
+}
+
 
 def parse_date(day, month, year):
-    months = {
-        "Jan": 1,
-        "Feb": 2,
-        "Mar": 3,
-        "Apr": 4,
-        "May": 5,
-        "Jun": 6,
-        "Jul": 7,
-        "Aug": 8,
-        "Sep": 9,
-        "Oct": 10,
-        "Nov": 11,
-        "Dec": 12,
-    }
-
-    return Date(int(day), months.get(month), int(year))
-
-
-class Date:
-    def __init__(self, day=None, month=None, year=None):
-        self.day = day
-        self.month = month
-        self.year = year
-
-    @property
-    def timestamp(self):
-        return calendar.timegm(self.date.timetuple())
-
-    @property
-    def date(self):
-        return datetime.date(self.year, self.month, self.day)
-
-    def json(self):
-        return {
-            "day": self.day,
-            "month": self.month,
-            "year": self.year,
-            "timestamp": self.timestamp,
-        }
-
-
-class DivInfo:
-    def __init__(self):
-        self.ex_div_date = None
-        self.dividend = None
-        self.pay_date = None
-        self.div_yield = None
-
-    def json(self):
-        ex_div_date = self.ex_div_date.json() if isinstance(self.ex_div_date, Date) else self.ex_div_date
-        pay_date = self.pay_date.json() if isinstance(self.pay_date, Date) else self.pay_date
-        return {
-            "dividend": self.dividend,
-            "div_yield": self.div_yield,
-            "ex_div_date": ex_div_date,
-            "pay_date": pay_date,
-        }
-
-
-class TickerInfo:
-    def __init__(self):
-        self.price = None
-        self.name = None
-        self.industry = None
-        self.sector = None
-        self.currency = None
-        self.pe = None
-        self.next_earnings_date = None
-        self.all_divs = list()
-
-    def eval_div_period(self, d2, d1):
-        if not d2 or not d1:
-            return None
-
-        td = d2 - d1
-        td_days = td.days
-
-        if td_days > 50 and td_days < 130:
-            return 3
-        elif td_days > 150 and td_days < 220:
-            return 6
-        elif td_days > 300 and td_days < 410:
-            return 12
-        else:
-            return None
-
-    def json(self):
-        next_earnings_date = self.next_earnings_date.json() if isinstance(self.next_earnings_date, Date) else self.next_earnings_date
-        all_divs = list(map(lambda x: x.json(), self.all_divs))
-        if len(self.all_divs) >= 2:
-            date1 = self.all_divs[0].ex_div_date.date
-            date2 = self.all_divs[1].ex_div_date.date
-            div_period = self.eval_div_period(date1, date2)
-        else:
-            div_period = None
-        return {
-            "price": self.price,
-            "name": self.name,
-            "industry": self.industry,
-            "sector": self.sector,
-            "currency": self.currency,
-            "pe": self.pe,
-            "all_divs": all_divs,
-            "div_period": div_period,
-            "next_earnings_date": next_earnings_date,
-        }
-
-
-def get_ticker_info(ticker_):
-    ticker = ticker_.lower().replace(".", "")
-    user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:66.0) Gecko/20100101 Firefox/66.0"
-    headers = {
-        "User-Agent": user_agent, 
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "X-Requested-With": "XMLHttpRequest",
-        "Connection": "close",
-    }
-    url = "https://uk.investing.com/search/service/searchTopBar"
-
-    data = "search_text={}".format(ticker.lower())
-    r = requests.post(url, data=data, headers=headers, timeout=3)
-    json_data = r.json()
+    return Date(int(day), MONTHS.get(month), int(year))
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:66.0) Gecko/20100101 Firefox/66.0"
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+SEARCH_URL = "https://uk.investing.com/search/service/searchTopBar"
+
+resolution_index = ResolutionIndex(config.INVESTING_RESOLUTION_DB, config.INVESTING_RESOLUTION_TTL)
+
+quote_executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.BATCH_WORKERS)
+
+EXCHANGES = {
+    "Moscow": 4,
+    "NASDAQ": 3,
+    "NYSE": 2,
+    "London": 1,
+}
+
+
+def search_data(ticker):
+    return "search_text={}".format(ticker)
+
+def filter_quotes(json_data, symbol):
     quotes = json_data["quotes"]
-    quotes = list(filter(lambda x:x.get("symbol").upper() == ticker.upper(), quotes))
+    return list(filter(lambda x:x.get("symbol").upper() == symbol, quotes))
+
+def choose_quote_link(quotes):
+    quotes = list(filter(lambda x: x.get("exchange") in EXCHANGES.keys(), quotes))
+    quotes = sorted(quotes, key=lambda x: EXCHANGES.get(x.get("exchange"), 0), reverse=True)
+    quote = quotes[0]
+    return "https://uk.investing.com{}".format(quote["link"])
+
+
+def normalize_ticker(ticker_):
+    # a lowercase trailing "p" marks a preferred share, keep it distinct
+    ticker = ticker_.strip()
+    return ticker.lower().replace(".", "") + ("_p" if ticker.endswith("p") else "")
+
+
+def resolve_quote_link(ticker_):
+    ticker = ticker_.lower().replace(".", "")
+
+    r = http_client.post(SEARCH_URL, data=search_data(ticker.lower()), headers=HEADERS, timeout=3)
+    quotes = filter_quotes(r.json(), ticker.upper())
 
     if not quotes and ticker_.endswith("p"):
         ticker = ticker[:-1]
-        data = "search_text={}".format(ticker)
-        r = requests.post(url, data=data, headers=headers, timeout=3)
-        json_data = r.json()
-        quotes = json_data["quotes"]
-        quotes = list(filter(lambda x:x.get("symbol").upper() == ticker.upper() + "_p", quotes))
+        r = http_client.post(SEARCH_URL, data=search_data(ticker), headers=HEADERS, timeout=3)
+        quotes = filter_quotes(r.json(), ticker.upper() + "_p")
 
     if not quotes:
         return None
 
-    exchanges = {
-        "Moscow": 4, 
-        "NASDAQ": 3, 
-        "NYSE": 2,
-        "London": 1,
-    }
-    quotes = list(filter(lambda x: x.get("exchange") in exchanges.keys(), quotes))
-    quotes = sorted(quotes, key=lambda x: exchanges.get(x.get("exchange"), 0), reverse=True)
-    quote = quotes[0]
-    link = "https://uk.investing.com{}".format(quote["link"])
+    return choose_quote_link(quotes)
+
 
+def fetch_quote(link, dividend_link=None, sections=None, limit=None):
+    # with a known dividends link both pages are requested at once,
+    # the dividends page is skipped when no requested field comes from it
+    parse_quote = http_cache.bound_parser(parse_quote_response, sections)
+    parse_dividends = http_cache.bound_parser(parse_dividends_response, limit)
+    dividends = sections is None or "dividends" in sections
+
+    divs_future = None
+    if dividends and dividend_link:
+        divs_future = quote_executor.submit(http_cache.get_parsed, dividend_link, parse_dividends, headers=HEADERS, timeout=3)
+
+    quote = http_cache.get_parsed(link, parse_quote, headers=HEADERS, timeout=3)
+    all_divs = divs_future.result() if divs_future else None
+    if not quote:
+        return None, None
+
+    ticker_info, page_dividend_link = quote
+    if dividends and all_divs is None and page_dividend_link and page_dividend_link != dividend_link:
+        all_divs = http_cache.get_parsed(page_dividend_link, parse_dividends, headers=HEADERS, timeout=3)
+    if all_divs is not None:
+        ticker_info.all_divs = all_divs
+
+    return ticker_info, page_dividend_link
+
+
+def get_ticker_info(ticker_, fields=None):
+    key = normalize_ticker(ticker_)
+    sections, limit = result_sections(TICKER_RESULT_SECTIONS, fields)
+
+    resolution = resolution_index.get(key)
+    if resolution:
+        link, dividend_link = resolution
+        ticker_info, page_dividend_link = fetch_quote(link, dividend_link, sections, limit)
+        if ticker_info:
+            if page_dividend_link != dividend_link:
+                resolution_index.put(key, link, page_dividend_link)
+            return project(ticker_info.json(), fields)
+        resolution_index.invalidate(key)
+
+    link = resolve_quote_link(ticker_)
+    if not link:
+        return None
+
+    ticker_info, dividend_link = fetch_quote(link, None, sections, limit)
+    if not ticker_info:
+        return None
+
+    resolution_index.put(key, link, dividend_link)
+    return project(ticker_info.json(), fields)
+
+
+def parse_quote_response(r, sections=None):
+    if r.status_code == 404:
+        return None
+    with metrics.timed("investing", "extract"):
+        return parse_quote_page(r.text, sections)
+
+def parse_dividends_response(r, limit=None):
+    if r.status_code == 404:
+        return None
+    with metrics.timed("investing", "table_parse"):
+        return parse_dividends_page(r.text, r.url, limit)
+
+
+PRICE_REGEX = re.compile("""<input type="text" class="newInput inputTextBox alertValue" placeholder="([^"]*)""")
+NAME_REGEX = re.compile(r"""<h1 class="float_lang_base_1 relativeAttr"\s*dir="ltr" itemprop="name">(.*?)</h1>""")
+INDUSTRY_REGEX = re.compile(r"""<div>Industry<a.*?>(.*?)</a></div>""")
+SECTOR_REGEX = re.compile(r"""<div>Sector<a.*?>(.*?)</a></div>""")
+CURRENCY_REGEX = re.compile(r"""Currency in <span class='bold'>(.*?)</span>""")
+NEXT_EARNINGS_DATE_REGEX = re.compile(r"""Next Earnings Date.*?>([^\s]*) (\d*), (\d*)</a>""")
+PE_REGEX = re.compile(r"""class="float_lang_base_1">P/E Ratio</span><span class="float_lang_base_2 bold">(.*?)</span""")
+DIVIDENDS_LINK_REGEX = re.compile(r"""<li><a href="(.*?)" class="arial_12 bold">Dividends</a></li>""")
+
+
+# quote page sections and dividends each result key is computed from, None for all of them
+TICKER_RESULT_SECTIONS = {
+    "price": (("price",), 0),
+    "name": (("name",), 0),
+    "industry": (("industry",), 0),
+    "sector": (("sector",), 0),
+    "currency": (("currency",), 0),
+    "pe": (("pe",), 0),
+    "next_earnings_date": (("next_earnings_date",), 0),
+    "all_divs": (("dividends",), None),
+    "div_period": (("dividends",), 2),
+}
+
+
+QUOTE_PAGE_REGEXES = (
+    ("price", PRICE_REGEX),
+    ("name", NAME_REGEX),
+    ("industry", INDUSTRY_REGEX),
+    ("sector", SECTOR_REGEX),
+    ("currency", CURRENCY_REGEX),
+    ("next_earnings_date", NEXT_EARNINGS_DATE_REGEX),
+    ("pe", PE_REGEX),
+    ("dividends_link", DIVIDENDS_LINK_REGEX),
+)
+
+
+def labelled_link(label):
+    return 'div:lexbor-contains("{}") > a'.format(label)
+
+# the same sections read from the parsed document, for HTML_PARSER=selectolax
+QUOTE_DOCUMENT = DocumentExtractor([
+    NodeField("price", "input.alertValue", attribute_groups("placeholder")),
+    NodeField("name", 'h1[itemprop="name"]'),
+    NodeField("industry", labelled_link("Industry")),
+    NodeField("sector", labelled_link("Sector")),
+    NodeField("currency", "span.bold", after_text("Currency in")),
+    NodeField("next_earnings_date", labelled_link("Next Earnings Date"), match_groups(r"(\S*) (\d*), (\d*)$")),
+    NodeField("pe", 'span:lexbor-contains("P/E Ratio") + span'),
+    NodeField("dividends_link", 'li > a:lexbor-contains("Dividends")', attribute_groups("href")),
+])
+
+
+def search_quote_page(text, sections=None):
+    # section -> match, of the sections given and the dividends link
+    if sections is not None:
+        sections = tuple(sorted(set(sections) | {"dividends_link"}))
+    if html_backend.parser == "selectolax":
+        return sub_extractor(QUOTE_DOCUMENT, sections).extract(text)
+    found = dict()
+    for name, regex in QUOTE_PAGE_REGEXES:
+        if sections is None or name in sections:
+            m = regex.search(text)
+            if m:
+                found[name] = m
+    return found
+
+
+def parse_quote_page(text, sections=None):
+    # with sections given only those are searched for, the dividends link always is
     ticker_info = TickerInfo()
+    found = search_quote_page(text, sections)
 
-    r2 = requests.get(link, headers=headers, timeout=3)
-    text = r2.text
-    m = re.search("""<input type="text" class="newInput inputTextBox alertValue" placeholder="([^"]*)""", text)
+    m = found.get("price")
     if m:
         ticker_info.price = float(m.group(1).replace(",", ""))
 
-    m = re.search(r"""<h1 class="float_lang_base_1 relativeAttr"\s*dir="ltr" itemprop="name">(.*?)</h1>""", text)
+    m = found.get("name")
     if m:
         ticker_info.name = m.group(1).strip()
 
-    m = re.search(r"""<div>Industry<a.*?>(.*?)</a></div>""", text)
+    m = found.get("industry")
     if m:
         ticker_info.industry = m.group(1).strip()
 
-    m = re.search(r"""<div>Sector<a.*?>(.*?)</a></div>""", text)
+    m = found.get("sector")
     if m:
         ticker_info.sector = m.group(1).strip()
 
-    m = re.search(r"""Currency in <span class='bold'>(.*?)</span>""", text)
+    m = found.get("currency")
     if m:
         ticker_info.currency = m.group(1).strip()
 
-    m = re.search(r"""Next Earnings Date.*?>([^\s]*) (\d*), (\d*)</a>""", text)
+    m = found.get("next_earnings_date")
     if m:
         ticker_info.next_earnings_date = parse_date(m.group(2), m.group(1), m.group(3))
 
-    m = re.search(r"""class="float_lang_base_1">P/E Ratio</span><span class="float_lang_base_2 bold">(.*?)</span""", text)
+    m = found.get("pe")
     if m:
         if m.group(1) == "N/A":
             ticker_info.pe = None
         else:
             ticker_info.pe = float(m.group(1))
 
-    all_divs = list()
-
-    m = re.search(r"""<li><a href="(.*?)" class="arial_12 bold">Dividends</a></li>""", text)
+    dividend_link = None
+    m = found.get("dividends_link")
     if m:
         dividend_link = "https://uk.investing.com{}".format(m.group(1))
 
-        r3 = requests.get(dividend_link, headers=headers, timeout=3)
-        text3 = r3.text
+    return ticker_info, dividend_link
+
+
+DIVIDENDS_ROW_REGEX = re.compile(
+    r"""<tr event_timestamp=".*?">.*?">([^\s]*) (\d*), (\d*)</td>\s*"""
+    r"""<td>(.*?)</td>.*?"""
+    r"""<td data-value=".*?">([^\s]*) (\d*), (\d*)</td>\s*"""
+    r"""<td>(.*?)%</td>""",
+    re.S,
+)
+
+
+def iter_dividends(text, start, end):
+    # yields (row start, DivInfo) for the rows of text[start:end], matched in place
+    for m in DIVIDENDS_ROW_REGEX.finditer(text, start, end):
+        div_info = m.groups()
+        di = DivInfo()
+        di.ex_div_date = parse_date(div_info[1], div_info[0], div_info[2])
+        di.dividend = float(div_info[3])
+        di.pay_date = parse_date(div_info[5], div_info[4], div_info[6])
+        di.div_yield = float(div_info[7])
+        yield m.start(), di
+
+
+def parse_dividends_page(text3, history_key=None, limit=None):
+    # limit stops after that many of the newest dividends
+    div_table_start_idx = text3.find("""<th class="first left">Ex-Dividend Date<span sort_default class="headerSortDefault"></span></th>""")
+    if div_table_start_idx == -1:
+        return list()
+    div_table_finish_idx = text3.find("""</table>""", div_table_start_idx)
+    if div_table_finish_idx == -1:
+        div_table_finish_idx = len(text3)
+
+    # rows are newest first, those with a past ex-dividend date are kept in the history store
+    table = TableHistory("investing", history_key, text3, div_table_start_idx, div_table_finish_idx, True)
+    today = today_timestamp()
+    settled_idx = None
+    settled_start_idx = table.parse_end
 
-        div_table_start_idx = text3.find("""<th class="first left">Ex-Dividend Date<span sort_default class="headerSortDefault"></span></th>""")
-        div_table_finish_idx = text3.find("""</table>""", div_table_start_idx)
-        div_table = text3[div_table_start_idx:div_table_finish_idx]
-
-        regex  = r"""<tr event_timestamp=".*?">.*?">([^\s]*) (\d*), (\d*)</td>\s*"""
-        regex += r"""<td>(.*?)</td>.*?"""
-        regex += r"""<td data-value=".*?">([^\s]*) (\d*), (\d*)</td>\s*"""
-        regex += r"""<td>(.*?)%</td>"""
-
-        all_divs_info = re.findall(regex, div_table, re.S)
-
-        for div_info in all_divs_info:
-            di = DivInfo()
-            di.ex_div_date = parse_date(div_info[1], div_info[0], div_info[2])
-            di.dividend = float(div_info[3])
-            di.pay_date = parse_date(div_info[5], div_info[4], div_info[6])
-            di.div_yield = float(div_info[7])
-            all_divs.append(di)
-
-    ticker_info.all_divs = all_divs
-
-    return ticker_info.json()
+    all_divs = list()
+    for row_start_idx, di in iter_dividends(text3, div_table_start_idx, table.parse_end):
+        if settled_idx is None and di.ex_div_date.timestamp < today:
+            settled_idx = len(all_divs)
+            settled_start_idx = row_start_idx
+        all_divs.append(di)
+        if limit is not None and len(all_divs) >= limit:
+            return all_divs[:limit]
+
+    all_divs = table.merge(all_divs, len(all_divs) if settled_idx is None else settled_idx, settled_start_idx)
+    return all_divs[:limit]
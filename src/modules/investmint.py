@@ -1,38 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import calendar
-import datetime
+import functools
 import json
 import re
-import requests
 import html
 
-
-class Currency:
-    RUB = "RUB"
-    USD = "USD"
+from modules import html_backend
+from modules import http_cache
+from modules import metrics
+from modules.extractor import Field, PageCompletion, PageExtractor
+from modules.history_store import TableHistory
+from modules.html_backend import DocumentExtractor, NodeField, match_groups, own_text_groups
+from modules.models.common import Currency, Date
+from modules.models.investmint import DivInfo, TickerInfo
+from modules.projection import project, result_sections, sub_extractor
 
 
 def parse_float(value):
     val = value.strip().replace(",", ".").replace("&nbsp;", "").replace("\\xa0", "").replace("\xa0", "")
     return float(val) if val else None
 
+
+CURRENCIES = {
+    "₽": Currency.RUB,
+    "$": Currency.USD,
+}
+
+CURRENCY_ORDS = {
+    8381: Currency.RUB,
+    36: Currency.USD,
+}
+
 def parse_currency(currency_):
     if not currency_:
         return None
     currency = currency_.strip()
-    currencies = {
-        "₽": Currency.RUB,
-        "$": Currency.USD,
-    }
-    currency_ords = {
-        8381: Currency.RUB,
-        36: Currency.USD,
-    }
-    res = currencies.get(currency)
+    res = CURRENCIES.get(currency)
     if not res:
-        res = currency_ords.get(ord(currency), currency)
+        res = CURRENCY_ORDS.get(ord(currency), currency)
     return res
 
 def parse_date(day_and_month_, year_):
@@ -43,63 +49,66 @@ def parse_date(day_and_month_, year_):
     date = Date(day, month, year)
     return date
 
+
+MONTHS = {
+    "янв": 1,
+    "января": 1,
+    "фев": 2,
+    "февраля": 2,
+    "мар": 3,
+    "марта": 3,
+    "апр": 4,
+    "апреля": 4,
+    "мая": 5,
+    "июн": 6,
+    "июня": 6,
+    "июл": 7,
+    "июля": 7,
+    "авг": 8,
+    "августа": 8,
+    "сен": 9,
+    "сентября": 9,
+    "окт": 10,
+    "октября": 10,
+    "ноя": 11,
+    "ноября": 11,
+    "дек": 12,
+    "декабря": 12,
+}
+
 def parse_month(month):
-    monthes = {
-        "янв": 1,
-        "января": 1,
-        "фев": 2,
-        "февраля": 2,
-        "мар": 3,
-        "марта": 3,
-        "апр": 4,
-        "апреля": 4,
-        "мая": 5,
-        "июн": 6,
-        "июня": 6,
-        "июл": 7,
-        "июля": 7,
-        "авг": 8,
-        "августа": 8,
-        "сен": 9,
-        "сентября": 9,
-        "окт": 10,
-        "октября": 10,
-        "ноя": 11,
-        "ноября": 11,
-        "дек": 12,
-        "декабря": 12,
-    }
-    return monthes.get(month)
-
-
-
-def parse_divs_table(divs_table):
-    future_divs = list()
-    previous_divs = list()
+    return MONTHS.get(month)
 
-    future_divs_regex   = re.compile(r"""<tr class="(.*?)">\s?<td class="text-nowrap text-center">.+?</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap text-right">([\d,]+)&nbsp;<small class="text-muted">(.*?)</small></td>\s?<td class="text-right">([\d,]+)<small class="text-muted">%</small></td>\s?<td>\s?</td>\s?</tr>""")
-    previous_divs_regex = re.compile(r"""<tr class="(.*?)">\s?<td class="text-nowrap text-center">\s?</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap text-right">([\d,]+).*?<small class="text-muted">(.*?)</small></td>\s?<td class="text-right">([\d,]+).*?<small class="text-muted">%</small></td>\s?<td class="text-right">([\d,]+).*?<small class="text-muted">""")
+FUTURE_DIVS_REGEX   = re.compile(r"""<tr class="(.*?)">\s?<td class="text-nowrap text-center">.+?</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap text-right">([\d,]+)&nbsp;<small class="text-muted">(.*?)</small></td>\s?<td class="text-right">([\d,]+)<small class="text-muted">%</small></td>\s?<td>\s?</td>\s?</tr>""")
+PREVIOUS_DIVS_REGEX = re.compile(r"""<tr class="(.*?)">\s?<td class="text-nowrap text-center">\s?</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap">(.*?) (\d+)</td>\s?<td class="text-nowrap text-right">([\d,]+).*?<small class="text-muted">(.*?)</small></td>\s?<td class="text-right">([\d,]+).*?<small class="text-muted">%</small></td>\s?<td class="text-right">([\d,]+).*?<small class="text-muted">""")
 
+
+def iter_divs_table(text, start, end):
+    # yields (row start, is future, DivInfo) for the rows of text[start:end], matched in place;
+    # the row the table stops at comes last with None instead of a DivInfo
     lookup_for_future_divs = True
 
-    prev_line_start_idx = divs_table.find("<tr")
+    prev_line_start_idx = text.find("<tr", start, end)
+    if prev_line_start_idx == -1:
+        return
     while True:
-        line_start_idx = divs_table.find("<tr", prev_line_start_idx+1)
+        line_start_idx = text.find("<tr", prev_line_start_idx+1, end)
         if line_start_idx == -1:
-            break
+            return
 
-        line_end_idx = divs_table.find("</tr>", line_start_idx)
-        line = divs_table[line_start_idx:line_end_idx+5]
+        line_end_idx = text.find("</tr>", line_start_idx, end)
+        line_end_idx = end if line_end_idx == -1 else line_end_idx+5
 
         if lookup_for_future_divs:
-            m = re.search(future_divs_regex, line)
+            m = FUTURE_DIVS_REGEX.search(text, line_start_idx, line_end_idx)
             if not m:
                 lookup_for_future_divs = False
 
         if not lookup_for_future_divs:
-            m = re.search(previous_divs_regex, line)
+            m = PREVIOUS_DIVS_REGEX.search(text, line_start_idx, line_end_idx)
             if not m:
-                break
+                yield line_start_idx, False, None
+                return
 
         div_info = DivInfo()
         div_info.verified = "green-bg" in m.group(1) or "gray-bg" not in m.group(1)
@@ -108,16 +117,40 @@ def parse_divs_table(divs_table):
         div_info.dividend = parse_float(m.group(6))
         div_info.currency = parse_currency(m.group(7))
         div_info.div_yield = parse_float(m.group(8))
-
-        if lookup_for_future_divs:
-            future_divs.append(div_info)
-        else:
+        if not lookup_for_future_divs:
             div_info.close_price = parse_float(m.group(9))
-            previous_divs.append(div_info)
+
+        yield line_start_idx, lookup_for_future_divs, div_info
 
         prev_line_start_idx = line_start_idx
 
-    return future_divs, previous_divs
+
+def parse_divs_table(text, history_key=None, start=0, end=None, limit=None):
+    # limit stops after that many previous dividends
+    end = len(text) if end is None else end
+    future_divs = list()
+    previous_divs = list()
+
+    # previous dividends never change once paid, only the rows above the stored ones are parsed
+    table = TableHistory("investmint", history_key, text, start, end, True)
+    previous_start_idx = table.parse_end
+
+    for line_start_idx, future, div_info in iter_divs_table(text, start, table.parse_end):
+        if div_info is None:
+            table.discard()
+            break
+        if future:
+            future_divs.append(div_info)
+            continue
+        if not previous_divs:
+            previous_start_idx = line_start_idx
+        previous_divs.append(div_info)
+        if limit is not None and len(previous_divs) >= limit:
+            return future_divs, previous_divs[:limit]
+
+    previous_divs = table.merge(previous_divs, 0, previous_start_idx)
+
+    return future_divs, previous_divs[:limit]
 
 
 # def parse_divs_table_v1(divs_table):
@@ -166,199 +199,160 @@ def parse_divs_table(divs_table):
 
 #     return future_divs, previous_divs
 
-class Date:
-    def __init__(self, day=None, month=None, year=None):
-        self.day = day
-        self.month = month
-        self.year = year
-
-    @property
-    def timestamp(self):
-        return calendar.timegm(self.date.timetuple())
-
-    @property
-    def date(self):
-        return datetime.date(self.year, self.month, self.day)
-
-    def json(self):
-        return {
-            "day": self.day,
-            "month": self.month,
-            "year": self.year,
-            "timestamp": self.timestamp,
-        }
-
-    # def __repr__(self):
-    #     return json.dumps(self.json(), indent=4)
-
-
-class DivInfo:
-    def __init__(self):
-        self.verified = None
-        self.buy_till_date = None
-        self.registry_close_date = None
-        self.dividend = None
-        self.currency = None
-        self.div_yield = None
-        self.close_price = None
-
-    def json(self):
-        buy_till_date = self.buy_till_date.json() if isinstance(self.buy_till_date, Date) else self.buy_till_date
-        registry_close_date = self.registry_close_date.json() if isinstance(self.registry_close_date, Date) else self.registry_close_date
-        return {
-            "verified": self.verified,
-            "buy_till_date": buy_till_date,
-            "registry_close_date": registry_close_date,
-            "dividend": self.dividend,
-            "currency": self.currency,
-            "div_yield": self.div_yield,
-            "close_price": self.close_price,
-        }
-
-    # def __repr__(self):
-    #     return json.dumps(self.json(), indent=4)
-
-
-class TickerInfo:
-    def __init__(self):
-        self.name = None
-        self.sector = None
-        self.isin = None
-        self.price = None
-        self.currency = None
-        self.dividend = None
-        self.div_yield = None
-        self.buy_till_date = None
-        self.ex_div_date = None
-        self.registry_close_date = None
-        self.div_pay_date = None
-        self.future_divs = None
-        self.previous_divs = None
-
-    def eval_div_period(self, d2, d1):
-        if not d2 or not d1:
-            return None
-
-        td = d2 - d1
-        td_days = td.days
-
-        if td_days > 50 and td_days < 130:
-            return 3
-        elif td_days > 150 and td_days < 220:
-            return 6
-        elif td_days > 300 and td_days < 410:
-            return 12
-        else:
-            return None
-
-    def json(self):
-        buy_till_date = self.buy_till_date.json() if isinstance(self.buy_till_date, Date) else self.buy_till_date
-        ex_div_date = self.ex_div_date.json() if isinstance(self.ex_div_date, Date) else self.ex_div_date
-        registry_close_date = self.registry_close_date.json() if isinstance(self.registry_close_date, Date) else self.registry_close_date
-        div_pay_date = self.div_pay_date.json() if isinstance(self.div_pay_date, Date) else self.div_pay_date
-        future_divs = list(map(lambda x: x.json(), self.future_divs))
-        previous_divs = list(map(lambda x: x.json(), self.previous_divs))
-        future_div = future_divs[-1] if future_divs else None
-        previous_div = previous_divs[0] if previous_divs else None
-        if self.future_divs and self.previous_divs:
-            next_date = self.future_divs[-1].registry_close_date.date
-            prev_date = self.previous_divs[0].registry_close_date.date
-            div_period = self.eval_div_period(next_date, prev_date)
-        elif len(self.previous_divs) >= 2:
-            date1 = self.previous_divs[0].registry_close_date.date
-            date2 = self.previous_divs[1].registry_close_date.date
-            div_period = self.eval_div_period(date1, date2)
-        else:
-            div_period = None
-
-        if self.currency:
-            currency = self.currency
-        elif self.future_divs:
-            currency = self.future_divs[-1].currency
-        elif self.previous_divs:
-            currency = self.previous_divs[0].currency
-        elif self.isin and self.isin.startswith("RU"):
-            currency = Currency.RUB
-        else:
-            currency = Currency.USD
-        return {
-            "name": self.name,
-            "sector": self.sector,
-            "isin": self.isin,
-            "price": self.price,
-            "currency": currency,
-            "dividend": self.dividend,
-            "div_yield": self.div_yield,
-            "buy_till_date": buy_till_date,
-            "ex_div_date": ex_div_date,
-            "registry_close_date": registry_close_date,
-            "div_pay_date": div_pay_date,
-            "future_divs": future_divs,
-            "previous_divs": previous_divs,
-            "future_div": future_div,
-            "previous_div": previous_div,
-            "div_period": div_period,
-        }
-
-    # def __repr__(self):
-    #     return json.dumps(self.json(), indent=4)
-
-
-def parse_ticker(ticker):
-    r = requests.get("https://investmint.ru/{}/".format(ticker.lower()))
-    text = r.text
 
+def ticker_url(ticker):
+    return "https://investmint.ru/{}/".format(ticker.lower())
+
+def parse_ticker(ticker, fields=None):
+    ticker_info = http_cache.get_parsed(
+        ticker_url(ticker),
+        http_cache.bound_parser(parse_ticker_response, fields),
+        complete=functools.partial(ticker_page_complete, fields=fields),
+    )
+    return project(ticker_info.json(), fields) if ticker_info else None
+
+def parse_ticker_response(r, fields=None):
     if r.status_code != 200:
         return None
+    return parse_ticker_page(r.text, r.url, fields=fields)
+
+
+TICKER_PAGE = PageExtractor([
+    Field("name", """<h1 class="mb-2">Дивиденды """, r"""(.*?) \d{4}</h1>"""),
+    Field("sector", """<div class="smallcaps">Сектор</div>""", r"""\s?<p>(.*?)</p>"""),
+    Field("isin", """<div class="smallcaps">ISIN</div>""", r"""\s?<p>(.*?)</p>"""),
+    Field("price", """<div class="smallcaps">Курс акций</div>""", r"""\s?<div class="d-flex align-items-center text-nowrap">\s?<div class="num\d* mr-2">(.*?)(?:</div>|<small class="text-muted">(.*?)</small></div>)"""),
+    Field("dividend", """<div class="smallcaps mb-1">Дивиденд</div>""", r"""\s?<div class="d-flex align-items-center">\s?<div class="num\d*">([\d,]*)"""),
+    Field("div_yield", """<div class="smallcaps">Доходность</div>""", r"""\s?<div class="num\d*">(.*?)<small class="text-muted">%</small"""),
+    Field("buy_till_date", """<div class="eventname smallcaps">Купить до""", r""".*?</small>(.*?)<small class="text-muted">(.*?)</small>"""),
+    Field("ex_div_date", """<div class="eventname smallcaps">Экс-дивидендная дата""", r""".*?</small>(.*?)<small class="text-muted">(.*?)</small>"""),
+    Field("registry_close_date", """<div class="eventname smallcaps">Закрытие реестра""", r""".*?</small>(.*?)<small class="text-muted">(.*?)</small>"""),
+    Field("div_pay_date", """<div class="eventname smallcaps">Дата выплаты""", r""".*?</small>(.*?)<small class="text-muted">(.*?)</small>"""),
+    Field("divs_table", """<table class="table table-hover">"""),
+])
+
+
+def card_value(label, element):
+    # the element right after the card title
+    return 'div.smallcaps:lexbor-contains("{}") + {}'.format(label, element)
+
+def event_date(label):
+    # the year is the muted <small>, the day and month are the text before it
+    return 'div.eventname:lexbor-contains("{}") > small.text-muted'.format(label)
+
+def price_groups(nodes):
+    if not nodes:
+        return None
+    currency = nodes[0].css_first("small")
+    return nodes[0].text(deep=False), currency.text() if currency is not None else None
 
+def event_date_groups(nodes):
+    if not nodes or nodes[0].prev is None:
+        return None
+    return nodes[0].prev.text(), nodes[0].text()
+
+
+# the same fields read from the parsed document, for HTML_PARSER=selectolax
+TICKER_DOCUMENT = DocumentExtractor([
+    NodeField("name", 'h1.mb-2:lexbor-contains("Дивиденды ")', match_groups(r"\s*Дивиденды (.*?) \d{4}\s*$")),
+    NodeField("sector", card_value("Сектор", "p")),
+    NodeField("isin", card_value("ISIN", "p")),
+    NodeField("price", card_value("Курс акций", 'div > div[class^="num"]'), price_groups),
+    NodeField("dividend", card_value("Дивиденд", 'div > div[class^="num"]'), match_groups(r"([\d,]*)")),
+    NodeField("div_yield", card_value("Доходность", 'div[class^="num"]'), own_text_groups),
+    NodeField("buy_till_date", event_date("Купить до"), event_date_groups),
+    NodeField("ex_div_date", event_date("Экс-дивидендная дата"), event_date_groups),
+    NodeField("registry_close_date", event_date("Закрытие реестра"), event_date_groups),
+    NodeField("div_pay_date", event_date("Дата выплаты"), event_date_groups),
+], TICKER_PAGE, "divs_table")
+
+# page fields and previous dividends each result key is computed from, None for the whole history
+TICKER_RESULT_SECTIONS = {
+    "name": (("name",), 0),
+    "sector": (("sector",), 0),
+    "isin": (("isin",), 0),
+    "price": (("price",), 0),
+    "currency": (("price", "isin", "divs_table"), 1),
+    "dividend": (("dividend",), 0),
+    "div_yield": (("div_yield",), 0),
+    "buy_till_date": (("buy_till_date",), 0),
+    "ex_div_date": (("ex_div_date",), 0),
+    "registry_close_date": (("registry_close_date",), 0),
+    "div_pay_date": (("div_pay_date",), 0),
+    "future_divs": (("divs_table",), 0),
+    "previous_divs": (("divs_table",), None),
+    "future_div": (("divs_table",), 0),
+    "previous_div": (("divs_table",), 1),
+    "div_period": (("divs_table",), 2),
+}
+
+
+def ticker_page_complete(fields=None):
+    # the check a page is read until: the header cards and the dividends table are
+    # all parse_ticker_page reads, or just the ones the requested fields come from
+    sections, _ = result_sections(TICKER_RESULT_SECTIONS, fields)
+    return PageCompletion(sub_extractor(TICKER_PAGE, sections), "divs_table", ["""</table>"""])
+
+
+def parse_ticker_page(text, history_key=None, limit=None, fields=None):
+    # with fields given only the page sections those result keys need are extracted
     ticket_info = TickerInfo()
+    sections, limit = result_sections(TICKER_RESULT_SECTIONS, fields, limit)
+    with metrics.timed("investmint", "extract"):
+        found = sub_extractor(html_backend.extractor(TICKER_PAGE, TICKER_DOCUMENT), sections).extract(text)
 
-    m = re.search(r"""<div class="ml-3">\s?<h1 class="mb-2">Дивиденды (.*?) \d{4}</h1>""", text)
+    m = found.get("name")
     if m:
         ticket_info.name = html.unescape(m.group(1))
 
-    m = re.search(r"""<div class="smallcaps">Сектор</div>\s?<p>(.*?)</p>""", text)
+    m = found.get("sector")
     if m:
         ticket_info.sector = m.group(1)
 
-    m = re.search(r"""<div class="smallcaps">ISIN</div>\s?<p>(.*?)</p>""", text)
+    m = found.get("isin")
     if m:
         ticket_info.isin = m.group(1)
 
-    m = re.search(r"""<div class="smallcaps">Курс акций</div>\s?<div class="d-flex align-items-center text-nowrap">\s?<div class="num\d* mr-2">(.*?)(?:</div>|<small class="text-muted">(.*?)</small></div>)""", text)
+    m = found.get("price")
     if m:
         ticket_info.price = parse_float(m.group(1))
         ticket_info.currency = parse_currency(m.group(2))
 
-    m = re.search(r""">\s?<div class="smallcaps mb-1">Дивиденд</div>\s?<div class="d-flex align-items-center">\s?<div class="num\d*">([\d,]*)""", text)
-    m = re.search(r""">\s?<div class="smallcaps mb-1">Дивиденд</div>\s?""", text)
+    m = found.get("dividend")
     if m:
         ticket_info.dividend = parse_float(m.group(1))
 
-    m = re.search(r"""<div class="smallcaps">Доходность</div>\s?<div class="num\d*">(.*?)<small class="text-muted">%</small""", text)
+    m = found.get("div_yield")
     if m:
         ticket_info.div_yield = parse_float(m.group(1))
 
-    m = re.search(r"""<div class="eventname smallcaps">Купить до.*?</small>(.*?)<small class="text-muted">(.*?)</small>""", text)
+    m = found.get("buy_till_date")
     if m:
         ticket_info.buy_till_date = parse_date(m.group(1), m.group(2))
 
-    m = re.search(r"""<div class="eventname smallcaps">Экс-дивидендная дата.*?</small>(.*?)<small class="text-muted">(.*?)</small>""", text)
+    m = found.get("ex_div_date")
     if m:
         ticket_info.ex_div_date = parse_date(m.group(1), m.group(2))
 
-    m = re.search(r"""<div class="eventname smallcaps">Закрытие реестра.*?</small>(.*?)<small class="text-muted">(.*?)</small>""", text)
+    m = found.get("registry_close_date")
     if m:
         ticket_info.registry_close_date = parse_date(m.group(1), m.group(2))
 
-    m = re.search(r"""<div class="eventname smallcaps">Дата выплаты.*?</small>(.*?)<small class="text-muted">(.*?)</small>""", text)
+    m = found.get("div_pay_date")
     if m:
         ticket_info.div_pay_date = parse_date(m.group(1), m.group(2))
 
-    divs_table_start_idx = text.find("""<table class="table table-hover">""")
+    if sections is not None and "divs_table" not in sections:
+        ticket_info.future_divs, ticket_info.previous_divs = list(), list()
+        return ticket_info
+
+    divs_table_start_idx = found.get("divs_table", len(text))
     divs_table_end_idx = text.find("""</table>""", divs_table_start_idx)
-    divs_table = text[divs_table_start_idx:divs_table_end_idx]
+    if divs_table_end_idx == -1:
+        divs_table_end_idx = len(text)
 
-    ticket_info.future_divs, ticket_info.previous_divs = parse_divs_table(divs_table)
+    with metrics.timed("investmint", "table_parse"):
+        ticket_info.future_divs, ticket_info.previous_divs = parse_divs_table(
+            text, history_key, divs_table_start_idx, divs_table_end_idx, limit)
 
-    return ticket_info.json()
+    return ticket_info
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import atexit
+import bisect
+import errno
+import os
+import pickle
+import tempfile
+import threading
+import time
+import traceback
+import urllib.parse
+
+from modules import config
+
+
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 131072, 262144, 524288, 1048576, 4194304)
+
+SOURCE_HOSTS = {
+    "investmint.ru": "investmint",
+    "uk.investing.com": "investing",
+    "smart-lab.ru": "smartlab",
+}
+
+
+def host_source(host):
+    # host may come with a port, as in a URL's netloc
+    hostname = urllib.parse.urlsplit("//" + host).hostname or host
+    return SOURCE_HOSTS.get(hostname, hostname)
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def label_pairs(names, values, extra=None):
+    pairs = ["{}=\"{}\"".format(n, label_value(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._series)
+
+    def drain(self):
+        with self._lock:
+            series, self._series = self._series, dict()
+        return series
+
+    def add(self, series):
+        with self._lock:
+            self.merge(self._series, series)
+
+    def merge(self, total, series):
+        for labels, value in series.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, series):
+        for labels, value in sorted(series.items()):
+            yield "{}{} {}".format(self.name, label_pairs(self.label_names, labels), value)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names, buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._series[label_values] = series
+            series[idx] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def drain(self):
+        with self._lock:
+            series, self._series = self._series, dict()
+        return series
+
+    def add(self, series):
+        with self._lock:
+            self.merge(self._series, series)
+
+    def merge(self, total, series):
+        for labels, values in series.items():
+            current = total.get(labels)
+            if current is None:
+                total[labels] = list(values)
+            else:
+                total[labels] = [a + b for a, b in zip(current, values)]
+
+    def render(self, series):
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                le = "le=\"{}\"".format(bound)
+                yield "{}_bucket{} {}".format(self.name, label_pairs(self.label_names, labels, le), cumulative)
+            yield "{}_sum{} {}".format(self.name, label_pairs(self.label_names, labels), values[-1])
+            yield "{}_count{} {}".format(self.name, label_pairs(self.label_names, labels), cumulative)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=None):
+        # with a directory every process writes its snapshot there and render() adds them all up
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.metrics = list()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def counter(self, name, documentation, label_names):
+        metric = Counter(name, documentation, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, label_names, buckets=TIME_BUCKETS):
+        metric = Histogram(name, documentation, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {x.name: x.snapshot() for x in self.metrics}
+
+    def drain(self):
+        # what was counted since the last drain, for another process's registry to add
+        return {x.name: x.drain() for x in self.metrics}
+
+    def add(self, snapshot):
+        for metric in self.metrics:
+            metric.add(snapshot.get(metric.name, dict()))
+
+    def _path(self, pid):
+        return os.path.join(self.directory, "{}.pickle".format(pid))
+
+    def flush(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self.snapshot(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(os.getpid()))
+
+    def _flush_forever(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    def stop(self):
+        # a worker that exits takes its counts with it, like a restarted process would
+        self._stopped.set()
+        self._flusher.join()
+        try:
+            os.remove(self._path(os.getpid()))
+        except FileNotFoundError:
+            pass
+
+    def start(self):
+        if self.directory and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.stop)
+
+    def snapshots(self):
+        snapshots = [self.snapshot()]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        own = os.path.basename(self._path(os.getpid()))
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pickle") or name == own:
+                continue
+            if not pid_alive(int(name[:-len(".pickle")])):
+                # left by a worker that was killed before it could remove it
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    snapshots.append(pickle.load(f))
+            except Exception:
+                traceback.print_exc()
+        return snapshots
+
+    def render(self):
+        snapshots = self.snapshots()
+        lines = list()
+        for metric in self.metrics:
+            total = dict()
+            for snapshot in snapshots:
+                metric.merge(total, snapshot.get(metric.name, dict()))
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric.render(total))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(config.METRICS_DIR, config.METRICS_FLUSH_INTERVAL)
+
+stage_seconds = registry.histogram(
+    "scraper_stage_seconds", "Time spent in each stage of loading a symbol", ("source", "stage"))
+upstream_responses = registry.counter(
+    "scraper_upstream_responses_total", "Upstream responses by status code", ("source", "status"))
+upstream_bytes = registry.histogram(
+    "scraper_upstream_response_bytes", "Body bytes read per upstream response", ("source",), BYTES_BUCKETS)
+
+
+def observe_stage(source, stage, seconds):
+    stage_seconds.observe((source, stage), seconds)
+
+
+def observe_response(host, status_code, bytes_read):
+    source = host_source(host)
+    upstream_responses.inc((source, str(status_code)))
+    upstream_bytes.observe((source,), bytes_read)
+
+
+class timed:
+    # with timed("investmint", "extract"): ...
+    __slots__ = ("source", "stage", "started")
+
+    def __init__(self, source, stage):
+        self.source = source
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.source, self.stage, time.perf_counter() - self.started)
+        return False
@@ -0,0 +1,4 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from modules.models.common import Currency, Date, date_json, eval_div_period
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class Currency:
+    RUB = "RUB"
+    USD = "USD"
+
+
+class Date:
+    __slots__ = ("day", "month", "year", "_date", "_timestamp")
+
+    def __init__(self, day=None, month=None, year=None):
+        self.day = day
+        self.month = month
+        self.year = year
+        self._date = None
+        self._timestamp = None
+
+    @property
+    def timestamp(self):
+        if self._timestamp is None:
+            self._timestamp = (self.date.toordinal() - EPOCH_ORDINAL) * 86400
+        return self._timestamp
+
+    @property
+    def date(self):
+        if self._date is None:
+            self._date = datetime.date(self.year, self.month, self.day)
+        return self._date
+
+    def json(self):
+        return {
+            "day": self.day,
+            "month": self.month,
+            "year": self.year,
+            "timestamp": self.timestamp,
+        }
+
+
+def date_json(value):
+    return value.json() if isinstance(value, Date) else value
+
+
+def eval_div_period(d2, d1):
+    if not d2 or not d1:
+        return None
+
+    td = d2 - d1
+    td_days = td.days
+
+    if td_days > 50 and td_days < 130:
+        return 3
+    elif td_days > 150 and td_days < 220:
+        return 6
+    elif td_days > 300 and td_days < 410:
+        return 12
+    else:
+        return None
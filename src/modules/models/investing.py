@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from modules.models.common import date_json, eval_div_period
+
+
+class DivInfo:
+    __slots__ = ("ex_div_date", "dividend", "pay_date", "div_yield")
+
+    def __init__(self):
+        self.ex_div_date = None
+        self.dividend = None
+        self.pay_date = None
+        self.div_yield = None
+
+    def json(self):
+        return {
+            "dividend": self.dividend,
+            "div_yield": self.div_yield,
+            "ex_div_date": date_json(self.ex_div_date),
+            "pay_date": date_json(self.pay_date),
+        }
+
+
+class TickerInfo:
+    __slots__ = ("price", "name", "industry", "sector", "currency", "pe", "next_earnings_date", "all_divs")
+
+    def __init__(self):
+        self.price = None
+        self.name = None
+        self.industry = None
+        self.sector = None
+        self.currency = None
+        self.pe = None
+        self.next_earnings_date = None
+        self.all_divs = list()
+
+    def eval_div_period(self, d2, d1):
+        return eval_div_period(d2, d1)
+
+    def json(self):
+        all_divs = list(map(lambda x: x.json(), self.all_divs))
+        if len(self.all_divs) >= 2:
+            date1 = self.all_divs[0].ex_div_date.date
+            date2 = self.all_divs[1].ex_div_date.date
+            div_period = self.eval_div_period(date1, date2)
+        else:
+            div_period = None
+        return {
+            "price": self.price,
+            "name": self.name,
+            "industry": self.industry,
+            "sector": self.sector,
+            "currency": self.currency,
+            "pe": self.pe,
+            "all_divs": all_divs,
+            "div_period": div_period,
+            "next_earnings_date": date_json(self.next_earnings_date),
+        }
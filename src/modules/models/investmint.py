@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from modules.models.common import Currency, date_json, eval_div_period
+
+
+class DivInfo:
+    __slots__ = ("verified", "buy_till_date", "registry_close_date", "dividend", "currency", "div_yield", "close_price")
+
+    def __init__(self):
+        self.verified = None
+        self.buy_till_date = None
+        self.registry_close_date = None
+        self.dividend = None
+        self.currency = None
+        self.div_yield = None
+        self.close_price = None
+
+    def json(self):
+        return {
+            "verified": self.verified,
+            "buy_till_date": date_json(self.buy_till_date),
+            "registry_close_date": date_json(self.registry_close_date),
+            "dividend": self.dividend,
+            "currency": self.currency,
+            "div_yield": self.div_yield,
+            "close_price": self.close_price,
+        }
+
+
+class TickerInfo:
+    __slots__ = (
+        "name", "sector", "isin", "price", "currency", "dividend", "div_yield",
+        "buy_till_date", "ex_div_date", "registry_close_date", "div_pay_date",
+        "future_divs", "previous_divs",
+    )
+
+    def __init__(self):
+        self.name = None
+        self.sector = None
+        self.isin = None
+        self.price = None
+        self.currency = None
+        self.dividend = None
+        self.div_yield = None
+        self.buy_till_date = None
+        self.ex_div_date = None
+        self.registry_close_date = None
+        self.div_pay_date = None
+        self.future_divs = None
+        self.previous_divs = None
+
+    def eval_div_period(self, d2, d1):
+        return eval_div_period(d2, d1)
+
+    def json(self):
+        future_divs = list(map(lambda x: x.json(), self.future_divs))
+        previous_divs = list(map(lambda x: x.json(), self.previous_divs))
+        future_div = future_divs[-1] if future_divs else None
+        previous_div = previous_divs[0] if previous_divs else None
+        if self.future_divs and self.previous_divs:
+            next_date = self.future_divs[-1].registry_close_date.date
+            prev_date = self.previous_divs[0].registry_close_date.date
+            div_period = self.eval_div_period(next_date, prev_date)
+        elif len(self.previous_divs) >= 2:
+            date1 = self.previous_divs[0].registry_close_date.date
+            date2 = self.previous_divs[1].registry_close_date.date
+            div_period = self.eval_div_period(date1, date2)
+        else:
+            div_period = None
+
+        if self.currency:
+            currency = self.currency
+        elif self.future_divs:
+            currency = self.future_divs[-1].currency
+        elif self.previous_divs:
+            currency = self.previous_divs[0].currency
+        elif self.isin and self.isin.startswith("RU"):
+            currency = Currency.RUB
+        else:
+            currency = Currency.USD
+        return {
+            "name": self.name,
+            "sector": self.sector,
+            "isin": self.isin,
+            "price": self.price,
+            "currency": currency,
+            "dividend": self.dividend,
+            "div_yield": self.div_yield,
+            "buy_till_date": date_json(self.buy_till_date),
+            "ex_div_date": date_json(self.ex_div_date),
+            "registry_close_date": date_json(self.registry_close_date),
+            "div_pay_date": date_json(self.div_pay_date),
+            "future_divs": future_divs,
+            "previous_divs": previous_divs,
+            "future_div": future_div,
+            "previous_div": previous_div,
+            "div_period": div_period,
+        }
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from modules.models.common import date_json
+
+
+class Coupon:
+    __slots__ = ("date", "coupon", "coupon_yield")
+
+    def __init__(self, date, coupon, coupon_yield):
+        self.date = date
+        self.coupon = coupon
+        self.coupon_yield = coupon_yield
+
+    def json(self):
+        return {
+            "date": self.date.json(),
+            "coupon": self.coupon,
+            "coupon_yield": self.coupon_yield,
+        }
+
+
+class BondInfo:
+    __slots__ = (
+        "name", "isin", "publish_date", "close_date", "nominal", "currency",
+        "coupon_yield", "next_coupon", "nkd", "coupon_period", "status", "all_coupons",
+    )
+
+    def __init__(self):
+        self.name = None
+        self.isin = None
+        self.publish_date = None
+        self.close_date = None
+        self.nominal = None
+        self.currency = None
+        self.coupon_yield = None
+        self.next_coupon = None
+        self.nkd = None
+        self.coupon_period = None
+        self.status = None
+        self.all_coupons = None
+
+    def eval_days_to_close(self):
+        if not self.close_date:
+            return None
+        now = datetime.datetime.utcnow()
+        now_date = datetime.date(now.year, now.month, now.day)
+        td = self.close_date.date - now_date
+        return td.days
+
+    def json(self):
+        all_coupons = list(map(lambda x: x.json(), self.all_coupons))
+        return {
+            "name": self.name,
+            "isin": self.isin,
+            "nominal": self.nominal,
+            "currency": self.currency,
+            "coupon_yield": self.coupon_yield,
+            "next_coupon": self.next_coupon,
+            "nkd": self.nkd,
+            "coupon_period": self.coupon_period,
+            "status": self.status,
+            "publish_date": date_json(self.publish_date),
+            "close_date": date_json(self.close_date),
+            "days_to_close": self.eval_days_to_close(),
+            "all_coupons": all_coupons,
+        }
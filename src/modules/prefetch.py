@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import heapq
+import json
+import random
+import threading
+import time
+import traceback
+
+from modules.ratelimit import TokenBucket
+
+
+def date_timestamps(source_name, result):
+    if source_name == "investmint":
+        dates = [result.get("buy_till_date")]
+        dates += [x.get("buy_till_date") for x in result.get("future_divs") or []]
+    elif source_name == "investing":
+        dates = [x.get("ex_div_date") for x in result.get("all_divs") or []]
+    elif source_name == "smartlab":
+        dates = [x.get("date") for x in result.get("all_coupons") or []]
+    else:
+        dates = list()
+    return [x["timestamp"] for x in dates if x]
+
+def next_event_timestamp(source_name, result, now):
+    upcoming = [x for x in date_timestamps(source_name, result) if x >= now - 24 * 3600]
+    return min(upcoming) if upcoming else None
+
+
+def load_watchlist(path):
+    with open(path) as f:
+        watchlist = json.load(f)
+    return {k: list(v) for k, v in watchlist.items()}
+
+
+class PrefetchItem:
+    def __init__(self, source_name, symbol):
+        self.source_name = source_name
+        self.symbol = symbol
+        self.urgent = False
+        self.next_event = None
+        self.last_refresh = None
+        self.last_error = None
+
+
+class PrefetchScheduler:
+    def __init__(self, refresh, watchlist, intervals, jitter, rate, workers, urgent_days, urgent_factor):
+        self.refresh = refresh
+        self.intervals = intervals
+        self.jitter = jitter
+        self._bucket = TokenBucket(rate, 1)
+        self.urgent_days = urgent_days
+        self.urgent_factor = urgent_factor
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.Semaphore(workers)
+        self._heap = list()
+        self._counter = 0
+        self._lock = threading.Lock()
+        # notified under _lock whenever the heap changes, so a push between inspecting it and waiting is not lost
+        self._changed = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._thread = None
+        self.items = dict()
+        self.stats = {
+            "refreshes": 0,
+            "errors": 0,
+            "urgent": 0,
+            "max_lag": 0.0,
+        }
+        for source_name, symbols in watchlist.items():
+            for symbol in symbols:
+                self.add(source_name, symbol)
+
+    def add(self, source_name, symbol):
+        with self._lock:
+            if (source_name, symbol) in self.items:
+                return
+            item = PrefetchItem(source_name, symbol)
+            self.items[(source_name, symbol)] = item
+            # spread the initial warm-up instead of firing everything at once
+            self._push(item, time.time() + random.uniform(0, self.jitter * self.intervals[source_name]))
+
+    def _push(self, item, due):
+        self._counter += 1
+        heapq.heappush(self._heap, (due, 0 if item.urgent else 1, self._counter, item))
+        self._changed.notify()
+
+    def next_interval(self, item):
+        interval = self.intervals[item.source_name]
+        if item.urgent:
+            interval *= self.urgent_factor
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped.set()
+            self._changed.notify()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                due, _, _, item = self._heap[0] if self._heap else (None, None, None, None)
+                now = time.time()
+                if item is None or due > now:
+                    if not self._stopped.is_set():
+                        self._changed.wait(None if item is None else due - now)
+                    continue
+                heapq.heappop(self._heap)
+                self.stats["max_lag"] = max(self.stats["max_lag"], now - due)
+
+            pause = self._bucket.reserve()
+            if pause > 0:
+                self._stopped.wait(pause)
+            self._slots.acquire()
+            self._executor.submit(self._refresh_item, item)
+
+    def _refresh_item(self, item):
+        try:
+            result = self.refresh(item.source_name, item.symbol)
+            now = time.time()
+            item.last_refresh = now
+            item.last_error = None
+            item.next_event = next_event_timestamp(item.source_name, result, now) if result else None
+            item.urgent = item.next_event is not None and item.next_event - now < self.urgent_days * 24 * 3600
+            with self._lock:
+                self.stats["refreshes"] += 1
+                if item.urgent:
+                    self.stats["urgent"] += 1
+        except Exception as e:
+            traceback.print_exc()
+            item.last_error = "{}".format(e)
+            with self._lock:
+                self.stats["errors"] += 1
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._push(item, time.time() + self.next_interval(item))
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            res["symbols"] = len(self.items)
+            res["urgent_symbols"] = sum(1 for x in self.items.values() if x.urgent)
+            res["failing_symbols"] = sum(1 for x in self.items.values() if x.last_error)
+            res["running"] = self._thread is not None and not self._stopped.is_set()
+        return res
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+
+
+def parse_fields(value, known):
+    # "price,future_div" -> ("future_div", "price"), None when the whole result is wanted
+    if not value:
+        return None
+    fields = tuple(sorted(set(x.strip() for x in value.split(",") if x.strip())))
+    unknown = [x for x in fields if x not in known]
+    if unknown:
+        raise ValueError("Unknown fields: {}".format(", ".join(unknown)))
+    return fields or None
+
+
+def result_sections(needs, fields, limit=None):
+    # needs maps a result key to (page sections, history rows) it is computed from, rows None for all of them;
+    # returns the sections and rows limit covering fields, sections None when every one is wanted
+    if not fields:
+        return None, limit
+    names = set()
+    rows = 0
+    for field in fields:
+        field_names, field_rows = needs[field]
+        names.update(field_names)
+        rows = None if rows is None or field_rows is None else max(rows, field_rows)
+    if rows is not None and (limit is None or rows < limit):
+        limit = rows
+    return tuple(sorted(names)), limit
+
+
+@functools.lru_cache(maxsize=None)
+def sub_extractor(extractor, sections):
+    if sections is None:
+        return extractor
+    return extractor.subset(sections)
+
+
+def project(result, fields):
+    if not fields or result is None:
+        return result
+    return {x: result[x] for x in fields}
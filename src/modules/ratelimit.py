@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+
+from modules import config
+
+
+THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+# sent again by the http clients, each attempt taking its own turn with the host's governor
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # takes a token now, possibly going negative, and returns how long the caller has to wait for it
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class HostGovernor:
+    def __init__(self, host, rate, burst, max_concurrency, backoff_min, backoff_max):
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate, burst)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphores = dict()
+        self._lock = threading.Lock()
+        self._backoff = 0.0
+        self._cooldown_until = 0.0
+        self.stats = {
+            "requests": 0,
+            "waiting": 0,
+            "max_waiting": 0,
+            "in_flight": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _enqueue(self):
+        with self._lock:
+            self.stats["waiting"] += 1
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self.stats["waiting"])
+
+    def _dequeue(self):
+        with self._lock:
+            self.stats["waiting"] -= 1
+
+    def _delay(self):
+        return max(self.bucket.reserve(), self._cooldown_until - time.monotonic())
+
+    def _started(self, waited):
+        with self._lock:
+            self.stats["waiting"] -= 1
+            self.stats["in_flight"] += 1
+            self.stats["requests"] += 1
+            self.stats["wait_seconds"] += waited
+
+    def _finished(self, status_code, retry_after):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            if status_code in THROTTLE_STATUSES:
+                self.stats["throttled"] += 1
+                self._backoff = min(self.backoff_max, max(self.backoff_min, self._backoff * 2))
+                self._cooldown_until = time.monotonic() + max(self._backoff, retry_after or 0)
+            elif status_code is not None:
+                self._backoff /= 2
+
+    def acquire(self):
+        self._enqueue()
+        started = time.monotonic()
+        self._semaphore.acquire()
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+        self._started(time.monotonic() - started)
+
+    def release(self, status_code=None, retry_after=None):
+        self._finished(status_code, retry_after)
+        self._semaphore.release()
+
+    def _async_semaphore(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._async_semaphores[loop] = semaphore
+            return semaphore
+
+    async def async_acquire(self):
+        # a caller cancelled while waiting leaves neither a taken slot nor a waiting count behind
+        self._enqueue()
+        started = time.monotonic()
+        semaphore = self._async_semaphore()
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            self._dequeue()
+            raise
+        try:
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._dequeue()
+            semaphore.release()
+            raise
+        self._started(time.monotonic() - started)
+
+    def async_release(self, status_code=None, retry_after=None):
+        self._finished(status_code, retry_after)
+        self._async_semaphore().release()
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            res["backoff"] = self._backoff
+            res["cooldown"] = max(0.0, self._cooldown_until - time.monotonic())
+        return res
+
+
+def parse_retry_after(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class Governors:
+    def __init__(self):
+        self._governors = dict()
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            governor = self._governors.get(host)
+            if governor is None:
+                limits = config.HOST_LIMITS.get(host, dict())
+                # each worker process gets its share of the host's budget
+                processes = config.WORKER_PROCESSES
+                governor = HostGovernor(
+                    host,
+                    limits.get("rate", config.HOST_RATE) / processes,
+                    max(1, limits.get("burst", config.HOST_BURST) // processes),
+                    max(1, limits.get("max_concurrency", config.HOST_MAX_CONCURRENCY) // processes),
+                    limits.get("backoff_min", config.HOST_BACKOFF_MIN),
+                    limits.get("backoff_max", config.HOST_BACKOFF_MAX),
+                )
+                self._governors[host] = governor
+            return governor
+
+    def set(self, host, governor):
+        # replaces the limits from config for host, bench/replay.py lifts them for the hosts it serves offline
+        with self._lock:
+            self._governors[host] = governor
+
+    def json(self):
+        with self._lock:
+            governors = list(self._governors.items())
+        return {host: governor.json() for host, governor in governors}
+
+
+governors = Governors()
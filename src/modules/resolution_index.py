@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResolutionIndex:
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+        }
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS resolutions (
+                    ticker TEXT PRIMARY KEY,
+                    quote_link TEXT NOT NULL,
+                    dividends_link TEXT,
+                    resolved_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def get(self, ticker):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT quote_link, dividends_link, resolved_at FROM resolutions WHERE ticker = ?", (ticker,)).fetchone()
+            if not row or time.time() - row[2] > self.ttl:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return row[0], row[1]
+
+    def put(self, ticker, quote_link, dividends_link):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO resolutions (ticker, quote_link, dividends_link, resolved_at) VALUES (?, ?, ?, ?)",
+                (ticker, quote_link, dividends_link, time.time()))
+            conn.commit()
+            self.stats["stores"] += 1
+
+    def invalidate(self, ticker):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM resolutions WHERE ticker = ?", (ticker,))
+            conn.commit()
+            self.stats["invalidations"] += 1
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            if self._conn is not None:
+                res["entries"] = self._conn.execute("SELECT COUNT(*) FROM resolutions").fetchone()[0]
+        return res
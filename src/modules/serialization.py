@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+from modules import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def stdlib_dumps(obj):
+    # same bytes as flask.jsonify outside of debug mode, minus the trailing newline
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def orjson_dumps(obj):
+    # non-ascii text comes out as raw utf-8 instead of \u escapes
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+
+if config.JSON_ENCODER == "json" or orjson is None:
+    dumps = stdlib_dumps
+    loads = json.loads
+else:
+    dumps = orjson_dumps
+    loads = orjson.loads
+
+
+def encode_json(obj):
+    return dumps(obj) + b"\n"
+
+
+class Payload:
+    __slots__ = ("_value", "_encoded")
+
+    def __init__(self, value=None, encoded=None):
+        self._value = value
+        self._encoded = encoded
+
+    @property
+    def value(self):
+        # a payload read back from the shared cache only has its encoded form until asked
+        if self._value is None:
+            self._value = loads(self._encoded)
+        return self._value
+
+    @property
+    def encoded(self):
+        # encoded once on first use and reused by every later cache hit
+        if self._encoded is None:
+            self._encoded = dumps(self.value)
+        return self._encoded
+
+
+def result_body(payload):
+    return b'{"result":' + payload.encoded + b',"success":true}\n'
+
+def error_body(error):
+    return encode_json({"success": False, "error": error})
+
+def symbol_result_line(symbol, payload):
+    return b'{"result":' + payload.encoded + b',"success":true,"symbol":' + dumps(symbol) + b'}\n'
+
+def symbol_error_line(symbol, error):
+    return encode_json({"error": error, "success": False, "symbol": symbol})
+
+def batch_body(payloads, errors):
+    results = b",".join(dumps(symbol) + b":" + payloads[symbol].encoded for symbol in sorted(payloads))
+    return b'{"errors":' + dumps(errors) + b',"results":{' + results + b'},"success":true}\n'
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import concurrent.futures
+import fcntl
+import os
+import threading
+import traceback
+
+from modules import bond_analytics
+from modules import config
+from modules import http_cache
+from modules import http_client
+from modules import metrics
+from modules import ratelimit
+from modules import streaming
+from modules.cache import ResponseCache
+from modules.calendar_index import EVENTS as CALENDAR_EVENTS, calendar_index, date_timestamp
+from modules.export import history_export, history_fields
+from modules.history_store import history_store, today_timestamp
+from modules.investing_stock import TICKER_RESULT_SECTIONS as INVESTING_RESULT_SECTIONS, get_ticker_info
+from modules.investing_stock import normalize_ticker as normalize_investing_ticker, resolution_index
+from modules.investmint import TICKER_RESULT_SECTIONS as INVESTMINT_RESULT_SECTIONS, parse_ticker
+from modules.prefetch import PrefetchScheduler, load_watchlist
+from modules.projection import parse_fields, project
+from modules.serialization import Payload
+from modules.shared_cache import SharedResultStore
+from modules.singleflight import SingleFlight
+from modules.smartlab_bonds import BOND_RESULT_SECTIONS, parse_coupon_by_isin
+
+
+def normalize_investmint_ticker(ticker):
+    return ticker.strip().lower()
+
+def normalize_isin(isin):
+    return isin.strip().upper()
+
+
+class Source:
+    def __init__(self, name, loader, normalize, not_found_error, fields):
+        self.name = name
+        self.loader = loader
+        self.normalize = normalize
+        self.not_found_error = not_found_error
+        self.fields = fields
+
+
+SOURCES = {
+    "investmint": Source("investmint", lambda ticker, fields=None: parse_ticker(ticker.strip(), fields), normalize_investmint_ticker, "Ticker Not Found", tuple(INVESTMINT_RESULT_SECTIONS)),
+    "investing": Source("investing", lambda ticker, fields=None: get_ticker_info(ticker.strip(), fields), normalize_investing_ticker, "Ticker Not Found", tuple(INVESTING_RESULT_SECTIONS)),
+    "smartlab": Source("smartlab", lambda isin, fields=None: parse_coupon_by_isin(normalize_isin(isin), fields), normalize_isin, "ISIN Not Found", tuple(BOND_RESULT_SECTIONS)),
+}
+
+shared_results = SharedResultStore(config.SHARED_CACHE_DB) if config.SHARED_CACHE_ENABLED else None
+
+response_cache = ResponseCache(config.CACHE_TTL, config.CACHE_STALE_TTL, config.CACHE_MAX_ENTRIES, shared_results)
+
+flights = SingleFlight()
+
+batch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.BATCH_WORKERS)
+
+prefetcher = None
+prefetch_lock = None
+prefetch_waiting = False
+
+
+def encode_payload(source_name, value):
+    # encoded right away to time it, the bytes are kept for the response and the shared cache
+    if not value:
+        return None
+    payload = Payload(value)
+    with metrics.timed(source_name, "serialize"):
+        payload.encoded
+    return payload
+
+
+def index_result(source, symbol, fields, value):
+    # only a full result has every dated record of the symbol
+    if calendar_index is not None and not fields:
+        calendar_index.update(source.name, source.normalize(symbol), value)
+
+
+def load_payload(source, symbol, fields=None):
+    with metrics.timed(source.name, "scrape"):
+        value = source.loader(symbol, fields)
+    index_result(source, symbol, fields, value)
+    return encode_payload(source.name, value)
+
+
+def parse_source_fields(source_name, value):
+    return parse_fields(value, SOURCES[source_name].fields)
+
+
+def projection_key(source_name, key, fields):
+    # a projection is cached under its own key unless the full result is already cached,
+    # in which case the projected payload is returned instead, with whether the caller
+    # is to refresh the full result, it being stale
+    if not fields:
+        return key, None, False
+    payload, refresh = response_cache.peek(source_name, key)
+    if payload is not None:
+        return key, Payload(project(payload.value, fields)), refresh
+    return (key, fields), None, False
+
+
+def fetch_payload(source_name, symbol, fields=None):
+    source = SOURCES[source_name]
+    key, payload, refresh = projection_key(source_name, source.normalize(symbol), fields)
+    if refresh:
+        response_cache.start_refresh(source_name, key, lambda: flights.do((source_name, key), lambda: load_payload(source, symbol)))
+    if payload is not None:
+        return payload
+    loader = lambda: flights.do((source_name, key), lambda: load_payload(source, symbol, fields))
+    return response_cache.get_or_load(source_name, key, loader)
+
+
+def fetch(source_name, symbol, fields=None):
+    payload = fetch_payload(source_name, symbol, fields)
+    return payload.value if payload else None
+
+
+def refresh(source_name, symbol):
+    source = SOURCES[source_name]
+    key = source.normalize(symbol)
+    payload = flights.do((source_name, key), lambda: load_payload(source, symbol))
+    if payload is not None:
+        response_cache.put(source_name, key, payload)
+    return payload.value if payload else None
+
+
+def acquire_prefetch_lock(path):
+    # blocks until no other process holds the lock, which is released when the holder exits
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    f = open(path, "a")
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+
+def run_prefetch():
+    global prefetcher, prefetch_lock, prefetch_waiting
+    prefetch_lock = acquire_prefetch_lock(config.PREFETCH_LOCK)
+    prefetcher = PrefetchScheduler(
+        refresh,
+        load_watchlist(config.PREFETCH_WATCHLIST),
+        config.PREFETCH_INTERVAL,
+        config.PREFETCH_JITTER,
+        config.PREFETCH_RATE,
+        config.PREFETCH_WORKERS,
+        config.PREFETCH_URGENT_DAYS,
+        config.PREFETCH_URGENT_FACTOR,
+    )
+    prefetch_waiting = False
+    prefetcher.start()
+
+
+def start_prefetch():
+    # with several worker processes one prefetches for all, the others stand by for its lock
+    global prefetch_waiting
+    if prefetcher is None and not prefetch_waiting and config.PREFETCH_WATCHLIST:
+        prefetch_waiting = True
+        threading.Thread(target=run_prefetch, name="prefetch-lock", daemon=True).start()
+    return prefetcher
+
+
+def prefetch_stats():
+    if prefetcher:
+        return prefetcher.json()
+    return {"running": False, "standby": prefetch_waiting}
+
+
+def parse_analytics_request(data, date=None):
+    # -> ISINs, clean prices in percent of nominal by ISIN, timestamp of the date they are valued at
+    if bond_analytics.numpy is None:
+        raise ValueError("Bond analytics need numpy installed")
+    symbols = parse_batch_symbols(data)
+    prices = data.get("prices") if isinstance(data, dict) else None
+    prices = prices or dict()
+    if not isinstance(prices, dict) or not all(isinstance(x, (int, float)) and x > 0 for x in prices.values()):
+        raise ValueError("Expected \"prices\" as {\"<isin>\": <clean price in percent of nominal>}")
+    return symbols, prices, date_timestamp(date) if date else today_timestamp()
+
+
+def analyze_bonds(results, errors, prices, as_of):
+    bonds = {isin: payload.value for isin, payload in results.items()}
+    with metrics.timed("smartlab", "analytics"):
+        analytics, failed = bond_analytics.bond_analytics(bonds, prices, as_of)
+    return {isin: Payload(x) for isin, x in analytics.items()}, dict(errors, **failed)
+
+
+def parse_list(value, known, what):
+    items = [x.strip() for x in value.split(",") if x.strip()] if value else list()
+    unknown = [x for x in items if x not in known]
+    if unknown:
+        raise ValueError("Unknown {}: {}".format(what, ", ".join(unknown)))
+    return items
+
+
+class BadRequest(ValueError):
+    # a request parameter out of range, answered with status 400
+    pass
+
+
+def parse_limit(limit, maximum):
+    # a positive integer, at most maximum, which is also the default
+    if limit is None or limit == "":
+        return maximum
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise BadRequest("Expected an integer limit, got {}".format(limit))
+    if limit < 1:
+        raise BadRequest("Expected a positive limit, got {}".format(limit))
+    return min(limit, maximum)
+
+
+def calendar(start=None, end=None, sources=None, events=None, limit=None):
+    # start and end are YYYY-MM-DD and both included, the next CALENDAR_DAYS days by default
+    if calendar_index is None:
+        raise ValueError("Calendar is disabled")
+    start_ts = date_timestamp(start) if start else today_timestamp()
+    end_ts = date_timestamp(end) if end else start_ts + config.CALENDAR_DAYS * 86400
+    return calendar_index.query(
+        start_ts,
+        end_ts,
+        parse_list(sources, SOURCES, "sources"),
+        parse_list(events, CALENDAR_EVENTS, "events"),
+        parse_limit(limit, config.CALENDAR_MAX_EVENTS),
+    )
+
+
+def calendar_stats():
+    return calendar_index.json() if calendar_index else {"enabled": False}
+
+
+def history_stats():
+    return history_store.json() if history_store else {"enabled": False}
+
+
+def cache_stats():
+    res = response_cache.json()
+    res["coalescing"] = flights.json()
+    return res
+
+
+# the stats routes main.py and asgi.py both serve, path -> what returns the stats
+STATS_ROUTES = {
+    "/calendar/stats": calendar_stats,
+    "/cache/stats": cache_stats,
+    "/http/stats": http_client.sessions.json,
+    "/http/cache/stats": http_cache.disk_cache.json,
+    "/http/stream/stats": streaming.stream_stats.json,
+    "/http/limits": ratelimit.governors.json,
+    "/history/stats": history_stats,
+    "/investing/resolutions/stats": resolution_index.json,
+    "/prefetch/stats": prefetch_stats,
+}
+
+
+def parse_batch_symbols(data, max_symbols=None):
+    max_symbols = max_symbols or config.BATCH_MAX_SYMBOLS
+    symbols = data.get("symbols") if isinstance(data, dict) else data
+    if not isinstance(symbols, list) or not all(isinstance(x, str) for x in symbols):
+        raise ValueError("Expected a JSON list of symbols or {\"symbols\": [...]}")
+    if len(symbols) > max_symbols:
+        raise ValueError("Too many symbols, max is {}".format(max_symbols))
+    return symbols
+
+
+def parse_export_symbols(query, data):
+    # ?symbols=a,b,c or a batch body
+    if query:
+        data = [x.strip() for x in query.split(",") if x.strip()]
+    return parse_batch_symbols(data, config.EXPORT_MAX_SYMBOLS)
+
+
+def fetched_outcome(source, symbol, payload=None, error=None):
+    if error is None and not payload:
+        error = source.not_found_error
+    return symbol, payload.value if error is None else None, error
+
+
+def iter_fetched(source_name, symbols, fields=None):
+    # (symbol, result, error) in the order of symbols, with up to BATCH_WORKERS fetched ahead
+    source = SOURCES[source_name]
+    window = collections.deque()
+
+    def outcome(symbol, future):
+        try:
+            return fetched_outcome(source, symbol, future.result())
+        except Exception as e:
+            traceback.print_exc()
+            return fetched_outcome(source, symbol, error="{}".format(e))
+
+    for symbol in dict.fromkeys(symbols):
+        window.append((symbol, batch_executor.submit(fetch_payload, source_name, symbol, fields)))
+        if len(window) >= config.BATCH_WORKERS:
+            yield outcome(*window.popleft())
+    while window:
+        yield outcome(*window.popleft())
+
+
+def export_chunks(export, symbols):
+    for symbol, result, error in iter_fetched(export.source_name, symbols, history_fields(export.source_name)):
+        chunk = export.feed(symbol, result, error)
+        if chunk:
+            yield chunk
+    yield export.close()
+
+
+def fetch_many(source_name, symbols, fields=None):
+    source = SOURCES[source_name]
+    futures = dict()
+    for symbol in symbols:
+        if symbol not in futures:
+            futures[symbol] = batch_executor.submit(fetch_payload, source_name, symbol, fields)
+
+    results = dict()
+    errors = dict()
+    for symbol, future in futures.items():
+        try:
+            result = future.result()
+            if result:
+                results[symbol] = result
+            else:
+                errors[symbol] = source.not_found_error
+        except Exception as e:
+            traceback.print_exc()
+            errors[symbol] = "{}".format(e)
+    return results, errors
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from modules.cache import CacheEntry
+from modules.serialization import Payload
+
+
+class SharedResultStore:
+    def __init__(self, path, prune_every=1000):
+        self.path = path
+        self.prune_every = prune_every
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "pruned": 0,
+        }
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            # readers in other processes do not block on a writer
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    source TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    fresh_till REAL NOT NULL,
+                    stale_till REAL NOT NULL,
+                    PRIMARY KEY (source, key)
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def get(self, source, key):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT body, fresh_till, stale_till FROM results WHERE source = ? AND key = ?",
+                (source, json.dumps(key))).fetchone()
+            if not row or time.time() >= row[2]:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+        return CacheEntry(Payload(encoded=row[0]), row[1], row[2])
+
+    def put(self, source, key, entry):
+        body = entry.value.encoded
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (source, key, body, fresh_till, stale_till) VALUES (?, ?, ?, ?, ?)",
+                (source, json.dumps(key), body, entry.fresh_till, entry.stale_till))
+            self._puts += 1
+            if self._puts % self.prune_every == 0:
+                self.stats["pruned"] += conn.execute("DELETE FROM results WHERE stale_till < ?", (time.time(),)).rowcount
+            conn.commit()
+            self.stats["stores"] += 1
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            if self._conn is not None:
+                res["entries"] = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return res
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = dict()
+        self._async_calls = dict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "leaders": 0,
+            "coalesced": 0,
+        }
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Call()
+                self._calls[key] = call
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+            return call.value
+        except BaseException as e:
+            # followers re-raise it, KeyboardInterrupt and SystemExit included, rather than return None
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def async_do(self, key, func):
+        # the work runs as a task of its own that every caller waits on shielded,
+        # so a cancelled caller, the first one included, does not cancel it for the rest
+        task = self._async_calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._async_run(key, func))
+            # retrieved here so a failure nobody waits on any more does not log "exception never retrieved"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._async_calls[key] = task
+            with self._lock:
+                self.stats["leaders"] += 1
+        else:
+            with self._lock:
+                self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _async_run(self, key, func):
+        try:
+            return await func()
+        finally:
+            self._async_calls.pop(key, None)
+
+    def json(self):
+        with self._lock:
+            res = dict(self.stats)
+            res["in_flight"] = len(self._calls) + len(self._async_calls)
+        return res
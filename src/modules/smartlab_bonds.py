@@ -1,160 +1,202 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import calendar
-import datetime
+import functools
+import itertools
 import re
-import requests
-
-
-class Date:
-    def __init__(self, day=None, month=None, year=None):
-        self.day = day
-        self.month = month
-        self.year = year
-
-    @property
-    def timestamp(self):
-        return calendar.timegm(self.date.timetuple())
-
-    @property
-    def date(self):
-        return datetime.date(self.year, self.month, self.day)
-
-    def json(self):
-        return {
-            "day": self.day,
-            "month": self.month,
-            "year": self.year,
-            "timestamp": self.timestamp,
-        }
-
-
-class Coupon:
-    def __init__(self, date, coupon, coupon_yield):
-        self.date = date
-        self.coupon = coupon
-        self.coupon_yield = coupon_yield
-
-    def json(self):
-        return {
-            "date": self.date.json(),
-            "coupon": self.coupon,
-            "coupon_yield": self.coupon_yield,
-        }
-
-
-class BondInfo:
-    def __init__(self):
-        self.name = None
-        self.isin = None
-        self.publish_date = None
-        self.close_date = None
-        self.nominal = None
-        self.currency = None
-        self.coupon_yield = None
-        self.next_coupon = None
-        self.nkd = None
-        self.coupon_period = None
-        self.status = None
-        self.all_coupons = None
-
-    def eval_days_to_close(self):
-        if not self.close_date:
-            return None
-        now = datetime.datetime.utcnow()
-        now_date = datetime.date(now.year, now.month, now.day)
-        close_date = datetime.date(self.close_date.year, self.close_date.month, self.close_date.day)
-        td = close_date - now_date
-        return td.days
-
-    def json(self):
-        publish_date = self.publish_date.json() if isinstance(self.publish_date, Date) else self.publish_date
-        close_date = self.close_date.json() if isinstance(self.close_date, Date) else self.close_date
-        all_coupons = list(map(lambda x: x.json(), self.all_coupons))
-        return {
-            "name": self.name,
-            "isin": self.isin,
-            "nominal": self.nominal,
-            "currency": self.currency,
-            "coupon_yield": self.coupon_yield,
-            "next_coupon": self.next_coupon,
-            "nkd": self.nkd,
-            "coupon_period": self.coupon_period,
-            "status": self.status,
-            "publish_date": publish_date,
-            "close_date": close_date,
-            "days_to_close": self.eval_days_to_close(),
-            "all_coupons": all_coupons,
-        }
-
-
-def parse_coupon_by_isin(isin):
-    r = requests.get("https://smart-lab.ru/q/bonds/{}/".format(isin))
-    text = r.text
 
+from modules import html_backend
+from modules import http_cache
+from modules import metrics
+from modules.extractor import Field, PageCompletion, PageExtractor
+from modules.history_store import TableHistory, today_timestamp
+from modules.html_backend import DocumentExtractor, NodeField, match_groups
+from modules.models.common import Date
+from modules.models.smartlab import BondInfo, Coupon
+from modules.projection import project, result_sections, sub_extractor
+
+
+def bond_url(isin):
+    return "https://smart-lab.ru/q/bonds/{}/".format(isin)
+
+def parse_coupon_by_isin(isin, fields=None):
+    bond_info = http_cache.get_parsed(
+        bond_url(isin),
+        http_cache.bound_parser(parse_bond_response, fields),
+        complete=functools.partial(bond_page_complete, fields=fields),
+    )
+    return project(bond_info.json(), fields) if bond_info else None
+
+def parse_bond_response(r, fields=None):
     if r.status_code != 200:
         return None
+    return parse_bond_page(r.text, r.url, fields=fields)
+
+
+BOND_PAGE = PageExtractor([
+    Field("name", """<td><abbr title="Краткое наименование ценной бумаги">Название</abbr></td>""", r"""\s*?<td>(.*?)</td>"""),
+    Field("isin", """<td><abbr title="ISIN">ISIN</abbr></td>""", r"""\s*?<td>(.*?)</td>"""),
+    Field("publish_date", """<td><abbr title="Дата размещения, дд.мм.гг">Дата размещения</abbr></td>""", r"""\s*?<td>(\d+)-(\d+)-(\d+)</td>"""),
+    Field("close_date", """<td><abbr title="Дата погашения, дд.мм.гг">Дата погашения</abbr></td>""", r"""\s*?<td>(\d+)-(\d+)-(\d+)</td>"""),
+    Field("nominal", """>Номинал</abbr></td>""", r"""\s*<td>(.*?)</td>"""),
+    Field("currency", """<td><abbr title="Валюта номинала">Валюта</abbr></td>""", r"""\s*?<td>(.*?)</td>"""),
+    Field("coupon_yield", """>Дох. купона, годовых от ном</abbr></td>""", r"""\s*<td(?:\s+class="up")?>(.*?)%</td>"""),
+    Field("next_coupon", """<abbr title="Величина купона">Купон, руб&nbsp;&nbsp;&nbsp;(?)</abbr></a></td>""", r"""\s*?<td>(.*?)\s"""),
+    Field("nkd", """<abbr title="Накопленный купонный доход">НКД&nbsp;&nbsp;&nbsp;(?)</abbr></a></td>""", r"""\s*?<td>(.*?)\s"""),
+    Field("coupon_period", """<td><abbr title="Длительность купона">Выплата купона, дн</abbr></td>""", r"""\s*?<td>(.*?)</td>"""),
+    Field("status", """<td><abbr title="Статус">Статус</abbr></td>""", r"""\s*?<td>(.*?)</td>"""),
+    Field("calendar", """<h2 style="margin-top: 2em">Календарь выплаты купонов по облигации"""),
+])
+
+
+def description_value(label):
+    # the cell after the one labelled
+    return 'td:has(abbr:lexbor-contains("{}")) + td'.format(label)
+
+DATE_GROUPS = match_groups(r"(\d+)-(\d+)-(\d+)$")
+
+# the same fields read from the parsed document, for HTML_PARSER=selectolax
+BOND_DOCUMENT = DocumentExtractor([
+    NodeField("name", description_value("Название")),
+    NodeField("isin", description_value("ISIN")),
+    NodeField("publish_date", description_value("Дата размещения"), DATE_GROUPS),
+    NodeField("close_date", description_value("Дата погашения"), DATE_GROUPS),
+    NodeField("nominal", description_value("Номинал")),
+    NodeField("currency", description_value("Валюта")),
+    NodeField("coupon_yield", description_value("Дох. купона, годовых от ном"), match_groups(r"(.*)%$")),
+    NodeField("next_coupon", description_value("Купон, руб"), match_groups(r"(.*?)\s")),
+    NodeField("nkd", description_value("НКД"), match_groups(r"(.*?)\s")),
+    NodeField("coupon_period", description_value("Выплата купона, дн")),
+    NodeField("status", description_value("Статус")),
+], BOND_PAGE, "calendar")
+
+# page fields and coupons each result key is computed from, None for all of them
+BOND_RESULT_SECTIONS = {
+    "name": (("name",), 0),
+    "isin": (("isin",), 0),
+    "nominal": (("nominal",), 0),
+    "currency": (("currency",), 0),
+    "coupon_yield": (("coupon_yield",), 0),
+    "next_coupon": (("next_coupon",), 0),
+    "nkd": (("nkd",), 0),
+    "coupon_period": (("coupon_period",), 0),
+    "status": (("status",), 0),
+    "publish_date": (("publish_date",), 0),
+    "close_date": (("close_date",), 0),
+    "days_to_close": (("close_date",), 0),
+    "all_coupons": (("calendar",), None),
+}
+
+
+COUPONS_TABLE_START = """<table class="simple-little-table bond" cellspacing="0">"""
+
+COUPON_ROW_REGEX = re.compile(r"""<tr>\s*<td>\d+</td>\s*<td>(\d+)-(\d+)-(\d+)\s*</td>\s*<td>([0-9\.]*)</td>\s*<td>([\d+\.]*)%?.*?</tr>""", re.S)
+
+
+def bond_page_complete(fields=None):
+    # the check a page is read until: the bond description and the coupons table
+    # are all parse_bond_page reads, or just the ones the requested fields come from
+    sections, _ = result_sections(BOND_RESULT_SECTIONS, fields)
+    return PageCompletion(sub_extractor(BOND_PAGE, sections), "calendar", [COUPONS_TABLE_START, """</table>"""])
+
+
+def iter_coupons(text, start, end):
+    # yields (row end, Coupon) for the rows of text[start:end], matched in place
+    for m in COUPON_ROW_REGEX.finditer(text, start, end):
+        day, month, year, coupon, coupon_yield = m.groups()
+        # a floater's coupons past the current one are not known yet, their cells are empty
+        yield m.end(), Coupon(
+            Date(int(day), int(month), int(year)),
+            float(coupon) if coupon else None,
+            float(coupon_yield) if coupon_yield else None,
+        )
+
+
+def parse_coupons_table(text, history_key, start, end, limit=None):
+    # coupons are listed oldest first, the ones already paid are kept in the history store
+    table = TableHistory("smartlab", history_key, text, start, end, False)
+    today = today_timestamp()
+    settled = 0
+    settled_end_idx = table.parse_start
 
+    all_coupons = list()
+    rows = iter_coupons(text, table.parse_start, end)
+    if limit is not None:
+        rows = itertools.islice(rows, max(0, limit - table.stored_rows))
+    for row_end_idx, coupon in rows:
+        if settled == len(all_coupons) and coupon.date.timestamp < today:
+            settled += 1
+            settled_end_idx = row_end_idx
+        all_coupons.append(coupon)
+    return table.merge(all_coupons, settled, settled_end_idx)[:limit]
+
+
+def parse_bond_page(text, history_key=None, limit=None, fields=None):
+    # limit stops after that many of the earliest coupons,
+    # with fields given only the page sections those result keys need are extracted
     bond_info = BondInfo()
+    sections, limit = result_sections(BOND_RESULT_SECTIONS, fields, limit)
+    with metrics.timed("smartlab", "extract"):
+        found = sub_extractor(html_backend.extractor(BOND_PAGE, BOND_DOCUMENT), sections).extract(text)
 
-    m = re.search(r"""<td><abbr title="Краткое наименование ценной бумаги">Название</abbr></td>\s*?<td>(.*?)</td>""", text)
+    m = found.get("name")
     if m:
         bond_info.name = m.group(1)
 
-    m = re.search(r"""<td><abbr title="ISIN">ISIN</abbr></td>\s*?<td>(.*?)</td>""", text)
+    m = found.get("isin")
     if m:
         bond_info.isin = m.group(1)
 
-    m = re.search(r"""<td><abbr title="Дата размещения, дд.мм.гг">Дата размещения</abbr></td>\s*?<td>(\d+)-(\d+)-(\d+)</td>""", text)
+    m = found.get("publish_date")
     if m:
         bond_info.publish_date = Date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
 
-    m = re.search(r"""<td><abbr title="Дата погашения, дд.мм.гг">Дата погашения</abbr></td>\s*?<td>(\d+)-(\d+)-(\d+)</td>""", text)
+    m = found.get("close_date")
     if m:
         bond_info.close_date = Date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
 
-    m = re.search(r""">Номинал</abbr></td>\s*<td>(.*?)</td>""", text)
+    m = found.get("nominal")
     if m:
         bond_info.nominal = int(m.group(1))
 
-    m = re.search(r"""<td><abbr title="Валюта номинала">Валюта</abbr></td>\s*?<td>(.*?)</td>""", text)
+    m = found.get("currency")
     if m:
         bond_info.currency = "RUB" if m.group(1) == "руб" else None
 
-    m = re.search(r""">Дох\. купона, годовых от ном</abbr></td>\s*<td(?:\s+class="up")?>(.*?)%</td>""", text)
+    m = found.get("coupon_yield")
     if m:
         bond_info.coupon_yield = float(m.group(1))
 
-    m = re.search(r"""<abbr title="Величина купона">Купон, руб&nbsp;&nbsp;&nbsp;\(\?\)</abbr></a></td>\s*?<td>(.*?)\s""", text)
+    m = found.get("next_coupon")
     if m:
         bond_info.next_coupon = float(m.group(1))
 
-    m = re.search(r"""<abbr title="Накопленный купонный доход">НКД&nbsp;&nbsp;&nbsp;\(\?\)</abbr></a></td>\s*?<td>(.*?)\s""", text)
+    m = found.get("nkd")
     if m:
         bond_info.nkd = float(m.group(1))
 
-    m = re.search(r"""<td><abbr title="Длительность купона">Выплата купона, дн</abbr></td>\s*?<td>(.*?)</td>""", text)
+    m = found.get("coupon_period")
     if m:
         bond_info.coupon_period = int(m.group(1))
 
-    m = re.search(r"""<td><abbr title="Статус">Статус</abbr></td>\s*?<td>(.*?)</td>""", text)
+    m = found.get("status")
     if m:
         bond_info.status = m.group(1)
 
-    calendar_start_idx = text.find("""<h2 style="margin-top: 2em">Календарь выплаты купонов по облигации""")
-    all_couponds_table_start_idx = text.find("""<table class="simple-little-table bond" cellspacing="0">""", calendar_start_idx)
+    if sections is not None and "calendar" not in sections:
+        bond_info.all_coupons = list()
+        return bond_info
+
+    calendar_start_idx = found.get("calendar", -1)
+    all_couponds_table_start_idx = text.find(COUPONS_TABLE_START, calendar_start_idx)
     all_couponds_table_stop_idx = text.find("""</table>""", all_couponds_table_start_idx)
-    all_couponds_table = text[all_couponds_table_start_idx:all_couponds_table_stop_idx]
+    if all_couponds_table_start_idx == -1:
+        all_couponds_table_start_idx = all_couponds_table_stop_idx = len(text)
+    elif all_couponds_table_stop_idx == -1:
+        all_couponds_table_stop_idx = len(text)
 
-    all_coupons = list()
-    all_coupons_parts = re.findall(r"""<tr>\s*<td>\d+</td>\s*<td>(\d+)-(\d+)-(\d+)\s*</td>\s*<td>([0-9\.]*)</td>\s*<td>([\d+\.]*)%.*?</tr>""", all_couponds_table, re.S)
-    for coupon_parts in all_coupons_parts:
-        all_coupons.append(Coupon(
-            date=Date(int(coupon_parts[0]), int(coupon_parts[1]), int(coupon_parts[2])),
-            coupon=float(coupon_parts[3]),
-            coupon_yield=float(coupon_parts[4])
-        ))
-    bond_info.all_coupons = all_coupons
-
-    return bond_info.json()
+    with metrics.timed("smartlab", "table_parse"):
+        bond_info.all_coupons = parse_coupons_table(
+            text, history_key, all_couponds_table_start_idx, all_couponds_table_stop_idx, limit)
+
+    return bond_info
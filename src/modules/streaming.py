@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import codecs
+import threading
+
+
+class StreamedResponse:
+    def __init__(self, status_code, text, headers, url, partial):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.url = url
+        self.partial = partial
+
+
+def incremental_decoder(encoding):
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+def read_until(chunks, encoding, complete):
+    # returns the decoded text and whether reading stopped before the end of the body,
+    # complete() makes the check for this body, called with the text so far after each
+    # chunk, it may keep what it found in the shorter text
+    decoder = incremental_decoder(encoding)
+    check = complete()
+    text = ""
+    for chunk in chunks:
+        text += decoder.decode(chunk)
+        if check(text):
+            return text, True
+    return text + decoder.decode(b"", True), False
+
+async def async_read_until(chunks, encoding, complete):
+    decoder = incremental_decoder(encoding)
+    check = complete()
+    text = ""
+    async for chunk in chunks:
+        text += decoder.decode(chunk)
+        if check(text):
+            return text, True
+    return text + decoder.decode(b"", True), False
+
+
+def content_length(headers):
+    # None when the body size on the wire isn't known up front
+    if headers.get("Content-Encoding"):
+        return None
+    try:
+        return int(headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = dict()
+
+    def record(self, host, bytes_read, total_bytes, stopped_early):
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                stats = {
+                    "responses": 0,
+                    "stopped_early": 0,
+                    "bytes_read": 0,
+                    "bytes_saved": 0,
+                    "unknown_length": 0,
+                }
+                self._hosts[host] = stats
+            stats["responses"] += 1
+            stats["bytes_read"] += bytes_read
+            if stopped_early:
+                stats["stopped_early"] += 1
+                if total_bytes is None:
+                    stats["unknown_length"] += 1
+                else:
+                    stats["bytes_saved"] += max(total_bytes - bytes_read, 0)
+
+    def json(self):
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._hosts.items()}
+
+
+stream_stats = StreamStats()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Bulk scraper: one symbol per line from files or stdin, one NDJSON line per
+# symbol out, errors included, in the order they finish.
+#
+#   python src/scrape.py investmint tickers.txt -o divs.ndjson --checkpoint divs.sqlite
+#   cut -f1 isins.tsv | python src/scrape.py smartlab --fields close_date,all_coupons
+#
+# Up to --concurrency symbols are fetched at once and the pages are parsed in
+# --parse-processes worker processes. With --checkpoint every written symbol
+# is recorded in that SQLite file, a rerun skips them and appends to --output.
+# A symbol repeated in the input is skipped within --dedupe-window symbols, or
+# at any distance once it is in the checkpoint.
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import sqlite3
+import sys
+import time
+import traceback
+
+from modules import http_cache
+from modules import serialization
+from modules import service
+
+
+def iter_symbols(paths):
+    for path in paths or ["-"]:
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            for line in f:
+                symbol = line.strip()
+                if symbol and not symbol.startswith("#"):
+                    yield symbol
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+class Checkpoint:
+    # symbols already written, looked up on disk so a rerun does not hold them all in memory
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # a commit survives the process being killed, not a power loss
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS done (symbol TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def __contains__(self, symbol):
+        return self._conn.execute("SELECT 1 FROM done WHERE symbol = ?", (symbol,)).fetchone() is not None
+
+    def empty(self):
+        return self._conn.execute("SELECT 1 FROM done LIMIT 1").fetchone() is None
+
+    def add(self, symbol):
+        self._conn.execute("INSERT OR IGNORE INTO done (symbol) VALUES (?)", (symbol,))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class Progress:
+    def __init__(self, interval):
+        self.interval = interval
+        self.started = time.monotonic()
+        self.reported = self.started
+        self.done = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def record(self, ok):
+        self.done += 1
+        if not ok:
+            self.errors += 1
+        now = time.monotonic()
+        if self.interval and now - self.reported >= self.interval:
+            self.reported = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.monotonic() - self.started
+        print("{}{} done, {} errors, {} skipped, {:.1f}s, {:.1f} symbols/s".format(
+            "total: " if final else "", self.done, self.errors, self.skipped, elapsed,
+            self.done / elapsed if elapsed else 0), file=sys.stderr, flush=True)
+
+
+def scrape_one(source_name, symbol, fields):
+    try:
+        payload = service.load_payload(service.SOURCES[source_name], symbol, fields)
+        if payload:
+            return serialization.symbol_result_line(symbol, payload), True
+        return serialization.symbol_error_line(symbol, service.SOURCES[source_name].not_found_error), False
+    except Exception as e:
+        traceback.print_exc()
+        return serialization.symbol_error_line(symbol, "{}".format(e)), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape many symbols into NDJSON")
+    parser.add_argument("source", choices=sorted(service.SOURCES))
+    parser.add_argument("inputs", nargs="*", help="files with one symbol per line, - or nothing for stdin")
+    parser.add_argument("-o", "--output", default="-")
+    parser.add_argument("--checkpoint")
+    parser.add_argument("--fields")
+    parser.add_argument("--concurrency", type=int, default=16)
+    # one process would only add the cost of sending it the pages
+    parser.add_argument("--parse-processes", type=int, default=os.cpu_count() if (os.cpu_count() or 1) > 1 else 0)
+    parser.add_argument("--progress", type=float, default=10, help="seconds between progress reports, 0 for none")
+    parser.add_argument("--dedupe-window", type=int, default=100000, help="latest symbols a repeat is looked for among")
+    args = parser.parse_args()
+
+    fields = service.parse_source_fields(args.source, args.fields)
+    progress = Progress(args.progress)
+    http_cache.parse_pool.processes = args.parse_processes
+    http_cache.parse_pool.start()
+
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    if args.output == "-":
+        output = sys.stdout.buffer
+    else:
+        output = open(args.output, "ab" if checkpoint and not checkpoint.empty() else "wb")
+
+    def write(future):
+        symbol = pending.pop(future)
+        line, ok = future.result()
+        output.write(line)
+        output.flush()
+        # a symbol is recorded only once its line is out
+        if checkpoint:
+            checkpoint.add(symbol)
+        progress.record(ok)
+
+    # at most 2 * concurrency symbols are held at any time, however long the input,
+    # the window covers them so a repeat of one in flight is not fetched twice
+    executor = concurrent.futures.ThreadPoolExecutor(args.concurrency, thread_name_prefix="scrape")
+    pending = dict()
+    recent = collections.OrderedDict()
+    window = max(args.dedupe_window, 2 * args.concurrency)
+    interrupted = False
+    try:
+        for symbol in iter_symbols(args.inputs):
+            if symbol in recent or (checkpoint and symbol in checkpoint):
+                progress.skipped += 1
+                continue
+            recent[symbol] = None
+            if len(recent) > window:
+                recent.popitem(last=False)
+            while len(pending) >= 2 * args.concurrency:
+                finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    write(future)
+            future = executor.submit(scrape_one, args.source, symbol, fields)
+            pending[future] = symbol
+        for future in concurrent.futures.as_completed(list(pending)):
+            write(future)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("interrupted, {} symbols in flight are not recorded".format(len(pending)), file=sys.stderr)
+    finally:
+        # when interrupted the requests already running finish on their own before the process exits
+        executor.shutdown(wait=not interrupted, cancel_futures=interrupted)
+        http_cache.parse_pool.shutdown()
+        if checkpoint:
+            checkpoint.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+        progress.report(final=True)
+
+    if interrupted:
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Production entry point: SERVER_WORKERS worker processes share one listening
+# socket and the result cache in SHARED_CACHE_DB.
+#
+#   SERVER_WORKERS=4 python src/server.py
+#   kill -HUP <pid>     # graceful reload, workers are replaced one at a time
+#   kill -TTIN <pid>    # one more worker, TTOU for one less, the per-host limits
+#                       # stay split SERVER_WORKERS ways, see WORKER_PROCESSES
+#   kill -TERM <pid>    # workers finish their requests, SERVER_GRACEFUL_TIMEOUT at most
+#
+# SERVER_APP=main:app serves the Flask app instead of the ASGI one, uvicorn
+# runs it as WSGI (SERVER_INTERFACE) on a thread pool in each worker.
+
+import os
+import shutil
+
+import uvicorn
+
+from modules import config
+
+
+def main():
+    # read by the workers' own modules.config
+    os.environ["WORKER_PROCESSES"] = str(config.SERVER_WORKERS)
+    os.environ.setdefault("SHARED_CACHE_ENABLED", "1")
+    if not config.METRICS_DIR:
+        # snapshots left by a previous run would be added to this one's
+        metrics_dir = os.path.join(config.CACHE_DIR, "metrics")
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.environ["METRICS_DIR"] = metrics_dir
+
+    uvicorn.run(
+        config.SERVER_APP,
+        interface=config.SERVER_INTERFACE,
+        host=config.SERVER_HOST,
+        port=config.SERVER_PORT,
+        workers=config.SERVER_WORKERS,
+        timeout_graceful_shutdown=config.SERVER_GRACEFUL_TIMEOUT,
+        access_log=False,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_extractor_"))
+
+from modules.investmint import ticker_page_complete
+from modules.smartlab_bonds import bond_page_complete
+from modules.streaming import read_until
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench", "fixtures")
+
+
+def read_body(path):
+    with open(os.path.join(FIXTURES_DIR, path), "rb") as f:
+        return f.read()
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class PageCompletionTest(unittest.TestCase):
+    # read resumed from chunk to chunk stops where a check made anew on the text so far would
+    cases = [
+        ("investmint/sber.html", ticker_page_complete, None),
+        ("investmint/sber.html", ticker_page_complete, ("name",)),
+        ("smartlab/SU26233RMFS5.html", bond_page_complete, None),
+        ("smartlab/SU26233RMFS5.html", bond_page_complete, ("close_date",)),
+    ]
+
+    def test_same_stop_as_fresh_check(self):
+        for path, make_check, fields in self.cases:
+            body = read_body(path)
+            complete = lambda: make_check(fields=fields)
+            fresh = lambda: lambda text: complete()(text)
+            # odd sizes put anchors and multibyte characters across chunk boundaries
+            for size in (251, 4099):
+                with self.subTest(path=path, fields=fields, size=size):
+                    text, partial = read_until(iter(chunked(body, size)), "utf-8", complete)
+                    self.assertTrue(partial)
+                    self.assertEqual((text, partial), read_until(iter(chunked(body, size)), "utf-8", fresh))
+
+    def test_whole_page_when_never_complete(self):
+        body = read_body("smartlab/SU26233RMFS5.html")
+        text, partial = read_until(iter(chunked(body[:len(body) // 4], 251)), "utf-8", bond_page_complete)
+        self.assertFalse(partial)
+        self.assertEqual(text, body[:len(body) // 4].decode("utf-8"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_history_store_"))
+
+from modules.history_store import HistoryStore, TableHistory, text_digest
+
+
+ROW = "<tr><td>{}</td></tr>"
+
+
+def table(values):
+    # the page around a table of one value per row, oldest first
+    return "<p>header</p><table>" + "".join(ROW.format(x) for x in values) + "</table><p>footer</p>"
+
+
+def parse(text, store, settled):
+    # TableHistory as the parsers drive it: the first settled rows are kept for the next refresh
+    start = text.find("<table>") + len("<table>")
+    end = text.find("</table>")
+    history = TableHistory("test", "symbol", text, start, end, False, store)
+    rows = text[history.parse_start:end].split("</tr>")[:-1]
+    parsed = [x[len("<tr><td>"):-len("</td>")] for x in rows]
+    split = max(0, min(settled, len(parsed) + history.stored_rows) - history.stored_rows)
+    boundary = history.parse_start + sum(len(x) + len("</tr>") for x in rows[:split])
+    return history, history.merge(parsed, split, boundary)
+
+
+class TableHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.store = HistoryStore(os.path.join(tempfile.mkdtemp(prefix="test_history_store_"), "history.sqlite"), 4)
+
+    def test_reuses_unchanged_rows(self):
+        parse(table(["a", "b", "c"]), self.store, 2)
+        history, rows = parse(table(["a", "b", "c", "d"]), self.store, 3)
+        self.assertEqual(rows, ["a", "b", "c", "d"])
+        self.assertEqual(history.stored_rows, 2)
+        self.assertEqual(self.store.stats["mismatches"], 0)
+
+    def test_digest_mismatch_parses_whole_table(self):
+        parse(table(["a", "b", "c"]), self.store, 2)
+        # a settled row edited on the page
+        text = table(["a", "B", "c"])
+        history, rows = parse(text, self.store, 2)
+        self.assertEqual(self.store.stats["mismatches"], 1)
+        self.assertEqual(history.parse_start, text.find("<table>") + len("<table>"))
+        self.assertEqual(rows, ["a", "B", "c"])
+        self.assertEqual(self.store.stats["rewrites"], 2)
+        stored = self.store.get("test", "symbol")
+        self.assertEqual(stored.rows, ["a", "B"])
+        self.assertEqual(stored.digest, text_digest(ROW.format("a") + ROW.format("B")))
+
+        history, rows = parse(text, self.store, 2)
+        self.assertEqual(rows, ["a", "B", "c"])
+        self.assertEqual((history.stored_rows, self.store.stats["mismatches"]), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_routes_"))
+
+import asgi
+import main
+
+
+def generic(rule):
+    # Flask and asgi.py name a rule's parts differently
+    return re.sub(r"<[^>]*>", "<>", rule)
+
+
+def flask_routes():
+    # Flask adds OPTIONS to every rule and answers it itself
+    return {
+        (generic(x.rule), frozenset(x.methods - {"OPTIONS"}))
+        for x in main.app.url_map.iter_rules()
+        if x.endpoint != "static"
+    }
+
+
+def asgi_routes():
+    return {(generic(rule), frozenset(methods)) for rule, methods, _ in asgi.ROUTES}
+
+
+def asgi_call(method, path):
+    sent = list()
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app({"type": "http", "method": method, "path": path, "query_string": b""}, receive, send))
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+
+class RoutesTest(unittest.TestCase):
+    def test_same_routes(self):
+        self.assertEqual(flask_routes(), asgi_routes())
+
+    def test_same_status_for_unrouted_methods(self):
+        client = main.app.test_client()
+        paths = [re.sub(r"<[^>]*>", "sber", rule) for rule, _, _ in asgi.ROUTES] + ["/nowhere"]
+        for path in paths:
+            flask_response = client.put(path)
+            status, headers = asgi_call("PUT", path)
+            self.assertEqual(flask_response.status_code, status, path)
+            if status == 405:
+                allow = set(x.strip() for x in headers[b"allow"].decode("ascii").split(","))
+                self.assertEqual(set(flask_response.allow) - {"OPTIONS"}, allow, path)
+
+    def test_stats_routes(self):
+        client = main.app.test_client()
+        for path in main.service.STATS_ROUTES:
+            self.assertEqual(client.get(path).status_code, 200, path)
+            self.assertEqual(asgi_call("GET", path)[0], 200, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
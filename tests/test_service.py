@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_service_"))
+
+from modules import service
+from modules.cache import CacheEntry
+from modules.serialization import Payload
+
+
+class StaleProjectionTest(unittest.TestCase):
+    def test_served_from_stale_full_result_and_refreshed(self):
+        isin = "SU00000STALE"
+        now = time.time()
+        with service.response_cache._lock:
+            service.response_cache._store("smartlab", isin, CacheEntry(
+                Payload({"isin": isin, "name": "old", "all_coupons": []}), now - 1, now + 60))
+
+        loaded = threading.Event()
+        calls = list()
+
+        def loader(symbol, fields=None):
+            calls.append((symbol, fields))
+            loaded.set()
+            return {"isin": symbol, "name": "new", "all_coupons": []}
+
+        with mock.patch.object(service.SOURCES["smartlab"], "loader", loader):
+            self.assertEqual(service.fetch("smartlab", isin, ("name",)), {"name": "old"})
+            self.assertTrue(loaded.wait(5))
+            # the full result is refreshed, not the projection
+            self.assertEqual(calls, [(isin, None)])
+            deadline = time.time() + 5
+            while service.fetch("smartlab", isin, ("name",)) != {"name": "new"} and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(service.fetch("smartlab", isin, ("name",)), {"name": "new"})
+        self.assertEqual(calls, [(isin, None)])
+
+
+class ParseLimitTest(unittest.TestCase):
+    def test_default_and_cap(self):
+        self.assertEqual(service.parse_limit(None, 100), 100)
+        self.assertEqual(service.parse_limit("", 100), 100)
+        self.assertEqual(service.parse_limit("5", 100), 5)
+        self.assertEqual(service.parse_limit("1000", 100), 100)
+
+    def test_rejected(self):
+        for limit in ("0", "-1", "abc", "1.5"):
+            with self.subTest(limit=limit):
+                with self.assertRaises(service.BadRequest):
+                    service.parse_limit(limit, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
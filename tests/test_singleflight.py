@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.singleflight import SingleFlight
+
+
+class AsyncDoTest(unittest.TestCase):
+    def test_followers_share_the_leader_value(self):
+        async def run():
+            flight = SingleFlight()
+            calls = list()
+
+            async def load():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                return "value"
+            results = await asyncio.gather(*[flight.async_do("key", load) for _ in range(3)])
+            return results, calls, flight.json()
+
+        results, calls, stats = asyncio.run(run())
+        self.assertEqual(results, ["value"] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(stats, {"leaders": 1, "coalesced": 2, "in_flight": 0})
+
+    def test_leader_cancelled(self):
+        async def run():
+            flight = SingleFlight()
+            started = asyncio.Event()
+
+            async def load():
+                started.set()
+                await asyncio.sleep(0.05)
+                return "value"
+            leader = asyncio.ensure_future(flight.async_do("key", load))
+            await started.wait()
+            follower = asyncio.ensure_future(flight.async_do("key", load))
+            await asyncio.sleep(0)
+            leader.cancel()
+            # the leader's caller is gone, the follower still gets the value
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            self.assertEqual(await asyncio.wait_for(follower, 1), "value")
+            self.assertEqual(flight.json()["in_flight"], 0)
+
+        asyncio.run(run())
+
+    def test_follower_cancelled(self):
+        async def run():
+            flight = SingleFlight()
+
+            async def load():
+                await asyncio.sleep(0.05)
+                return "value"
+            leader = asyncio.ensure_future(flight.async_do("key", load))
+            follower = asyncio.ensure_future(flight.async_do("key", load))
+            await asyncio.sleep(0)
+            follower.cancel()
+            self.assertEqual(await asyncio.wait_for(leader, 1), "value")
+
+        asyncio.run(run())
+
+
+class Interrupt(BaseException):
+    pass
+
+
+class DoTest(unittest.TestCase):
+    def test_followers_reraise_base_exceptions(self):
+        flight = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        errors = list()
+
+        def load():
+            entered.set()
+            release.wait(1)
+            raise Interrupt()
+
+        def call():
+            try:
+                flight.do("key", load)
+            except Interrupt as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        entered.wait(1)
+        follower = threading.Thread(target=call)
+        follower.start()
+        while flight.json()["coalesced"] == 0:
+            time.sleep(0.001)
+        release.set()
+        leader.join(1)
+        follower.join(1)
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_smartlab_bonds_"))
+
+from modules import bond_analytics
+from modules.models.common import Date
+from modules.smartlab_bonds import parse_bond_page
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench", "fixtures")
+AS_OF = Date(1, 3, 2025).timestamp
+
+
+def read_bond(isin):
+    with open(os.path.join(FIXTURES_DIR, "smartlab", "{}.html".format(isin)), encoding="utf-8") as f:
+        return parse_bond_page(f.read()).json()
+
+
+class FloaterTest(unittest.TestCase):
+    def test_unknown_coupons(self):
+        coupons = read_bond("SU29014RMFS6")["all_coupons"]
+        self.assertEqual(len(coupons), 20)
+        self.assertEqual((coupons[10]["coupon"], coupons[10]["coupon_yield"]), (46.5, 9.3))
+        self.assertTrue(all(x["coupon"] is None and x["coupon_yield"] is None for x in coupons[11:]))
+
+    @unittest.skipIf(bond_analytics.numpy is None, "numpy is not installed")
+    def test_analytics_assume_last_known_coupon(self):
+        floater = read_bond("SU29014RMFS6")
+        fixed = dict(floater, all_coupons=[dict(x, coupon=x["coupon"] or 46.5) for x in floater["all_coupons"]])
+        results, errors = bond_analytics.bond_analytics({"floater": floater, "fixed": fixed}, {}, AS_OF)
+        self.assertEqual(errors, {})
+        self.assertEqual(results["floater"]["next_coupon"]["amount"], 46.5)
+        self.assertEqual(results["floater"]["remaining_coupons"], 9)
+        for key in ("accrued", "ytm", "macaulay_duration", "convexity"):
+            self.assertAlmostEqual(results["floater"][key], results["fixed"][key], msg=key)
+
+
+if __name__ == '__main__':
+    unittest.main()